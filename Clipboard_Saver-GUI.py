@@ -1,4 +1,5 @@
 import sys
+import functools
 import pyperclip
 import time
 import threading
@@ -6,15 +7,51 @@ import os
 from datetime import datetime
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QThread, QObject  # Import necessary Qt concurrency classes
-from pystray import Icon as SysTrayIcon, MenuItem, Menu
-from PIL import Image, ImageDraw
 import typing 
+
+from clipboard_blobs import blob_dir_for
+from clipboard_capture import RichCapture, mime_owner, snapshot_mime
+from clipboard_client import DaemonClient, DaemonError, daemon_running, default_socket_path
+from clipboard_metrics import CHANGES, CHECKS, DETECT_SECONDS, MetricsExporter, disable_trace, enable_trace, \
+    record_error, trace_event
+from clipboard_filter import ClipFilter
+from clipboard_fingerprint import Fingerprint, fingerprint, is_new_content
+from clipboard_index import ClipIndex, open_index, snapshot_path_for
+from clipboard_largeclip import ClipSpiller
+from clipboard_scheduler import PollScheduler
+from clipboard_sources import ChangeSource, DebouncedSource, PollingSource, PushSource
+from clipboard_store import CLIPBOARD, PRIMARY, is_encrypted_path
+from clipboard_writer import ClipRecord, LogWriter
+
+if typing.TYPE_CHECKING:  # Loaded on first use: keeps PIL, pystray and the history view out of startup
+    import pystray
+    from PIL import Image
+    from clipboard_history_view import HistoryPanel
+
 DEFAULT_FILENAME: str = "clipboard_log.txt"
 DEFAULT_SAVE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_FILENAME)
 POLLING_INTERVAL: int = 1  # Seconds
-
-def create_default_icon() -> Image.Image:
-    """Creates a simple PIL Image to use as an icon."""
+DEDUP_HISTORY: bool = False  # True: store each distinct clip once, repeats only add a timestamp reference
+CAPTURE_RICH: bool = True  # Also save images, HTML and file lists (stored as blobs next to the log; not for .enc logs)
+CAPTURE_PRIMARY: bool = True  # Also save the PRIMARY selection (X11/Wayland select-to-copy) once a selection settles
+FILTER_SENSITIVE: bool = True  # Redact secrets and skip password-manager clips before they are saved (clipboard_filter)
+MAX_INLINE_CHARS: int = 1 << 20  # Longer clips are written to a blob file next to the log, not into it (clipboard_largeclip)
+PICKER_CLIPS: int = 100000  # Distinct recent clips the quick-paste picker searches (clipboard_index)
+METRICS_PORT: typing.Optional[int] = None  # Serve Prometheus metrics on http://127.0.0.1:<port>/metrics
+METRICS_FILE: typing.Optional[str] = None  # Or rewrite them to this file (node_exporter textfile collector)
+TRACE_FILE: typing.Optional[str] = None  # JSON-lines event trace (detections, flushes, errors)
+KEY_FILE: typing.Optional[str] = None  # Key for an encrypted (.enc) log; otherwise a passphrase is asked for (clipboard_crypto)
+USE_DAEMON: bool = True  # If a clipboard daemon is running, act as its front end instead of monitoring twice
+AUTO_START: bool = False  # Start monitoring on launch (also: --start), before the window is built
+FRAME_INTERVAL_MS: int = 16  # Monitor updates within one frame reach the window as one (0: deliver every update)
+HIDDEN_INTERVAL_MS: int = 1000  # Slower delivery while the window is hidden or minimized
+ICON_CACHE_PATH: str = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                                    "clipboard-saver", "icon.png")  # Generated icon, reused on later starts
+
+@functools.lru_cache(maxsize=1)
+def create_default_icon() -> "Image.Image":
+    """Creates a simple PIL Image to use as an icon (once per process; PIL is imported here)."""
+    from PIL import Image, ImageDraw
     size = 64
     # Use RGBA for transparency support if needed by the tray backend
     image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
@@ -29,10 +66,17 @@ def load_app_icon() -> QtGui.QIcon:
     icon_path = "icon.ico" # Or your preferred icon file
     if os.path.exists(icon_path):
          return QtGui.QIcon(icon_path)
+    elif os.path.exists(ICON_CACHE_PATH):
+        return QtGui.QIcon(ICON_CACHE_PATH) # Generated on an earlier start, no PIL needed
     else:
         print(f"Warning: Icon file '{icon_path}' not found. Using default generated icon.")
         # Convert PIL image to QPixmap then to QIcon
         pil_img = create_default_icon()
+        try:
+            os.makedirs(os.path.dirname(ICON_CACHE_PATH), exist_ok=True)
+            pil_img.save(ICON_CACHE_PATH, "PNG")
+        except OSError as e:
+            print(f"Warning: Could not cache icon at {ICON_CACHE_PATH}: {e}")
         # Convert PIL image mode if necessary (e.g., to RGB if saving as JPG/BMP)
         if pil_img.mode != 'RGBA':
             pil_img = pil_img.convert('RGBA')
@@ -40,58 +84,214 @@ def load_app_icon() -> QtGui.QIcon:
         qimage = QtGui.QImage(img_byte_array, pil_img.width, pil_img.height, QtGui.QImage.Format_RGBA8888)
         qpixmap = QtGui.QPixmap.fromImage(qimage)
         return QtGui.QIcon(qpixmap)
+
+def clip_preview(content: str) -> str:
+    """ First 50 characters of a clip on one line, for the status label. """
+    return content[:50].replace('\n', ' ') + ('...' if len(content) > 50 else '')
 # --- End Helper Functions ---
 
 
+class MonitorEvents(QObject):
+    """
+    Carries saves, errors and status changes from the monitor thread to the GUI.
+
+    Posting is thread-safe and cheap: it keeps only the latest event of each
+    kind and queues a single wake-up for the GUI thread. The signals fire at
+    most once per interval_ms (hidden_interval_ms while the window is hidden),
+    in the order the events happened, so a burst of clips costs one label
+    update rather than one queued signal each. Previews are built on
+    delivery, and only while the window is visible.
+    """
+    content_saved = pyqtSignal(str)  # "Saved: [timestamp] preview"
+    error_occurred = pyqtSignal(str)
+    status_update = pyqtSignal(str)
+    _posted = pyqtSignal() # First post since the last delivery
+
+    def __init__(self, interval_ms: int = FRAME_INTERVAL_MS, hidden_interval_ms: int = HIDDEN_INTERVAL_MS,
+                 parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms # 0: emit every event as it is posted
+        self.hidden_interval_ms = hidden_interval_ms
+        self.visible = True # Whether the window shows the label; set on the GUI thread
+        self._lock = threading.Lock() # Guards the fields below between posting threads and the GUI thread
+        self._pending: typing.Dict[str, typing.Tuple[int, typing.Any]] = {} # kind -> (sequence, payload) of the latest event
+        self._merged: typing.Dict[str, int] = {} # kind -> events posted since the last delivery
+        self._sequence = 0
+        self._scheduled = False
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._posted.connect(self._schedule) # Queued when posted from another thread
+
+    def saved(self, timestamp: str, content: str):
+        if self.interval_ms <= 0:
+            self.content_saved.emit(f"Saved: [{timestamp}] {clip_preview(content)}")
+        else:
+            self._post("saved", (timestamp, content))
+
+    def error(self, message: str):
+        if self.interval_ms <= 0:
+            self.error_occurred.emit(message)
+        else:
+            self._post("error", message)
+
+    def status(self, message: str):
+        if self.interval_ms <= 0:
+            self.status_update.emit(message)
+        else:
+            self._post("status", message)
+
+    def _post(self, kind: str, payload: typing.Any):
+        with self._lock:
+            self._sequence += 1
+            self._pending[kind] = (self._sequence, payload)
+            self._merged[kind] = self._merged.get(kind, 0) + 1
+            if self._scheduled:
+                return # Merged into the delivery already on its way
+            self._scheduled = True
+        self._posted.emit()
+
+    @pyqtSlot()
+    def _schedule(self):
+        self._timer.start(self.interval_ms if self.visible else self.hidden_interval_ms)
+
+    def set_visible(self, visible: bool):
+        """ Called on the GUI thread when the window is shown, hidden or minimized. """
+        self.visible = visible
+        if visible and self._timer.isActive():
+            self._timer.start(self.interval_ms) # Don't keep a newly shown window waiting for the hidden interval
+
+    @pyqtSlot()
+    def flush(self):
+        """ Emits the latest event of each kind posted since the last delivery. """
+        with self._lock:
+            pending, merged = self._pending, self._merged
+            self._pending, self._merged = {}, {}
+            self._scheduled = False
+        for kind, (_, payload) in sorted(pending.items(), key=lambda item: item[1][0]):
+            more = merged[kind] - 1
+            if kind == "saved":
+                timestamp, content = payload
+                if self.visible:
+                    self.content_saved.emit(f"Saved: [{timestamp}] {clip_preview(content)}"
+                                            + (f" (+{more} more)" if more else ""))
+                else:
+                    self.content_saved.emit(f"Saved: [{timestamp}] ({more + 1} clips)")
+            elif kind == "error":
+                self.error_occurred.emit(payload + (f" (+{more} more)" if more else ""))
+            else:
+                self.status_update.emit(payload)
+
+
 class ClipboardMonitor(QObject):
     """
     Runs in a separate thread to monitor clipboard changes
-    and emits signals to update the GUI safely.
+    and posts them to MonitorEvents, which updates the GUI safely.
     """
-    content_saved = pyqtSignal(str)  # Signal emitted when content is saved (sends preview)
-    error_occurred = pyqtSignal(str) # Signal emitted on error
-    status_update = pyqtSignal(str) # Signal for general status updates
-
-    def __init__(self, save_path_func: typing.Callable[[], str], parent=None):
+    def __init__(self, save_path_func: typing.Callable[[], str],
+                 source: typing.Optional[ChangeSource] = None,
+                 clip_filter: typing.Optional[ClipFilter] = None,
+                 events: typing.Optional[MonitorEvents] = None, parent=None):
         super().__init__(parent)
+        self.events = events or MonitorEvents() # Not a child: stays on the GUI thread when the monitor moves
         self._running = False
-        self.last_content: typing.Optional[str] = None
+        self.scheduler = PollScheduler(base_interval=POLLING_INTERVAL) # Adaptive interval and error backoff
+        self.source: ChangeSource = source or PollingSource(POLLING_INTERVAL, scheduler=self.scheduler) # Where change notifications come from
+        self.last_fingerprints: typing.Dict[str, Fingerprint] = {} # Per selection: length + digest of the last saved clip
         self._lock = threading.Lock() # To safely access self._running
+        self._stopping = threading.Event() # Set by stop(): cuts short the backoff wait after an error
         self.get_save_path = save_path_func # Function to get current save path from main App
+        self.writer: typing.Optional[LogWriter] = None # Batched file writer, lives while monitoring
+        self.rich: typing.Optional[RichCapture] = None # Encodes non-text clips on a worker pool, lives while monitoring
+        self.spiller: typing.Optional[ClipSpiller] = None # Streams large clips to blob files, lives while monitoring
+        self.clip_filter = clip_filter # Redacts or drops sensitive clips before they reach the writer
+        self.index: typing.Optional[ClipIndex] = None # Quick-paste index, fed every text clip saved
 
     def start(self):
         with self._lock:
             if self._running:
                 return # Already running
             self._running = True
+            self._stopping.clear()
         print("Clipboard monitor starting...")
-        self.status_update.emit("Initializing...")
-
-        # Initialize last_content before starting the loop
-        try:
-            self.last_content = pyperclip.paste()
-        except pyperclip.PyperclipException as e:
-            self.error_occurred.emit(f"Initial clipboard access failed: {e}")
-            self.last_content = "" # Fallback
-        except Exception as e:
-            self.error_occurred.emit(f"Unexpected initial clipboard error: {e}")
-            self.last_content = "" # Fallback
+        self.events.status("Initializing...")
+        self.writer = LogWriter(self.get_save_path(), dedup=DEDUP_HISTORY, on_error=self._on_write_error)
+        self.writer.start()
+        self.spiller = ClipSpiller(self.get_save_path(), max_inline=MAX_INLINE_CHARS)
+        if CAPTURE_RICH:
+            self.rich = RichCapture(blob_dir_for(self.get_save_path()), self._on_rich_record, self._on_rich_error,
+                                    clip_filter=self.clip_filter)
+
+        # Initialize each selection's fingerprint before starting the loop (missing: nothing saved yet)
+        self.last_fingerprints = {}
+        for selection in self.source.selections:
+            try:
+                self.last_fingerprints[selection] = fingerprint(self.source.read(selection))
+            except pyperclip.PyperclipException as e:
+                self.events.error(f"Initial clipboard access failed: {e}")
+            except Exception as e:
+                self.events.error(f"Unexpected initial clipboard error: {e}")
 
-        self.status_update.emit("Monitoring")
+        self.events.status("Monitoring")
 
 
+    @pyqtSlot()
     def stop(self):
+        """ Thread-safe: wakes the loop wherever it waits, so run() flushes and returns within milliseconds. """
         with self._lock:
             if not self._running:
                 return # Already stopped
             self._running = False
+            self._stopping.set()
+        self.source.interrupt()
         print("Clipboard monitor stopping...")
-        self.status_update.emit("Stopping...")
+        self.events.status("Stopping...")
 
     def is_running(self) -> bool:
         with self._lock:
             return self._running
 
+    def set_save_path(self, path: str):
+        """ Points the writer at a new file; the old one is flushed and closed first. """
+        if self.writer:
+            self.writer.set_path(path)
+        if self.spiller:
+            self.spiller.set_log(path)
+        if self.rich:
+            self.rich.set_root(blob_dir_for(path))
+
+    def capture_rich(self, mime: QtCore.QMimeData):
+        """
+        Queues images/HTML/file lists for saving. Called on the GUI thread, returns without encoding;
+        the secret rules run on the encoder threads (see RichCapture).
+        """
+        rich = self.rich
+        if rich is None or not self.is_running() or is_encrypted_path(self.get_save_path()):
+            return # Blobs would be stored unencrypted next to an encrypted log
+        if self.clip_filter and self.clip_filter.excludes(mime_owner(mime)):
+            return
+        snapshot = snapshot_mime(mime)
+        if snapshot is not None and not rich.submit(snapshot):
+            self.events.error("Encoder busy: rich clip dropped")
+
+    def _on_rich_record(self, record: ClipRecord, description: str):
+        # Called from an encoder thread once the blob is on disk
+        CHANGES.inc()
+        trace_event("detect", blob=record.content, source="mime")
+        if self.writer.submit(record):
+            self.events.saved(record.timestamp, description)
+        else:
+            self.events.error("Writer queue full: clip dropped")
+
+    def _on_rich_error(self, error: Exception):
+        record_error(error)
+        self.events.error(f"Error saving rich clip: {error}")
+
+    def _on_write_error(self, path: str, error: Exception):
+        # Called from the writer thread; events can be posted from any thread
+        self.events.error(f"Error writing to file {path}: {error}")
+        self.stop() # Stop monitoring on persistent file error
+
     def run(self):
         """The main monitoring loop executed in the QThread."""
         self.start() # Initialize and set state
@@ -102,72 +302,145 @@ class ClipboardMonitor(QObject):
                  break # Exit loop if stopped
 
             try:
-                current_content: str = pyperclip.paste()
+                # Blocks until the source reports a change (or the timeout lets us re-check _running)
+                current_content: typing.Optional[str] = self.source.wait_for_change(timeout=POLLING_INTERVAL)
 
                 # Check if content is new, not empty, and actually different
-                if isinstance(current_content, str) and \
-                   current_content != self.last_content and \
-                   current_content.strip() != "":
-
+                selection: str = self.source.selection # Each selection is deduplicated on its own
+                checked: float = time.perf_counter()
+                changed: bool = is_new_content(current_content, self.last_fingerprints.get(selection))
+                if current_content is not None:
+                    DETECT_SECONDS.observe(time.perf_counter() - checked)
+                    CHECKS.inc() # The polling source reports each tick to the scheduler itself
+
+                if changed:
                     # Update the last known content
-                    self.last_content = current_content
+                    self.last_fingerprints[selection] = fingerprint(current_content)
+                    CHANGES.inc()
+                    trace_event("detect", length=len(current_content), source=self.source.name, selection=selection)
 
                     # Get current timestamp
                     current_time: str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-                    # Format the content with timestamp
-                    content_to_save: str = f"[{current_time}] {current_content}\n"
-                    save_path = self.get_save_path() # Get the path dynamically
-
-                    # Save to file
-                    try:
-                        with open(save_path, 'a', encoding='utf-8') as file:
-                            file.write(content_to_save)
-                        # Emit signal with a preview
-                        preview = current_content[:50].replace('\n', ' ') + ('...' if len(current_content) > 50 else '')
-                        self.content_saved.emit(f"Saved: [{current_time}] {preview}")
-
-                    except IOError as e:
-                        self.error_occurred.emit(f"Error writing to file {save_path}: {e}")
-                        self.stop() # Stop monitoring on persistent file error
-                    except Exception as e:
-                        self.error_occurred.emit(f"Unexpected file write error: {e}")
-                        # Decide if we should stop or just log and continue
+                    # Secrets replaced by [REDACTED:<rule>]; large clips stored as a blob and logged as a reference
+                    result = self.spiller.filter(current_content, self.source.owner, self.clip_filter)
+                    if result.text is None:
+                        self.events.status(f"Skipped clip ({', '.join(result.rules)})")
+                        continue
+                    current_content = result.text
+
+                    # Hand the record to the writer thread (write errors come back via _on_write_error)
+                    if self.writer.submit(ClipRecord(current_time, current_content, selection)):
+                        self.events.saved(current_time, current_content) # Preview is built on delivery, if shown
+                        if self.index is not None:
+                            self.index.add(current_time, current_content)
+                    else:
+                        self.events.error("Writer queue full: clip dropped")
 
             except pyperclip.PyperclipException as e:
-                self.error_occurred.emit(f"Clipboard access error: {e}. Retrying...")
-                time.sleep(POLLING_INTERVAL * 3) # Wait longer on clipboard error
+                self.events.error(f"Clipboard access error: {e}. Retrying...")
+                record_error(e)
+                self._stopping.wait(self.scheduler.record_error()) # Jittered backoff on clipboard error
             except Exception as e:
-                 self.error_occurred.emit(f"Unexpected error in monitor loop: {e}")
-                 time.sleep(POLLING_INTERVAL * 2) # Wait a bit
+                 self.events.error(f"Unexpected error in monitor loop: {e}")
+                 record_error(e)
+                 self._stopping.wait(self.scheduler.record_error()) # Wait a bit
+
+        if self.rich:
+            self.rich.close() # Finish queued encodes so their records reach the writer
+            self.rich = None
+        self.writer.close() # Flush pending records and close the file, however long a slow disk takes
+        print("Clipboard monitor loop finished.")
+        self.events.status("Idle") # Final status update
+        # Hand the object back so the next start_monitoring() can move it to a new QThread
+        self.moveToThread(QtWidgets.QApplication.instance().thread())
 
-            # Wait before checking again only if running
-            if self.is_running():
-                time.sleep(POLLING_INTERVAL)
 
-        print("Clipboard monitor loop finished.")
-        self.status_update.emit("Idle") # Final status update
+class DaemonLink(QObject):
+    """
+    Stands in for ClipboardMonitor when a clipboard daemon (Clipboard_Saver.py daemon)
+    is running: the daemon does the monitoring and saving, this only follows it.
+    run() resumes the daemon and streams its new clips; stop() pauses it again.
+    """
+    def __init__(self, socket_path: str, events: typing.Optional[MonitorEvents] = None, parent=None):
+        super().__init__(parent)
+        self.socket_path = socket_path
+        self.pause_on_stop = True # False: just disconnect (e.g. the GUI is quitting)
+        self._running = False
+        self._lock = threading.Lock()
+        self._subscription: typing.Optional[DaemonClient] = None
+        self.events = events or MonitorEvents()
+        self.index: typing.Optional[ClipIndex] = None # Quick-paste index, fed the daemon's clips
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._running
+
+    def run(self):
+        """ Follows the daemon until stop() closes the subscription. Runs in the QThread. """
+        with self._lock:
+            self._running = True
+        try:
+            with DaemonClient(self.socket_path) as control:
+                control.resume()
+            self._subscription = DaemonClient(self.socket_path)
+            self.events.status("Monitoring (daemon)")
+            for record in self._subscription.subscribe():
+                self.events.saved(record.timestamp, record.content)
+                if self.index is not None:
+                    self.index.add(record.timestamp, record.content)
+        except DaemonError as e:
+            self.events.error(f"Daemon error: {e}")
+        with self._lock:
+            self._running = False
+        self.events.status("Idle")
+        # Hand the object back so the next start_monitoring() can move it to a new QThread
+        self.moveToThread(QtWidgets.QApplication.instance().thread())
+
+    @pyqtSlot()
+    def stop(self):
+        """ Thread-safe: pauses the daemon and ends run() by closing the subscription. """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        if self.pause_on_stop:
+            try:
+                with DaemonClient(self.socket_path) as control:
+                    control.pause()
+            except DaemonError as e:
+                self.events.error(f"Daemon error: {e}")
+        if self._subscription:
+            self._subscription.close()
+
+    def set_save_path(self, path: str):
+        pass # The daemon owns the log; Browse is disabled while linked
+
+    def capture_rich(self, mime: QtCore.QMimeData):
+        pass # The daemon saves text only
 
 
 class SystemTrayIcon(QObject):
-    """ Manages the system tray icon using pystray in a separate thread. """
+    """
+    Manages the system tray icon using pystray in a separate thread.
+    pystray and PIL are imported and the icon is built on that thread, so
+    the window does not wait for them; tray_icon is None until then.
+    """
     exit_signal = pyqtSignal() # Signal to tell the main app to quit
 
     def __init__(self, app_window: 'App', parent=None):
         super().__init__(parent)
         self.app_window = app_window
-        self.icon_image = create_default_icon() # Use the generated PIL image
-        self.tray_icon = SysTrayIcon(
-            "Clipboard Saver",
-            icon=self.icon_image,
-            menu=self.create_menu(),
-            title="Clipboard Saver"
-        )
+        self.tray_icon: typing.Optional["pystray.Icon"] = None
+        self._stopped = False
+        self._lock = threading.Lock() # Guards tray_icon/_stopped between the GUI and tray threads
         self._thread = None
 
-    def create_menu(self) -> Menu:
+    def create_menu(self) -> "pystray.Menu":
+        from pystray import Menu, MenuItem
         return Menu(
             MenuItem("Show Window", self.show_app, default=True),
+            MenuItem("Quick Paste...", self.show_picker_from_tray),
             MenuItem("Start Monitoring", self.start_monitoring_from_tray, enabled=lambda item: not self.app_window.monitor_thread or not self.app_window.clipboard_monitor.is_running()),
             MenuItem("Stop Monitoring", self.stop_monitoring_from_tray, enabled=lambda item: self.app_window.monitor_thread and self.app_window.clipboard_monitor.is_running()),
             Menu.SEPARATOR,
@@ -179,6 +452,10 @@ class SystemTrayIcon(QObject):
         self.app_window.showNormal() # Show and bring to front
         self.app_window.activateWindow()
 
+    @pyqtSlot()
+    def show_picker_from_tray(self):
+        QtCore.QMetaObject.invokeMethod(self.app_window, "show_picker", QtCore.Qt.QueuedConnection)
+
     @pyqtSlot()
     def start_monitoring_from_tray(self):
         # Use QMetaObject.invokeMethod to safely call the slot on the main thread
@@ -192,7 +469,7 @@ class SystemTrayIcon(QObject):
     @pyqtSlot()
     def exit_app(self):
         print("Exit requested from tray icon.")
-        self.tray_icon.stop()
+        self.stop()
         if self._thread:
              self._thread.join(timeout=1) # Wait briefly for tray thread to finish
         self.exit_signal.emit() # Signal the main application to quit
@@ -201,7 +478,18 @@ class SystemTrayIcon(QObject):
         """ Runs the pystray icon's event loop. """
         # This function runs in a separate thread
         print("System tray thread started.")
-        self.tray_icon.run()
+        from pystray import Icon as SysTrayIcon
+        tray_icon = SysTrayIcon(
+            "Clipboard Saver",
+            icon=create_default_icon(), # Use the generated PIL image
+            menu=self.create_menu(),
+            title="Clipboard Saver"
+        )
+        with self._lock:
+            if self._stopped:
+                return # Stopped while pystray was loading
+            self.tray_icon = tray_icon
+        tray_icon.run()
         print("System tray thread finished.") # Should happen after tray_icon.stop()
 
     def start(self):
@@ -212,12 +500,19 @@ class SystemTrayIcon(QObject):
 
     def stop(self):
         """ Stops the system tray icon. """
-        if self.tray_icon.visible:
-            self.tray_icon.stop()
+        with self._lock:
+            self._stopped = True
+            tray_icon = self.tray_icon
+        if tray_icon and tray_icon.visible:
+            tray_icon.stop()
+
+    def is_visible(self) -> bool:
+        tray_icon = self.tray_icon
+        return tray_icon is not None and tray_icon.visible
 
     def notify(self, message: str, title: str = "Clipboard Saver"):
         """ Shows a tray notification if the icon is running. """
-        if self.tray_icon and self.tray_icon.visible:
+        if self.is_visible():
             self.tray_icon.notify(message, title)
 
     def update_menu(self):
@@ -230,15 +525,43 @@ class SystemTrayIcon(QObject):
 
 class App(QtWidgets.QWidget):
     """ Main Application Window """
-    def __init__(self):
+    def __init__(self, auto_start: bool = AUTO_START):
         super().__init__()
         self.current_save_path: str = DEFAULT_SAVE_PATH
-        self.clipboard_monitor = ClipboardMonitor(lambda: self.current_save_path) # Pass function to get path
+        self.change_source: typing.Optional[PushSource] = None
+        self.clipboard_monitor: typing.Union[ClipboardMonitor, DaemonLink]
+        # A running daemon already watches the clipboard; follow it instead of monitoring (and logging) twice
+        self.daemon_socket: typing.Optional[str] = default_socket_path() if USE_DAEMON and daemon_running() else None
+        if self.daemon_socket:
+            try:
+                with DaemonClient(self.daemon_socket) as client:
+                    self.current_save_path = client.stats()["path"]
+            except DaemonError:
+                pass
+            self.clipboard_monitor = DaemonLink(self.daemon_socket)
+        else:
+            # QClipboard.dataChanged is unreliable on macOS, the monitor keeps polling for text there
+            selections = (CLIPBOARD, PRIMARY) if CAPTURE_PRIMARY and QtWidgets.QApplication.clipboard().supportsSelection() \
+                else (CLIPBOARD,)
+            self.change_source = None if sys.platform == "darwin" else PushSource(selections=selections)
+            source = self.change_source
+            if source is not None and PRIMARY in selections:
+                source = DebouncedSource(source) # A drag-selection pushes every intermediate text
+            self.clipboard_monitor = ClipboardMonitor(lambda: self.current_save_path, source, # Pass function to get path
+                                                      ClipFilter() if FILTER_SENSITIVE else None)
         self.monitor_thread: typing.Optional[QThread] = None
         self.tray_icon: typing.Optional[SystemTrayIcon] = None
-        self.init_ui()
+        self.history_panel: typing.Optional["HistoryPanel"] = None # Created on first use
+        self.picker: typing.Optional["QuickPastePicker"] = None # Created on first use
+        self.clip_index = ClipIndex(PICKER_CLIPS) # Clips saved this session until the history is loaded
+        self.clip_index_path: typing.Optional[str] = None # Log whose history clip_index holds
+        self.clipboard_monitor.index = self.clip_index
         self.init_monitor()
-        self.init_tray_icon()
+        if auto_start and self.unlock_log(self.current_save_path):
+            self.start_monitor_thread() # Capturing begins while the widgets are still being built
+        self.init_ui()
+        QtCore.QTimer.singleShot(0, self.init_tray_icon) # Once the window is up; pystray loads on its own thread
+        self.load_clip_index()
 
 
     def init_ui(self):
@@ -249,13 +572,18 @@ class App(QtWidgets.QWidget):
 
         # --- Widgets ---
         self.status_label = QtWidgets.QLabel("Status: Idle")
-        self.status_label.setStyleSheet("color: gray;")
+        self.status_style = "color: gray;" # Restyling is costly, update_status_label only does it on change
+        self.status_label.setStyleSheet(self.status_style)
 
         self.path_label = QtWidgets.QLabel(f"Saving to:")
         self.path_display = QtWidgets.QLineEdit(self.current_save_path)
         self.path_display.setReadOnly(True) # Display only
         self.browse_button = QtWidgets.QPushButton("Browse...")
         self.browse_button.clicked.connect(self.select_save_path)
+        if self.daemon_socket:
+            self.browse_button.setEnabled(False)
+            self.browse_button.setToolTip("The clipboard daemon decides where clips are saved.")
+            self.status_label.setText(f"Status: Idle (daemon at {self.daemon_socket})")
 
         self.start_button = QtWidgets.QPushButton("Start Monitoring")
         self.start_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaPlay))
@@ -264,7 +592,12 @@ class App(QtWidgets.QWidget):
         self.stop_button = QtWidgets.QPushButton("Stop Monitoring")
         self.stop_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaStop))
         self.stop_button.clicked.connect(self.stop_monitoring)
-        self.stop_button.setEnabled(False) # Initially disabled
+        self.start_button.setEnabled(self.monitor_thread is None)
+        self.stop_button.setEnabled(self.monitor_thread is not None) # Disabled unless started on launch
+
+        self.history_button = QtWidgets.QPushButton("History...")
+        self.history_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_FileDialogDetailedView))
+        self.history_button.clicked.connect(self.show_history)
 
         # --- Layouts ---
         main_layout = QtWidgets.QVBoxLayout(self)
@@ -280,6 +613,7 @@ class App(QtWidgets.QWidget):
         button_layout.addWidget(self.start_button)
         button_layout.addWidget(self.stop_button)
         button_layout.addStretch(1) # Pushes buttons to the left
+        button_layout.addWidget(self.history_button)
 
         # Add widgets and layouts to main layout
         main_layout.addWidget(self.status_label)
@@ -292,9 +626,14 @@ class App(QtWidgets.QWidget):
 
     def init_monitor(self):
         """ Sets up the signals/slots connection for the monitor. """
-        self.clipboard_monitor.content_saved.connect(self.on_content_saved)
-        self.clipboard_monitor.error_occurred.connect(self.on_monitor_error)
-        self.clipboard_monitor.status_update.connect(self.update_status_label)
+        events = self.clipboard_monitor.events
+        events.content_saved.connect(self.on_content_saved)
+        events.error_occurred.connect(self.on_monitor_error)
+        events.status_update.connect(self.update_status_label)
+        if not self.daemon_socket:
+            QtWidgets.QApplication.clipboard().dataChanged.connect(self.on_clipboard_changed)
+        if self.change_source is not None and PRIMARY in self.change_source.selections:
+            QtWidgets.QApplication.clipboard().selectionChanged.connect(self.on_selection_changed)
 
 
     def init_tray_icon(self):
@@ -310,6 +649,23 @@ class App(QtWidgets.QWidget):
             self.tray_icon = None # Ensure it's None if not available
 
 
+    @pyqtSlot()
+    def on_clipboard_changed(self):
+        """ Forwards QClipboard.dataChanged to the monitor thread (runs on the GUI thread). """
+        if self.clipboard_monitor.is_running():
+            clipboard = QtWidgets.QApplication.clipboard()
+            if self.change_source is not None:
+                self.change_source.push(clipboard.text(), mime_owner(clipboard.mimeData()))
+            self.clipboard_monitor.capture_rich(clipboard.mimeData())
+
+    @pyqtSlot()
+    def on_selection_changed(self):
+        """ Forwards PRIMARY selection changes (select-to-copy) to the monitor thread, which debounces them. """
+        if self.clipboard_monitor.is_running():
+            clipboard = QtWidgets.QApplication.clipboard()
+            self.change_source.push(clipboard.text(QtGui.QClipboard.Selection),
+                                    mime_owner(clipboard.mimeData(QtGui.QClipboard.Selection)), PRIMARY)
+
     @pyqtSlot()
     def select_save_path(self):
         """ Opens a dialog to select the save file path. """
@@ -319,30 +675,115 @@ class App(QtWidgets.QWidget):
             self,
             "Select Save File",
             self.current_save_path, # Start directory
-            "Text Files (*.txt);;All Files (*)",
+            "Text Files (*.txt);;SQLite Database (*.db);;Encrypted Log (*.enc);;All Files (*)",
             options=options)
 
+        if new_path and self.clipboard_monitor.is_running() and not self.unlock_log(new_path):
+            return # Keep writing to the current file
         if new_path:
             self.current_save_path = new_path
             self.path_display.setText(self.current_save_path)
             print(f"Save path set to: {self.current_save_path}")
-            # If monitoring, maybe notify the user or restart monitor?
-            # For now, it will use the new path on the next save.
+            # If monitoring, the writer closes the old file and continues in the new one
+            self.clipboard_monitor.set_save_path(new_path)
+            if self.history_panel:
+                self.history_panel.set_path(new_path)
+            self.save_clip_index()
+            self.clip_index = self.clipboard_monitor.index = ClipIndex(PICKER_CLIPS)
+            self.clip_index_path = None
+            self.on_clip_index_loaded()
+            self.load_clip_index()
+
+    @pyqtSlot()
+    def show_history(self):
+        """ Opens the history browser (loads rows lazily, so this is cheap even for huge logs). """
+        if self.history_panel is None:
+            from clipboard_history_view import HistoryPanel
+            self.history_panel = HistoryPanel(self.current_save_path, self)
+        self.history_panel.showNormal()
+        self.history_panel.activateWindow()
+
+    @pyqtSlot()
+    def show_picker(self):
+        """ Opens the quick-paste picker (from the tray menu). """
+        if self.picker is None:
+            from clipboard_picker import QuickPastePicker
+            self.picker = QuickPastePicker(self.clip_index)
+        self.picker.popup()
+
+    def load_clip_index(self):
+        """ Loads the picker's index (snapshot, then clips logged since) on a background thread. """
+        if is_encrypted_path(self.current_save_path):
+            from clipboard_crypto import is_unlocked
+            if not is_unlocked(self.current_save_path):
+                return # Loaded by start_monitoring() once unlocked
+        threading.Thread(target=self._load_clip_index, args=(self.current_save_path, self.clip_index),
+                         daemon=True).start()
+
+    def _load_clip_index(self, path: str, live: ClipIndex):
+        try:
+            index = open_index(path, PICKER_CLIPS)
+        except Exception as e: # A broken log must not take the picker down; it keeps this session's clips
+            print(f"Could not load the clip history for Quick Paste: {e}")
+            return
+        if self.clip_index is not live:
+            return # The log was changed meanwhile
+        index.absorb(live) # Clips saved while loading
+        self.clip_index = self.clipboard_monitor.index = index
+        self.clip_index_path = path
+        index.absorb(live) # ... and while switching over
+        QtCore.QMetaObject.invokeMethod(self, "on_clip_index_loaded", QtCore.Qt.QueuedConnection)
+
+    @pyqtSlot()
+    def on_clip_index_loaded(self):
+        if self.picker:
+            self.picker.set_index(self.clip_index)
+
+    def save_clip_index(self):
+        """ Snapshots the picker's index so the next start skips re-reading the history. """
+        path = self.clip_index_path
+        if path is None or is_encrypted_path(path):
+            return # Not loaded yet (a partial snapshot would hide older clips), or must stay encrypted
+        try:
+            self.clip_index.save(snapshot_path_for(path))
+        except OSError as e:
+            print(f"Could not save the Quick Paste index: {e}")
+
+    def unlock_log(self, path: str) -> bool:
+        """ Lets the writer open an encrypted (.enc) log: KEY_FILE, $CLIPBOARD_SAVER_PASSPHRASE or a passphrase dialog. """
+        if self.daemon_socket or not is_encrypted_path(path):
+            return True
+        from clipboard_crypto import EncryptionError, is_new_log, unlock, unlock_from_environment
+        try:
+            if unlock_from_environment(path, KEY_FILE):
+                return True
+            name = os.path.basename(path)
+            passphrase, ok = QtWidgets.QInputDialog.getText(self, "Encrypted Log", f"Passphrase for {name}:",
+                                                            QtWidgets.QLineEdit.Password)
+            if not ok:
+                return False
+            if is_new_log(path):
+                repeated, ok = QtWidgets.QInputDialog.getText(self, "Encrypted Log", f"Repeat the passphrase for {name}:",
+                                                              QtWidgets.QLineEdit.Password)
+                if not ok or repeated != passphrase:
+                    raise EncryptionError("The passphrases do not match")
+            unlock(path, passphrase)
+            return True
+        except EncryptionError as e:
+            QtWidgets.QMessageBox.warning(self, "Encrypted Log", str(e))
+            return False
 
     @pyqtSlot()
     def start_monitoring(self):
         """Starts the clipboard monitoring thread."""
+        if not self.unlock_log(self.current_save_path):
+            self.update_status_label("Idle (log locked)")
+            return
+        if self.clip_index_path is None and is_encrypted_path(self.current_save_path):
+            self.load_clip_index() # Its history can be read now that it is unlocked
         if not self.monitor_thread or not self.monitor_thread.isRunning():
             self.update_status_label("Starting...")
-            self.monitor_thread = QThread(self)
-            # Move the monitor object to the new thread
-            self.clipboard_monitor.moveToThread(self.monitor_thread)
-            # Connect the thread's started signal to the monitor's run method
-            self.monitor_thread.started.connect(self.clipboard_monitor.run)
-            # Clean up thread when finished
-            self.monitor_thread.finished.connect(self.monitor_thread.deleteLater)
-            # Start the thread's event loop
-            self.monitor_thread.start()
+            self.start_monitor_thread()
 
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
@@ -352,21 +793,32 @@ class App(QtWidgets.QWidget):
             print("Monitoring already running.")
 
 
+    def start_monitor_thread(self):
+        """ Moves the monitor to a new QThread and starts it. Needs no widgets, so it can run before init_ui(). """
+        self.monitor_thread = QThread(self)
+        # Move the monitor object to the new thread
+        self.clipboard_monitor.moveToThread(self.monitor_thread)
+        # Connect the thread's started signal to the monitor's run method
+        self.monitor_thread.started.connect(self.clipboard_monitor.run)
+        # Clean up thread when finished
+        self.monitor_thread.finished.connect(self.monitor_thread.deleteLater)
+        # Start the thread's event loop
+        self.monitor_thread.start()
+
     @pyqtSlot()
     def stop_monitoring(self):
         """Stops the clipboard monitoring thread."""
         if self.monitor_thread and self.monitor_thread.isRunning():
             self.update_status_label("Stopping...")
-            # Signal the monitor object to stop its loop
-            # Use invokeMethod for thread-safe call if monitor is in another thread
-            QtCore.QMetaObject.invokeMethod(self.clipboard_monitor, "stop", QtCore.Qt.QueuedConnection)
+            # Called directly: run() never returns to the thread's event loop, so a queued call would
+            # wait for it. stop() is thread-safe and wakes the monitor, which then flushes and returns.
+            self.clipboard_monitor.stop()
 
             # Quit the thread's event loop and wait for it to finish
             self.monitor_thread.quit()
-            if not self.monitor_thread.wait(2000): # Wait up to 2 seconds
-                 print("Warning: Monitor thread did not stop gracefully. Terminating.")
-                 self.monitor_thread.terminate() # Force terminate if needed
-                 self.monitor_thread.wait() # Wait again after terminate
+            if not self.monitor_thread.wait(2000): # Normally milliseconds
+                 print("Warning: Monitor thread is still flushing to disk. Waiting for it to finish.")
+                 self.monitor_thread.wait() # Never terminate(): that could cut a write in half
 
             self.monitor_thread = None
             self.update_status_label("Idle")
@@ -377,14 +829,19 @@ class App(QtWidgets.QWidget):
 
     @pyqtSlot(str)
     def update_status_label(self, status: str):
-        """ Updates the status label text and color. """
-        self.status_label.setText(f"Status: {status}")
+        """ Updates the status label text and color (the stylesheet only when the color changes). """
+        text = f"Status: {status}"
+        if self.status_label.text() != text:
+            self.status_label.setText(text)
         if "rror" in status.lower():
-             self.status_label.setStyleSheet("color: red; font-weight: bold;")
+             style = "color: red; font-weight: bold;"
         elif "onitoring" in status.lower() or "aved" in status.lower():
-             self.status_label.setStyleSheet("color: green;")
+             style = "color: green;"
         else:
-             self.status_label.setStyleSheet("color: gray;")
+             style = "color: gray;"
+        if style != self.status_style:
+            self.status_style = style
+            self.status_label.setStyleSheet(style)
 
     @pyqtSlot(str)
     def on_content_saved(self, message: str):
@@ -403,9 +860,22 @@ class App(QtWidgets.QWidget):
         # Optionally, show a message box for critical errors
         # QtWidgets.QMessageBox.warning(self, "Clipboard Monitor Error", error_message)
 
+    def showEvent(self, event: QtGui.QShowEvent):
+        super().showEvent(event)
+        self.clipboard_monitor.events.set_visible(not self.isMinimized())
+
+    def hideEvent(self, event: QtGui.QHideEvent):
+        super().hideEvent(event)
+        self.clipboard_monitor.events.set_visible(False) # Throttle updates nobody sees
+
+    def changeEvent(self, event: QtCore.QEvent):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            self.clipboard_monitor.events.set_visible(self.isVisible() and not self.isMinimized())
+
     def closeEvent(self, event: QtGui.QCloseEvent):
         """ Overrides the window close event to hide to tray instead. """
-        if self.tray_icon and self.tray_icon.tray_icon.visible:
+        if self.tray_icon and self.tray_icon.is_visible():
             event.ignore() # Don't close the application
             self.hide()    # Hide the main window
             self.tray_icon.notify("Clipboard Saver is running in the background.")
@@ -420,7 +890,10 @@ class App(QtWidgets.QWidget):
     def quit_application(self):
         """ Cleans up and quits the entire application. """
         print("Quit application requested.")
+        if isinstance(self.clipboard_monitor, DaemonLink):
+            self.clipboard_monitor.pause_on_stop = False # Leave the daemon running for other clients
         self.stop_monitoring() # Ensure monitor thread is stopped
+        self.save_clip_index()
 
         if self.tray_icon:
             self.tray_icon.stop() # Stop pystray icon
@@ -440,7 +913,17 @@ if __name__ == "__main__":
     # Important: Prevent Qt from quitting when the last window is hidden (if tray is active)
     app.setQuitOnLastWindowClosed(False)
 
-    window = App()
+    exporter: typing.Optional[MetricsExporter] = None
+    if METRICS_PORT is not None or METRICS_FILE:
+        exporter = MetricsExporter(port=METRICS_PORT, textfile=METRICS_FILE).start()
+    if TRACE_FILE:
+        enable_trace(TRACE_FILE)
+
+    window = App(auto_start=AUTO_START or "--start" in sys.argv[1:])
     window.show()
 
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if exporter:
+        exporter.close()
+    disable_trace()
+    sys.exit(exit_code)
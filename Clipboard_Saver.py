@@ -1,86 +1,128 @@
 
 
+import argparse
+import collections
 import pyperclip
+import sys
 import time
 import os
 from datetime import datetime
 import threading
-from typing import Optional 
+from typing import Dict, Optional, Tuple
+
+from clipboard_crypto import EncryptionError, unlock_interactive
+from clipboard_client import MAX_RESULTS, DaemonClient, DaemonError, daemon_running, default_socket_path
+from clipboard_history import iter_since, parse_time, search_history, tail_history
+from clipboard_store import CLIPBOARD, PRIMARY, format_record, is_encrypted_path, is_sqlite_path, query_db
+from clipboard_filter import ClipFilter
+from clipboard_fingerprint import Fingerprint, fingerprint, is_new_content
+from clipboard_largeclip import ClipSpiller, apply_memory_limit
+from clipboard_metrics import CHANGES, CHECKS, DETECT_SECONDS, MetricsExporter, disable_trace, enable_trace, \
+    record_error, trace_event
+from clipboard_scheduler import PollScheduler
+from clipboard_sources import ChangeSource, create_change_source
+from clipboard_writer import ClipRecord, LogWriter
 
 
 DEFAULT_FILENAME: str = "clipboard_log.txt"
 
 FILE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_FILENAME)
 POLLING_INTERVAL: int = 1
+DEDUP_HISTORY: bool = False # True: store each distinct clip once, repeats only add a timestamp reference
+FILTER_SENSITIVE: bool = True # Redact secrets and skip password-manager clips before they are saved (clipboard_filter)
+CAPTURE_PRIMARY: bool = True # Linux: also save the PRIMARY selection (select-to-copy) once a selection settles
+METRICS_PORT: Optional[int] = None # Serve Prometheus metrics on http://127.0.0.1:<port>/metrics
+METRICS_FILE: Optional[str] = None # Or rewrite them to this file (node_exporter textfile collector)
+TRACE_FILE: Optional[str] = None # JSON-lines event trace (detections, flushes, errors)
+KEY_FILE: Optional[str] = None # Key for an encrypted FILE_PATH (*.enc); otherwise the passphrase is asked for (clipboard_crypto)
+MAX_INLINE_BYTES: int = 1 << 20 # Larger clips are streamed to a blob file next to the log (clipboard_largeclip)
+MEMORY_LIMIT: Optional[int] = 1 << 30 # Hard ceiling on the monitor's memory; reads past it fail instead of swapping
+
+SELECTIONS: Tuple[str, ...] = (CLIPBOARD, PRIMARY) if CAPTURE_PRIMARY else (CLIPBOARD,)
+last_fingerprints: Dict[str, Fingerprint] = {} # Per selection: length + digest of the last saved clip, not the clip itself
+# Built by build_monitor() when monitoring starts, so the other commands never create them
+scheduler: Optional[PollScheduler] = None
+writer: Optional[LogWriter] = None # Batches records and writes them off the monitor thread
+clip_filter: Optional[ClipFilter] = None # Runs between detection and the writer
+spiller: Optional[ClipSpiller] = None # Reads the clipboard, keeps large clips out of memory
 
-last_content: Optional[str] = None
+
+def build_monitor(path: str) -> None:
+    """ Builds the scheduler, writer, filter and spiller the monitor uses for the log at path. """
+    global scheduler, writer, clip_filter, spiller
+    scheduler = PollScheduler(base_interval=POLLING_INTERVAL)
+    writer = LogWriter(path, dedup=DEDUP_HISTORY)
+    clip_filter = ClipFilter() if FILTER_SENSITIVE else None
+    spiller = ClipSpiller(path, max_inline=MAX_INLINE_BYTES)
 
 def save_clipboard_content() -> None:
     """
     Monitors the clipboard and saves new text content to the log file.
     Runs in an infinite loop until the program is terminated.
     """
-    global last_content # Use the global variable to track state across checks
-
-    print(f"Monitoring clipboard. Saving changes to: {FILE_PATH}")
-    try:
-        last_content = pyperclip.paste()
-    except pyperclip.PyperclipException as e:
-        print(f"Error accessing clipboard on startup: {e}")
-  
-        last_content = ""
-    except Exception as e:
-     
-        print(f"Unexpected error accessing clipboard on startup: {e}")
-        last_content = ""
+    source: ChangeSource = create_change_source(scheduler=scheduler, selections=SELECTIONS, read_func=spiller.paste)
+    writer.start()
+    print(f"Monitoring {' and '.join(source.selections)} ({source.name}). Saving changes to: {FILE_PATH}")
+    for selection in source.selections:
+        try:
+            last_fingerprints[selection] = fingerprint(source.read(selection))
+        except pyperclip.PyperclipException as e:
+            print(f"Error accessing clipboard on startup: {e}")
+        except Exception as e:
+            print(f"Unexpected error accessing clipboard on startup: {e}")
 
 
     while True:
         try:
-            current_content: str = pyperclip.paste()
+            current_content: Optional[str] = source.wait_for_change()
 
         
-            if isinstance(current_content, str) and \
-               current_content != last_content and \
-               current_content.strip() != "": # Check if not just whitespace
+            selection: str = source.selection # Each selection is deduplicated on its own
+            checked: float = time.perf_counter()
+            changed: bool = is_new_content(current_content, last_fingerprints.get(selection)) # Also skips whitespace-only clips
+            if current_content is not None:
+                DETECT_SECONDS.observe(time.perf_counter() - checked)
+                CHECKS.inc() # The polling source reports each tick to the scheduler itself
 
+            if changed:
              
-                last_content = current_content
+                last_fingerprints[selection] = fingerprint(current_content)
+                CHANGES.inc()
+                trace_event("detect", length=len(current_content), source=source.name, selection=selection)
 
           
                 current_time: str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            
-                content_to_save: str = f"[{current_time}] {current_content}\n"
-
+                # Secrets replaced by [REDACTED:<rule>]; large clips stored as a blob and logged as a reference
+                result = spiller.filter(current_content, source.owner, clip_filter)
+                if result.text is None:
+                    print(f"Skipped clip from [{current_time}] ({', '.join(result.rules)})")
+                    continue
+                current_content = result.text
       
-                try:
-                    with open(FILE_PATH, 'a', encoding='utf-8') as file:
-                        file.write(content_to_save)
-                  
+                # Queued for the writer thread, which reports its own I/O errors
+                if writer.submit(ClipRecord(current_time, current_content, selection)):
                     print(f"Saved: [{current_time}] {current_content[:50]}...") # Show preview
-
-                except IOError as e:
-                    print(f"Error writing to file {FILE_PATH}: {e}")
-                except Exception as e:
-                    print(f"An unexpected error occurred during file write: {e}")
+                else:
+                    print(f"Writer queue full, dropped clip from [{current_time}]")
 
         except pyperclip.PyperclipException as e:
       
             print(f"Error accessing clipboard: {e}. Retrying...")
+            record_error(e)
            
-            time.sleep(POLLING_INTERVAL * 5) # Wait longer if clipboard access fails
+            time.sleep(scheduler.record_error()) # Jittered backoff while clipboard access fails
         except Exception as e:
        
              print(f"An unexpected error occurred during clipboard check: {e}. Retrying...")
-             time.sleep(POLLING_INTERVAL * 2) 
-
-        time.sleep(POLLING_INTERVAL)
+             record_error(e)
+             time.sleep(scheduler.record_error())
 
 def start_clipboard_monitoring() -> None:
     """
     Starts the clipboard monitoring function in a separate daemon thread.
     """
+    build_monitor(FILE_PATH)
     print("Starting clipboard monitoring thread...")
    
     clipboard_thread = threading.Thread(target=save_clipboard_content, daemon=True)
@@ -88,7 +130,210 @@ def start_clipboard_monitoring() -> None:
     print("Clipboard monitoring started in the background.")
 
 
+def run_history_command(args: argparse.Namespace) -> int:
+    """
+    Handles the `tail` and `search` subcommands. Asks the daemon when one is
+    running (and no --file was given); otherwise reads the history without
+    loading it into memory (see clipboard_history). Prints matching records.
+    """
+    try:
+        since: Optional[str] = parse_time(args.since) if args.since else None
+        until: Optional[str] = parse_time(args.until) if getattr(args, "until", None) else None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.file is None and daemon_running(args.socket):
+        try:
+            with DaemonClient(args.socket) as client:
+                if args.command == "tail":
+                    records = client.recent(args.limit, since)
+                else:
+                    records = client.search(args.keyword, since, until, args.ignore_case, args.limit or MAX_RESULTS)
+        except DaemonError as e:
+            print(e, file=sys.stderr)
+            return 1
+        for record in records:
+            sys.stdout.write(format_record(record))
+        if args.command == "search" and not args.limit and len(records) >= MAX_RESULTS:
+            print(f"The daemon returns at most {MAX_RESULTS} matches; use --file to list them all.", file=sys.stderr)
+        return 0
+
+    path: str = args.file or FILE_PATH
+    if not os.path.exists(path):
+        print(f"No history found at {path}", file=sys.stderr)
+        return 1
+
+    if is_encrypted_path(path):
+        try:
+            unlock_interactive(path, KEY_FILE)
+        except EncryptionError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    if is_sqlite_path(path):
+        keyword = args.keyword if args.command == "search" else None
+        records = list(reversed(query_db(path, keyword=keyword, start=since, end=until, limit=args.limit or -1,
+                                          ignore_case=args.command == "search" and args.ignore_case)))  # -1: all rows
+    elif args.command == "tail":
+        records = tail_history(path, args.limit) if since is None else \
+            collections.deque(iter_since(path, since), maxlen=args.limit) # Constant memory: keeps the last N
+    else:
+        records = _limited(search_history(path, args.keyword, since, until, args.ignore_case), args.limit)
+
+    for record in records:
+        sys.stdout.write(format_record(record))
+    return 0
+
+
+def run_daemon_command(args: argparse.Namespace) -> int:
+    """ Handles `stats`, `pause`, `resume` and `watch`, which talk to a running daemon. """
+    try:
+        with DaemonClient(args.socket) as client:
+            if args.command == "watch":
+                print(f"Watching {client.socket_path}. Press Ctrl+C to stop.")
+                for record in client.subscribe():
+                    sys.stdout.write(format_record(record))
+                    sys.stdout.flush()
+                return 0
+            result = getattr(client, args.command)()
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    if args.command == "stats":
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    else:
+        print("Paused." if result["paused"] else "Monitoring.")
+    return 0
+
+
+def run_transfer_command(args: argparse.Namespace) -> int:
+    """
+    Handles `export` (the history at --file or FILE_PATH to another file)
+    and `import` (another history into --file or FILE_PATH: SQLite rows, or
+    compressed segments next to a text log). See clipboard_transfer.
+    """
+    from clipboard_rotation import RETENTION_BYTES, list_segments # Only needed here
+    from clipboard_transfer import SEGMENTS, format_stats, transfer
+    path: str = args.file or FILE_PATH
+    if args.command == "export":
+        source, target, target_format = path, args.target, args.format
+    else:
+        source, target = args.source, path
+        target_format = None if is_sqlite_path(path) else SEGMENTS
+    try:
+        stats = transfer(source, target, target_format, workers=args.workers, dedup=args.dedup, compact=args.compact)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(format_stats(stats))
+    for written in stats["paths"]:
+        print(f"Wrote {written}")
+    if args.command == "import" and target_format == SEGMENTS and RETENTION_BYTES and \
+            sum(os.path.getsize(segment.path) for segment in list_segments(path)) > RETENTION_BYTES:
+        print(f"Warning: segments of {path} now exceed RETENTION_BYTES; the oldest will be deleted at the next "
+              f"rotation unless it is raised (clipboard_rotation.py)", file=sys.stderr)
+    return 0
+
+
+def _limited(records, limit: int):
+    for i, record in enumerate(records):
+        if limit and i >= limit:
+            return
+        yield record
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Saves clipboard text to a log file. Run without a command to start monitoring.")
+    parser.add_argument("--socket", default=None, help=f"Daemon socket (default: {default_socket_path()})")
+    history_options = argparse.ArgumentParser(add_help=False)
+    history_options.add_argument("--file", default=None,
+                                 help=f"Read this history file instead of asking the daemon (default: {FILE_PATH})")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, help="Write Prometheus metrics to this file every few seconds")
+    parser.add_argument("--trace", default=TRACE_FILE, help="Append a JSON-lines event trace to this file")
+    commands = parser.add_subparsers(dest="command")
+
+    tail_parser = commands.add_parser("tail", parents=[history_options], help="Print the most recent clips")
+    tail_parser.add_argument("-n", dest="limit", type=int, default=10, help="Number of clips (default: 10)")
+    tail_parser.add_argument("--since", help="Only clips since a time: 30m, 1h, 2d or 'YYYY-mm-dd HH:MM:SS'")
+
+    search_parser = commands.add_parser("search", parents=[history_options], help="Print clips containing a keyword")
+    search_parser.add_argument("keyword")
+    search_parser.add_argument("--since", help="Start time: 30m, 1h, 2d or 'YYYY-mm-dd HH:MM:SS'")
+    search_parser.add_argument("--until", help="End time, same formats as --since")
+    search_parser.add_argument("-i", "--ignore-case", action="store_true")
+    search_parser.add_argument("-n", "--limit", type=int, default=0,
+                               help=f"Stop after this many matches (default: all; at most {MAX_RESULTS} from the daemon)")
+
+    transfer_options = argparse.ArgumentParser(add_help=False)
+    transfer_options.add_argument("--file", default=None, help=f"Your history file (default: {FILE_PATH})")
+    transfer_options.add_argument("--dedup", action="store_true",
+                                  help="Drop records identical to one already written (same time and content)")
+    transfer_options.add_argument("--compact", action="store_true",
+                                  help="Write repeated clips as references (text and SQLite targets)")
+    transfer_options.add_argument("--workers", type=int, default=None, help="Parallel processes (default: one per CPU)")
+
+    export_parser = commands.add_parser("export", parents=[transfer_options],
+                                        help="Copy the history to a JSON Lines, SQLite or text file, or segments")
+    export_parser.add_argument("target", help="Output file; the format follows the extension (.jsonl, .db, .txt)")
+    export_parser.add_argument("--format", choices=("text", "jsonl", "sqlite", "segments"), default=None,
+                               help="Override the format; segments writes compressed rotated segments of target")
+
+    import_parser = commands.add_parser("import", parents=[transfer_options],
+                                        help="Add another history (text log, .jsonl or .db) to yours")
+    import_parser.add_argument("source")
+
+    commands.add_parser("daemon", help="Monitor in the background and serve history to other tools over a local socket")
+    commands.add_parser("stats", help="Show the daemon's counters")
+    commands.add_parser("pause", help="Tell the daemon to stop saving clips until resumed")
+    commands.add_parser("resume", help="Tell the daemon to save clips again")
+    commands.add_parser("watch", help="Print clips as the daemon saves them")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    cli_args = parse_args()
+    if cli_args.command in ("tail", "search"):
+        sys.exit(run_history_command(cli_args))
+    if cli_args.command in ("export", "import"):
+        sys.exit(run_transfer_command(cli_args))
+    if cli_args.command in ("stats", "pause", "resume", "watch"):
+        sys.exit(run_daemon_command(cli_args))
+    if cli_args.command != "daemon" and daemon_running(cli_args.socket):
+        print("A clipboard daemon is already monitoring; not starting a second monitor. "
+              "Use `watch` to follow new clips or `pause`/`resume` to control it.")
+        sys.exit(1)
+
+    if is_encrypted_path(FILE_PATH):
+        try:
+            unlock_interactive(FILE_PATH, KEY_FILE) # Before the writer thread opens the log
+        except EncryptionError as e:
+            print(e)
+            sys.exit(1)
+
+    apply_memory_limit(MEMORY_LIMIT) # Monitor and daemon only: the commands above may load whole histories
+
+    exporter: Optional[MetricsExporter] = None
+    if cli_args.metrics_port is not None or cli_args.metrics_file:
+        exporter = MetricsExporter(port=cli_args.metrics_port, textfile=cli_args.metrics_file).start()
+        if exporter.port is not None:
+            print(f"Serving metrics on http://127.0.0.1:{exporter.port}/metrics")
+    if cli_args.trace:
+        enable_trace(cli_args.trace)
+
+    if cli_args.command == "daemon":
+        from clipboard_daemon import run_daemon # asyncio is only needed by the daemon itself
+        exit_code = run_daemon(FILE_PATH, cli_args.socket, dedup=DEDUP_HISTORY,
+                               clip_filter=ClipFilter() if FILTER_SENSITIVE else None, selections=SELECTIONS,
+                               spiller=ClipSpiller(FILE_PATH, max_inline=MAX_INLINE_BYTES))
+        if exporter:
+            exporter.close()
+        disable_trace()
+        sys.exit(exit_code)
+
     start_clipboard_monitoring()
 
   
@@ -102,4 +347,8 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\nAn unexpected error occurred in the main loop: {e}")
     finally:
+        writer.close() # Flush anything still queued
+        if exporter:
+            exporter.close()
+        disable_trace()
         print("Exiting application.")
@@ -0,0 +1,89 @@
+"""
+Benchmarks rich clipboard capture: what the GUI thread pays versus what
+the encoder pool does in the background.
+
+For a few screenshot sizes it times snapshot_mime() (the only step on the
+GUI thread), the PNG encode and blob write done by RichCapture's workers,
+and the end-to-end throughput of a burst of distinct screenshots.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_capture.py [--burst 20]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5 import QtCore, QtGui, QtWidgets  # noqa: E402
+
+from clipboard_capture import RichCapture, encode_png, snapshot_mime  # noqa: E402
+
+SIZES = [("1280x720", 1280, 720), ("1920x1080", 1920, 1080), ("3840x2160", 3840, 2160)]
+
+
+def make_screenshot(width: int, height: int, seed: int) -> QtGui.QImage:
+    """ Something between a flat UI and a photo: gradients plus a few shapes, so PNG has work to do. """
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    painter = QtGui.QPainter(image)
+    gradient = QtGui.QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QtGui.QColor.fromHsv(seed * 37 % 360, 120, 240))
+    gradient.setColorAt(1, QtGui.QColor.fromHsv(seed * 91 % 360, 200, 90))
+    painter.fillRect(0, 0, width, height, gradient)
+    for i in range(40):
+        painter.fillRect((i * 97 + seed) % width, (i * 53) % height, 120, 40, QtGui.QColor.fromHsv(i * 9 % 360, 90, 250))
+        painter.drawText((i * 61) % width, (i * 29 + 20) % height, f"window {i} of {seed}")
+    painter.end()
+    return image
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=20, help="Screenshots per throughput run")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)  # noqa: F841 (QImage/QMimeData need an application)
+    workdir = tempfile.mkdtemp(prefix="clip-capture-bench-")
+    try:
+        print(f"{'size':<10} {'GUI thread':>12} {'PNG encode':>12} {'PNG size':>10} {'burst':>14}")
+        for label, width, height in SIZES:
+            image = make_screenshot(width, height, 0)
+            mime = QtCore.QMimeData()
+            mime.setImageData(image)
+
+            started = time.perf_counter()
+            for _ in range(100):
+                snapshot_mime(mime)
+            gui_ms = (time.perf_counter() - started) * 1000 / 100
+
+            started = time.perf_counter()
+            png = encode_png(image)
+            encode_ms = (time.perf_counter() - started) * 1000
+
+            # Burst: distinct screenshots submitted back to back, as fast as the GUI thread can
+            images = [make_screenshot(width, height, seed) for seed in range(1, args.burst + 1)]
+            done = threading.Semaphore(0)
+            capture = RichCapture(os.path.join(workdir, label), lambda record, description: done.release(),
+                                  max_pending=args.burst)
+            started = time.perf_counter()
+            for shot in images:
+                mime = QtCore.QMimeData()
+                mime.setImageData(shot)
+                capture.submit(snapshot_mime(mime))
+            for _ in images:
+                done.acquire()
+            burst = time.perf_counter() - started
+            capture.close()
+
+            print(f"{label:<10} {gui_ms:>9.3f} ms {encode_ms:>9.1f} ms {png.size() / 1024:>7.0f} KB "
+                  f"{args.burst / burst:>9.1f} img/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares clipboard change sources under a synthetic copy burst.
+
+A fake clipboard stands in for pyperclip: every paste() is counted as one
+subprocess spawn (which is what xclip/xsel cost on Linux). A copier thread
+performs a burst of copies followed by an idle period, and a monitor loop
+records what each source delivered.
+
+Usage:
+    python benchmarks/bench_change_sources.py [--copies 50] [--gap 0.02] [--idle 3]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_scheduler import PollScheduler  # noqa: E402
+from clipboard_sources import ChangeSource, PollingSource, PushSource  # noqa: E402
+
+
+class FakeClipboard:
+    """ In-process clipboard that counts reads like subprocess spawns. """
+    def __init__(self):
+        self.text = ""
+        self.spawns = 0
+        self._lock = threading.Lock()
+
+    def paste(self) -> str:
+        with self._lock:
+            self.spawns += 1
+            return self.text
+
+    def copy(self, text: str) -> None:
+        with self._lock:
+            self.text = text
+
+
+def run_scenario(source: ChangeSource, clipboard: FakeClipboard, copies: int, gap: float, idle: float) -> dict:
+    captured = set()
+    done = threading.Event()
+
+    def copier():
+        for i in range(copies):
+            text = f"clip-{i}"
+            clipboard.copy(text)
+            if isinstance(source, PushSource):
+                source.push(text)  # What QClipboard.dataChanged would deliver
+            time.sleep(gap)
+        time.sleep(idle)
+        done.set()
+
+    last = source.read()
+    thread = threading.Thread(target=copier, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    while not done.is_set():
+        current = source.wait_for_change(timeout=0.1)
+        changed = current is not None and current != last
+        if changed:
+            captured.add(current)
+            last = current
+    elapsed = time.perf_counter() - started
+    return {
+        "source": source.name,
+        "wakeups": source.wakeups,
+        "spawns": clipboard.spawns,
+        "captured": len(captured),
+        "missed": copies - len(captured),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=50, help="Copies in the burst")
+    parser.add_argument("--gap", type=float, default=0.02, help="Seconds between copies")
+    parser.add_argument("--idle", type=float, default=3.0, help="Idle seconds after the burst")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval")
+    args = parser.parse_args()
+
+    results = []
+    clipboard = FakeClipboard()
+    results.append(run_scenario(PollingSource(args.interval, clipboard.paste), clipboard,
+                                args.copies, args.gap, args.idle))
+    clipboard = FakeClipboard()
+    scheduler = PollScheduler(base_interval=args.interval)
+    adaptive = PollingSource(args.interval, clipboard.paste, scheduler=scheduler)
+    adaptive.name = "adaptive"
+    results.append(run_scenario(adaptive, clipboard, args.copies, args.gap, args.idle))
+    clipboard = FakeClipboard()
+    results.append(run_scenario(PushSource(clipboard.paste), clipboard,
+                                args.copies, args.gap, args.idle))
+
+    print(f"{'source':<8} {'wakeups':>8} {'spawns':>8} {'captured':>9} {'missed':>7} {'seconds':>8}")
+    for r in results:
+        print(f"{r['source']:<8} {r['wakeups']:>8} {r['spawns']:>8} {r['captured']:>9} {r['missed']:>7} {r['seconds']:>8}")
+    print(f"adaptive scheduler: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    main()
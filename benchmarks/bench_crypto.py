@@ -0,0 +1,108 @@
+"""
+Append and read throughput of the encrypted log against the plain text log.
+
+Writes --records synthetic clips in LogWriter-sized batches (BATCH_SIZE,
+flushed after every batch the way the writer does) to a TextLogStore and
+to an EncryptedLogStore, then streams both back (iter_log_records() and
+iter_encrypted_records()). Each is timed --repeat times, keeping the best.
+Also reports how long unlocking with a passphrase takes (scrypt, once per
+process).
+
+Exits non-zero if encrypted append or read throughput is below
+--min-ratio of the plain text log's.
+
+Usage:
+    python benchmarks/bench_crypto.py [--records 200000] [--repeat 3] [--min-ratio 0.5]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_crypto import EncryptedLogStore, generate_key_file, iter_encrypted_records, unlock  # noqa: E402
+from clipboard_store import ClipRecord, TextLogStore, iter_log_records  # noqa: E402
+from clipboard_writer import BATCH_SIZE  # noqa: E402
+
+WORDS = ("the quick brown fox jumps over lazy dog clipboard history search index record "
+         "monitor writer thread queue batch commit config value server client request").split()
+
+
+def make_records(count: int, rng: random.Random) -> list:
+    snippets = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 80))) for _ in range(500)]
+    return [ClipRecord(f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}",
+                       f"{snippets[i % 500]}\n{snippets[i % 499]}" if i % 5 == 0 else f"{snippets[i % 500]} #{i}")
+            for i in range(count)]
+
+
+def append(store, records: list) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(records), BATCH_SIZE):
+        store.write_batch(records[i:i + BATCH_SIZE])
+        store.sync()
+    store.close()
+    return time.perf_counter() - started
+
+
+def read(iterate, path: str, expected: int) -> float:
+    started = time.perf_counter()
+    count = sum(1 for _ in iterate(path))
+    seconds = time.perf_counter() - started
+    if count != expected:
+        raise SystemExit(f"{path}: read {count} of {expected} records")
+    return seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-ratio", type=float, default=0.5,
+                        help="Min encrypted / plain text throughput, for appending and for reading")
+    args = parser.parse_args()
+
+    records = make_records(args.records, random.Random(42))
+    workdir = tempfile.mkdtemp(prefix="clip-crypto-bench-")
+    try:
+        key_path = os.path.join(workdir, "clipboard.key")
+        generate_key_file(key_path)
+        started = time.perf_counter()
+        unlock(os.path.join(workdir, "passphrase.enc"), "benchmark passphrase")
+        EncryptedLogStore(os.path.join(workdir, "passphrase.enc")).close()  # Derives the key: scrypt
+        unlock_ms = (time.perf_counter() - started) * 1000
+
+        appends, reads = [], []
+        for run in range(args.repeat):
+            plain_path = os.path.join(workdir, f"clipboard_log_{run}.txt")
+            encrypted_path = os.path.join(workdir, f"clipboard_log_{run}.enc")
+            unlock(encrypted_path, key_file=key_path)
+            appends.append((append(TextLogStore(plain_path), records),
+                            append(EncryptedLogStore(encrypted_path), records)))
+            reads.append((read(iter_log_records, plain_path, len(records)),
+                          read(iter_encrypted_records, encrypted_path, len(records))))
+        results = {name: (min(plain for plain, _ in runs), min(encrypted for _, encrypted in runs))
+                   for name, runs in (("append", appends), ("read", reads))}
+        size = os.path.getsize(plain_path)
+        overhead = os.path.getsize(encrypted_path) - size
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{len(records)} records, {size / 1e6:.1f} MB, batches of {BATCH_SIZE}; "
+          f"encryption adds {overhead / 1e3:.0f} KB; passphrase unlock {unlock_ms:.0f} ms")
+    print("           plain MB/s   encrypted MB/s   ratio")
+    worst = 1.0
+    for name, (plain, encrypted) in results.items():
+        ratio = plain / encrypted
+        worst = min(worst, ratio)
+        print(f"{name:10s} {size / plain / 1e6:10.1f} {size / encrypted / 1e6:16.1f} {ratio:7.2f}")
+    if worst < args.min_ratio:
+        print(f"FAIL: encrypted throughput is {worst:.2f}x plain text (min {args.min_ratio})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
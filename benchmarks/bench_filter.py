@@ -0,0 +1,136 @@
+"""
+Throughput of the sensitive-content filter with 10 vs 1000 rules.
+
+Scans a synthetic corpus (prose, code, paths, hashes and a few real-looking
+secrets) in clip-sized pieces through ClipFilter.apply() and reports MB/s
+for:
+
+* the first 10 built-in secret rules,
+* 1000 rules: the built-in ones, synthetic token rules with distinct
+  literal prefixes and case-insensitive literal terms,
+* the same 1000 rules without the trie: one plain alternation, and one
+  compiled pattern per rule searched in turn. Both are slow enough that
+  they only scan the first --baseline-clips clips.
+
+Exits non-zero if ClipFilter with 1000 rules is less than --min-speedup
+times faster than the plain alternation of the same rules, or drops below
+--min-ratio of its own throughput with 10 rules (0.15-0.25 today: the cost
+grows with the trie's fan-out and the case-insensitive rules take a second
+pass, see clipboard_filter).
+
+Usage:
+    python benchmarks/bench_filter.py [--size-mb 4] [--clip-kb 4] [--baseline-clips 4] [--min-speedup 4]
+                                      [--min-ratio 0.1]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_filter import SECRET_RULES, ClipFilter, Rule, terms_rule  # noqa: E402
+
+WORDS = ("the quick brown fox jumps over lazy dog clipboard history search index record "
+         "monitor writer thread queue batch commit config value server client request").split()
+
+
+def make_corpus(size: int, rng: random.Random) -> str:
+    pieces = []
+    total = 0
+    alphabet = string.ascii_letters + string.digits
+    while total < size:
+        roll = rng.random()
+        if roll < 0.6:
+            piece = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))) + ".\n"
+        elif roll < 0.8:
+            piece = f"    result = {rng.choice(WORDS)}_{rng.choice(WORDS)}(path='/usr/lib/{rng.choice(WORDS)}/{rng.randint(1, 99)}')\n"
+        elif roll < 0.95:
+            piece = f"commit {''.join(rng.choice('0123456789abcdef') for _ in range(40))}\n"
+        elif roll < 0.98:
+            piece = f"token {''.join(rng.choice(alphabet) for _ in range(40))}\n"
+        else:
+            piece = f"export AWS_KEY=AKIA{''.join(rng.choice(string.ascii_uppercase) for _ in range(16))}\n"
+        pieces.append(piece)
+        total += len(piece)
+    return "".join(pieces)
+
+
+def make_rules(count: int, rng: random.Random) -> list:
+    rules = list(SECRET_RULES)
+    synthetic = (count - len(rules)) // 2
+    for i in range(synthetic):
+        prefix = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 6)))
+        rules.append(Rule(f"token_{i}", prefix + r"_[A-Za-z0-9]{20,40}"))
+    terms = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12))) + ".internal"
+             for _ in range(count - len(rules))]
+    return rules + terms_rule("internal_host", terms)
+
+
+def rule_pattern(rule: Rule) -> str:
+    pattern = re.escape(rule.pattern) if rule.literal else rule.pattern
+    return f"(?i:{pattern})" if rule.ignore_case else pattern
+
+
+def throughput(scan, clips: list) -> float:
+    size = sum(len(clip) for clip in clips)
+    started = time.perf_counter()
+    for clip in clips:
+        scan(clip)
+    return size / (time.perf_counter() - started) / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--clip-kb", type=float, default=4, help="Size of each scanned clip")
+    parser.add_argument("--baseline-clips", type=int, default=4, help="Clips scanned by the comparisons")
+    parser.add_argument("--min-speedup", type=float, default=4,
+                        help="Min ClipFilter / plain alternation throughput with 1000 rules")
+    parser.add_argument("--min-ratio", type=float, default=0.1,
+                        help="Min ClipFilter throughput with 1000 rules / with 10 rules")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = make_corpus(int(args.size_mb * 1e6), rng)
+    step = int(args.clip_kb * 1024)
+    clips = [corpus[i:i + step] for i in range(0, len(corpus), step)]
+    small = ClipFilter(SECRET_RULES[:10])
+    rules = make_rules(1000, rng)
+
+    started = time.perf_counter()
+    large = ClipFilter(rules)
+    compile_ms = (time.perf_counter() - started) * 1000
+    alternation = re.compile("|".join(f"(?P<r{i}>{rule_pattern(rule)})" for i, rule in enumerate(rules)))
+    separate = [re.compile(rule_pattern(rule)) for rule in rules]
+
+    baseline = clips[:args.baseline_clips]
+    results = [
+        ("ClipFilter, 10 rules", throughput(small.apply, clips)),
+        ("ClipFilter, 1000 rules", throughput(large.apply, clips)),
+        ("plain alternation, 1000 rules", throughput(alternation.search, baseline)),
+        ("pattern per rule, 1000 rules", throughput(lambda clip: [p.search(clip) for p in separate], baseline)),
+    ]
+    print(f"{len(corpus) / 1e6:.1f} MB in {len(clips)} clips of {args.clip_kb:g} KB; "
+          f"1000-rule filter compiled in {compile_ms:.0f} ms")
+    for name, mb_per_s in results:
+        print(f"{name:32s} {mb_per_s:8.3f} MB/s")
+    speedup = results[1][1] / results[2][1]
+    ratio = results[1][1] / results[0][1]
+    print(f"1000 vs 10 rules: {ratio:.2f}x the throughput; {speedup:.1f}x a plain alternation")
+    failed = False
+    if speedup < args.min_speedup:
+        print(f"FAIL: ClipFilter is only {speedup:.1f}x faster than a plain alternation (min {args.min_speedup})")
+        failed = True
+    if ratio < args.min_ratio:
+        print(f"FAIL: 1000 rules run at {ratio:.2f}x the throughput of 10 rules (min {args.min_ratio})")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
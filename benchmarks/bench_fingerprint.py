@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: full-string comparison vs fingerprint change detection.
+
+Two cases per payload size: an idle poll (the clipboard returns a fresh
+string equal to the previous clip) and a change (same length, different
+content). The old check compares against the retained previous string and
+strips the new one; the new check hashes it against a Fingerprint.
+Reports time per check and peak extra memory allocated by the check.
+
+Usage:
+    python benchmarks/bench_fingerprint.py [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_fingerprint import fingerprint, is_new_content  # noqa: E402
+
+SIZES = [("1 KB", 1024), ("1 MB", 1024 ** 2), ("50 MB", 50 * 1024 ** 2)]
+
+
+def old_check(current: str, last: str) -> bool:
+    return current != last and current.strip() != ""
+
+
+def measure(check, make_input, repeat: int):
+    best = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        current = make_input()  # Fresh object, like every pyperclip.paste() result
+        tracemalloc.start()
+        started = time.perf_counter()
+        check(current)
+        elapsed = time.perf_counter() - started
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = min(best, elapsed)
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'payload':<8} {'case':<7} {'old ms':>9} {'old peak':>10} {'new ms':>9} {'new peak':>10}")
+    for label, size in SIZES:
+        # Trailing newline makes strip() copy, as it does for most pasted log dumps
+        last = "x" * (size - 2) + "a\n"
+        last_fp = fingerprint(last)
+        cases = [
+            ("idle", lambda: (last + " ")[:-1]),
+            ("change", lambda: last[:-2] + "b\n"),
+        ]
+        for case, make_input in cases:
+            old_time, old_peak = measure(lambda cur: old_check(cur, last), make_input, args.repeat)
+            new_time, new_peak = measure(lambda cur: is_new_content(cur, last_fp), make_input, args.repeat)
+            print(f"{label:<8} {case:<7} {old_time * 1000:>9.3f} {old_peak / 1024:>8.0f}KB "
+                  f"{new_time * 1000:>9.3f} {new_peak / 1024:>8.0f}KB")
+    print("The old check also keeps the previous clip alive between polls; the fingerprint is 2 ints.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+GUI event-loop latency while the monitor saves a burst of clips.
+
+Builds Clipboard_Saver-GUI.py's App (offscreen Qt, throwaway log), starts
+monitoring and pushes --clips distinct synthetic clips into its change
+source from another thread, as fast as the writer accepts them. Meanwhile
+a 5 ms timer on the GUI thread records how late it fires, which is how
+long the event loop was busy with something else. Reported per mode:
+
+* per-event: every save, error and status change delivered as its own
+  signal, the way the monitor talked to the window before coalescing,
+* coalesced: MonitorEvents merges updates within FRAME_INTERVAL_MS,
+* hidden: coalesced with the window hidden (HIDDEN_INTERVAL_MS, no previews).
+
+along with the time to save all clips and how often the status label's
+text and stylesheet were set.
+
+Exits non-zero if the coalesced p99 lateness exceeds --max-p99-ms.
+
+Usage:
+    python benchmarks/bench_gui_events.py [--clips 10000] [--max-p99-ms 50]
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("PYSTRAY_BACKEND", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyperclip  # noqa: E402
+from PyQt5 import QtCore, QtWidgets  # noqa: E402
+
+from clipboard_metrics import CHANGES  # noqa: E402
+from clipboard_sources import PushSource  # noqa: E402
+
+PROBE_MS = 5
+TIMEOUT = 120.0
+
+
+def load_gui():
+    spec = importlib.util.spec_from_file_location("clipboard_saver_gui", os.path.join(ROOT, "Clipboard_Saver-GUI.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    return gui
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_mode(gui, app: QtWidgets.QApplication, workdir: str, clips: int, per_event: bool, hidden: bool) -> dict:
+    gui.DEFAULT_SAVE_PATH = os.path.join(workdir, f"clipboard_log_{time.monotonic_ns()}.txt")
+    window = gui.App(auto_start=False)
+    source = PushSource(maxsize=clips + 1) # Room for the whole burst: nothing is dropped before the monitor sees it
+    window.change_source = window.clipboard_monitor.source = source
+    if per_event:
+        window.clipboard_monitor.events.interval_ms = 0
+    window.show()
+    if hidden:
+        window.hide()
+
+    counts = {"setText": 0, "setStyleSheet": 0}
+    label = window.status_label
+    for name in counts:
+        def counted(*args, _name=name, _method=getattr(label, name)):
+            counts[_name] += 1
+            return _method(*args)
+        setattr(label, name, counted)
+
+    lateness = []
+    last = [time.perf_counter()]
+    start_changes = CHANGES.value()
+    done = {}
+
+    def probe() -> None:
+        now = time.perf_counter()
+        lateness.append(max(0.0, (now - last[0]) * 1000 - PROBE_MS))
+        last[0] = now
+        if CHANGES.value() - start_changes >= clips and "saved" not in done:
+            done["saved"] = now
+            app.quit()
+
+    def pump() -> None:
+        for i in range(clips):
+            source.push(f"synthetic clip {i}: " + "lorem ipsum dolor sit amet " * (1 + i % 8))
+
+    def begin() -> None:
+        done["started"] = last[0] = time.perf_counter()
+        timer.start()
+        threading.Thread(target=pump, daemon=True).start()
+
+    timer = QtCore.QTimer(interval=PROBE_MS, timeout=probe)
+    timer.setTimerType(QtCore.Qt.PreciseTimer)
+    window.start_monitoring()
+    QtCore.QTimer.singleShot(0, begin)
+    QtCore.QTimer.singleShot(int(TIMEOUT * 1000), app.quit)
+    app.exec_()
+    timer.stop()
+    window.stop_monitoring()
+    window.hide()
+    if "saved" not in done:
+        raise SystemExit(f"Only {CHANGES.value() - start_changes:.0f} of {clips} clips saved within {TIMEOUT:.0f} s")
+    return {
+        "seconds": done["saved"] - done["started"],
+        "p50": statistics.median(lateness),
+        "p99": percentile(lateness, 0.99),
+        "max": max(lateness),
+        "setText": counts["setText"],
+        "setStyleSheet": counts["setStyleSheet"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=10000)
+    parser.add_argument("--max-p99-ms", type=float, default=50.0,
+                        help="Max p99 event-loop lateness with coalescing")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    app.setQuitOnLastWindowClosed(False)
+    pyperclip.paste = lambda: app.clipboard().text() # No system clipboard in a headless run
+    gui = load_gui()
+    gui.USE_DAEMON = False
+    gui.FILTER_SENSITIVE = False # Measure delivery, not the filter (benchmarks/bench_filter.py)
+    workdir = tempfile.mkdtemp(prefix="clip-gui-bench-")
+    try:
+        results = {
+            "per-event": run_mode(gui, app, workdir, args.clips, per_event=True, hidden=False),
+            "coalesced": run_mode(gui, app, workdir, args.clips, per_event=False, hidden=False),
+            "hidden": run_mode(gui, app, workdir, args.clips, per_event=False, hidden=True),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.clips} clips      saved in   lateness p50    p99    max   setText  setStyleSheet")
+    for name, r in results.items():
+        print(f"{name:14s} {r['seconds']:8.2f} s {r['p50']:9.1f} ms {r['p99']:6.1f} {r['max']:6.1f} "
+              f"{r['setText']:9d} {r['setStyleSheet']:14d}")
+    p99 = results["coalesced"]["p99"]
+    if p99 > args.max_p99_ms:
+        print(f"FAIL: p99 event-loop lateness {p99:.1f} ms exceeds {args.max_p99_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmarks the streaming history reader on a generated text log.
+
+Compares the mmap reader (binary-search seek, backwards tail, byte-level
+keyword search) against a plain line-by-line scan of the whole file, and
+reports the peak Python heap used by each, which should stay flat as the log grows.
+
+Usage:
+    python benchmarks/bench_history.py [--size-mb 1024] [--log path/to/existing.txt]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_history import HistoryLog  # noqa: E402
+from clipboard_store import iter_log_records  # noqa: E402
+
+WORDS = ["git", "commit", "docker", "kubectl", "token", "path", "config", "deploy",
+         "python", "select", "from", "where", "error", "warning", "users", "build"]
+
+
+def generate_log(path: str, size_bytes: int) -> datetime:
+    """ Writes a log of roughly size_bytes and returns the last timestamp. """
+    rng = random.Random(7)
+    ts = datetime(2015, 1, 1)
+    written = 0
+    chunk = []
+    with open(path, "w", encoding="utf-8") as file:
+        i = 0
+        while written < size_bytes:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+            if i % 5 == 0:
+                text += "\n" + " ".join(rng.choice(WORDS) for _ in range(10))
+            if i % 100_003 == 0:
+                text += " needle-marker"
+            line = f"[{ts.strftime('%Y-%m-%d %H:%M:%S')}] {text}\n"
+            chunk.append(line)
+            written += len(line)
+            ts += timedelta(seconds=rng.randint(1, 20))
+            i += 1
+            if len(chunk) >= 10_000:
+                file.write("".join(chunk))
+                chunk = []
+        file.write("".join(chunk))
+    return ts
+
+
+def measure(label: str, func) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<34} {elapsed * 1000:>10.1f} ms {peak / 1024:>10.0f} KB peak   -> {result}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--log", help="Use an existing log instead of generating one")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.log:
+        path = args.log
+    else:
+        workdir = tempfile.mkdtemp(prefix="clip-history-bench-")
+        path = os.path.join(workdir, "clipboard_log.txt")
+        started = time.perf_counter()
+        generate_log(path, args.size_mb * 1024 * 1024)
+        print(f"generated {os.path.getsize(path) / 1024 ** 2:.0f} MB in {time.perf_counter() - started:.1f} s")
+
+    try:
+        with HistoryLog(path) as log:
+            last = log.timestamp_at(log.prev_record_start(log.size))
+            hour_ago = (datetime.strptime(last, "%Y-%m-%d %H:%M:%S") - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+            measure("tail -n 10 (mmap)", lambda: len(list(log.tail(10))))
+            measure("last hour (binary search)", lambda: sum(1 for _ in log.iter_from(log.seek_time(hour_ago))))
+            measure("last hour (full scan)",
+                    lambda: sum(1 for r in iter_log_records(path) if r.timestamp >= hour_ago))
+            measure("search needle (mmap find)", lambda: sum(1 for _ in log.search("needle-marker")))
+            measure("search needle (full scan)",
+                    lambda: sum(1 for r in iter_log_records(path) if "needle-marker" in r.content))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Peak memory of the console monitor while it ingests one very large clip.
+
+Each run starts a fresh interpreter that goes through the monitor's steps
+for a clip of --size-mb: read it (a stand-in paste command prints
+generated text, a few secrets in every megabyte), check it for changes,
+filter it and hand it to the LogWriter. The clip is read again by a
+second poll, which must find it unchanged. With MEMORY_LIMIT applied,
+the run reports its peak RSS, how long ingestion took, and whether the
+blob holds the whole clip with every secret redacted.
+
+--baseline also measures the old path for comparison: the whole output
+read and decoded (as pyperclip does), filtered and written inline. It
+needs several times the clip's size in memory and runs without the limit.
+
+Exits non-zero if the large-clip run's peak RSS exceeds --max-rss-mb or
+the saved blob is wrong.
+
+Usage:
+    python benchmarks/bench_large_clip.py [--size-mb 500] [--max-rss-mb 150] [--baseline]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = "LARGECLIP "
+
+# Prints argv[1] bytes of text: one 1 MB block, repeated, each with a token and a password assignment in it
+GENERATOR = r"""
+import sys
+size = int(sys.argv[1])
+line = b"the quick brown fox jumps over the lazy dog " * 20 + b"\n"
+block = line * (1000000 // len(line) - 1) + b"token ghp_" + b"x1" * 18 + b" and password=hunter2hunter2\n"
+block += b"#" * (1000000 - len(block) - 1) + b"\n"
+out = sys.stdout.buffer
+for _ in range(size // len(block)):
+    out.write(block)
+out.write(block[:size % len(block)])
+"""
+SECRETS_PER_MB = 2
+
+
+def child(mode: str, size: int, workdir: str) -> None:
+    """ One ingestion, run in a subprocess. Prints one JSON line of results. """
+    import resource
+    sys.path.insert(0, ROOT)
+    import Clipboard_Saver as console
+    from clipboard_blobs import BlobStore, blob_dir_for
+    from clipboard_filter import ClipFilter
+    from clipboard_fingerprint import fingerprint, is_new_content
+    from clipboard_largeclip import ClipSpiller, apply_memory_limit
+    from clipboard_sources import PollingSource
+    from clipboard_store import ClipRecord, iter_log_records, parse_blob_ref
+    from clipboard_writer import LogWriter
+
+    path = os.path.join(workdir, "clipboard_log.txt")
+    command = [sys.executable, "-c", GENERATOR, str(size)]
+    clip_filter = ClipFilter()
+    writer = LogWriter(path)
+    writer.start()
+    started = time.perf_counter()
+    if mode == "spill":
+        apply_memory_limit(console.MEMORY_LIMIT)
+        spiller = ClipSpiller(path, command=lambda selection: command)
+        source = PollingSource(interval=0.01)
+        source.read_func = spiller.paste
+        content = source.wait_for_change()
+        if not is_new_content(content, None):
+            raise SystemExit("Large clip not detected as new")
+        last = fingerprint(content)
+        result = spiller.filter(content, source.owner, clip_filter)
+        if result.text is None:
+            raise SystemExit(f"Large clip dropped: {result.rules}")
+        writer.submit(ClipRecord("2024-01-01 00:00:00", result.text))
+        ingested = time.perf_counter() - started
+        if is_new_content(source.wait_for_change(), last):
+            raise SystemExit("Unchanged large clip detected as new on the second poll")
+    else:
+        text = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout.decode("utf-8")
+        result = clip_filter.apply(text.strip(), None)
+        writer.submit(ClipRecord("2024-01-01 00:00:00", result.text))
+        ingested = time.perf_counter() - started
+    writer.close(timeout=None)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Checked after the peak is taken: the log or the blob is streamed, never loaded whole
+    records = list(iter_log_records(path)) if mode == "spill" else []
+    stored = redactions = leaked = 0
+    if mode == "spill":
+        blob = parse_blob_ref(records[0].content) if len(records) == 1 else None
+        if blob is None:
+            raise SystemExit(f"Expected one blob record in the log, found {records[:2]}")
+        blob_path = BlobStore(blob_dir_for(path)).path_for(blob[1], blob[0])
+        stored = os.path.getsize(blob_path)
+        with open(blob_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                redactions += chunk.count(b"[REDACTED:")
+                leaked += chunk.count(b"hunter2")
+    print(RESULT_PREFIX + json.dumps({"peak_mb": peak_kb / 1024, "seconds": ingested, "stored": stored,
+                                      "redactions": redactions, "leaked": leaked}), flush=True)
+
+
+def run(mode: str, size: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="clip-large-bench-")
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--child", mode, str(size), workdir]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode or not lines:
+        raise SystemExit(f"{mode} run failed (exit code {completed.returncode})")
+    return json.loads(lines[0][len(RESULT_PREFIX):])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=500)
+    parser.add_argument("--max-rss-mb", type=float, default=150, help="Max peak RSS while ingesting the clip")
+    parser.add_argument("--baseline", action="store_true", help="Also measure reading the clip whole")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "SIZE", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]), args.child[2])
+        return
+
+    size = int(args.size_mb * 1e6)
+    results = {"large clip": run("spill", size)}
+    if args.baseline:
+        results["read whole"] = run("whole", size)
+    print(f"{size / 1e6:.0f} MB clip     peak RSS   seconds")
+    for name, result in results.items():
+        print(f"{name:16s} {result['peak_mb']:6.0f} MB {result['seconds']:9.2f}")
+
+    spilled = results["large clip"]
+    expected_secrets = SECRETS_PER_MB * (size // 1000000)
+    failures = []
+    if spilled["peak_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {spilled['peak_mb']:.0f} MB exceeds {args.max_rss_mb:.0f} MB")
+    if spilled["leaked"] or spilled["redactions"] < expected_secrets:
+        failures.append(f"{spilled['redactions']} of {expected_secrets} secrets redacted, {spilled['leaked']} leaked")
+    if abs(spilled["stored"] - size) > size // 100:  # Redactions change the size a little
+        failures.append(f"blob holds {spilled['stored']} bytes of a {size} byte clip")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Search latency and cold start of the quick-paste picker's index.
+
+Writes a text log of --clips synthetic clips (prose, commands, URLs and
+code with numbers mixed in, spread over 90 days, some copied repeatedly),
+then measures:
+
+  * build: open_index() without a snapshot, reading the whole log;
+  * cold start: open_index() again, restoring the snapshot the build saved;
+  * add: indexing one more clip, as the monitor does for every clip it saves;
+  * search: each query in QUERIES (--repeat times, after one warm-up run),
+    grouped by kind: word and prefix matches, several words, typos, and
+    queries that match nothing.
+
+Exits non-zero if the 99th percentile search time exceeds --budget-ms or
+the cold start takes longer than --max-start-ms.
+
+Usage:
+    python benchmarks/bench_picker.py [--clips 100000] [--repeat 20] [--budget-ms 10] [--max-start-ms 1500]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_index import open_index, snapshot_path_for  # noqa: E402
+from clipboard_store import ClipRecord, TextLogStore  # noqa: E402
+
+WORDS = ("the quick brown fox jumps over lazy dog clipboard history search index record monitor writer "
+         "thread queue batch commit config value server client request response deploy release branch "
+         "merge rebase docker kubernetes cluster node service ingress secret volume account invoice "
+         "meeting agenda notes project roadmap budget review feedback design prototype customer").split()
+QUERIES = {
+    "word": ["kubernetes", "invoice", "fox", "roadmap", "git"],
+    "short": ["k", "do", "ht"],
+    "words": ["docker compose", "quick brown fox", "meeting notes agenda", "git push origin"],
+    "typo": ["kuberentes", "clipbaord histroy", "invocie", "deploy relaese"],
+    "none": ["zqxjkv", "nothing like this here"],
+}
+
+
+def make_clip(rng: random.Random, i: int) -> str:
+    kind = rng.random()
+    if kind < 0.15:
+        return f"https://example.com/{rng.choice(WORDS)}/{rng.choice(WORDS)}?id={rng.randint(1, 10 ** 6)}"
+    if kind < 0.3:
+        return f"git {rng.choice(['push', 'pull', 'checkout', 'rebase'])} origin {rng.choice(WORDS)}-{i % 977}"
+    if kind < 0.4:
+        return f"def {rng.choice(WORDS)}_{rng.choice(WORDS)}(self, value={i}):\n    return self.{rng.choice(WORDS)}(value)"
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 60))]
+    return " ".join(word + str(rng.randint(0, 99)) if rng.random() < 0.1 else word for word in words)
+
+
+def write_log(path: str, count: int, rng: random.Random) -> None:
+    """ count clips over 90 days; one in five repeats an earlier clip. """
+    start = datetime(2024, 1, 1)
+    clips, records = [], []
+    for i in range(count):
+        if clips and rng.random() < 0.2:
+            clip = rng.choice(clips[-5000:])
+        else:
+            clip = make_clip(rng, i)
+            clips.append(clip)
+        records.append(ClipRecord((start + timedelta(seconds=i * 90 * 86400 // count)).strftime("%Y-%m-%d %H:%M:%S"),
+                                  clip))
+    store = TextLogStore(path)
+    store.write_batch(records)
+    store.close()
+
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=10, help="Max 99th percentile search time")
+    parser.add_argument("--max-start-ms", type=float, default=1500, help="Max cold start from the snapshot")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix="clip-picker-bench-")
+    try:
+        log_path = os.path.join(workdir, "clipboard_log.txt")
+        snapshot = snapshot_path_for(log_path).replace(os.path.dirname(snapshot_path_for(log_path)), workdir)
+        write_log(log_path, args.clips, rng)
+
+        started = time.perf_counter()
+        open_index(log_path, snapshot_path=snapshot)
+        build = time.perf_counter() - started
+        started = time.perf_counter()
+        index = open_index(log_path, snapshot_path=snapshot)
+        cold_start = time.perf_counter() - started
+        snapshot_mb = os.path.getsize(snapshot) / 1e6
+
+        adds = []
+        for i in range(1000):
+            clip = make_clip(rng, args.clips + i)
+            started = time.perf_counter()
+            index.add(f"2024-04-01 00:{i // 60 % 60:02d}:{i % 60:02d}", clip)
+            adds.append(time.perf_counter() - started)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    now = datetime(2024, 4, 1).timestamp()
+    times = {}
+    for kind, queries in QUERIES.items():
+        times[kind] = []
+        for query in queries:
+            index.search(query, now=now)  # Warm-up
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                index.search(query, now=now)
+                times[kind].append((time.perf_counter() - started) * 1000)
+
+    print(f"{args.clips} clips ({len(index)} distinct): build {build:.1f} s, "
+          f"cold start from snapshot {cold_start * 1000:.0f} ms ({snapshot_mb:.0f} MB), "
+          f"add {statistics.median(adds) * 1e6:.0f} µs")
+    print("query      p50 ms   p99 ms   max ms")
+    for kind, values in times.items():
+        print(f"{kind:8s} {statistics.median(values):8.2f} {percentile(values, 0.99):8.2f} {max(values):8.2f}")
+    for query in ("kubernetes", "kuberentes", "git push origin"):
+        print(f"  {query!r}: {[match.content[:40] for match in index.search(query, 3, now=now)]}")
+
+    everything = [value for values in times.values() for value in values]
+    failures = []
+    if percentile(everything, 0.99) > args.budget_ms:
+        failures.append(f"p99 search {percentile(everything, 0.99):.2f} ms exceeds {args.budget_ms} ms")
+    if cold_start * 1000 > args.max_start_ms:
+        failures.append(f"cold start {cold_start * 1000:.0f} ms exceeds {args.max_start_ms:.0f} ms")
+    if not index.search("kuberentes", now=now):
+        failures.append("no results for a misspelled query")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
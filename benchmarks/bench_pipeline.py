@@ -0,0 +1,266 @@
+"""
+Capture pipeline benchmark with baselines, headless, on a fake clipboard.
+
+Each scenario runs in a fresh interpreter that installs a FakeClipboard
+(clipboard_backend.set_backend), starts one monitor on a throwaway log
+and replays one scripted workload (clipboard_backend.WORKLOADS: bursty,
+idle, huge, unicode, whitespace) into the fake clipboard:
+
+  console  save_clipboard_content() from Clipboard_Saver.py; create_change_source()
+           listens to the fake clipboard the way it listens to XFixes
+  gui      the GUI's App and ClipboardMonitor, the fake clipboard pushing
+           changes as QClipboard.dataChanged does (offscreen Qt, no display)
+  poll     the same monitor with its PollingSource (the macOS fallback)
+
+Once the writer has flushed, the log is checked against the copies made:
+
+  latency     copy to record on disk, p50 and p95 (from the writer's "flush" trace events)
+  miss rate   share of copies that should have been saved (not blank, not a repeat) but were not
+  extra       records that should not have been saved (whitespace-only clips, duplicates)
+  CPU s/h     process CPU seconds per hour while the workload runs; for "idle", the cost of waiting
+  reads/h     clipboard reads per hour (on Linux each one spawns xclip or xsel)
+  clips/s     saved clips per second, first copy to last flush; MB/s likewise
+  RSS         peak resident memory of the process
+
+--save-baseline writes the results to --baseline (BASELINE_PATH). Runs
+without it compare against that file, when it exists, and exit non-zero
+if a number got worse by more than --tolerance (and by more than its
+SLACK, so sub-millisecond noise does not count) or the miss rate or
+extra count went up. Baselines only compare across runs on the same
+machine.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--monitors console,gui,poll] [--workloads bursty,idle,huge,unicode,whitespace]
+                                        [--idle-seconds 10] [--tolerance 0.5] [--baseline PATH] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "pipeline.json")
+RESULT_PREFIX = "PIPELINE "
+MONITORS = ("console", "gui", "poll")
+SETTLE = 1.5  # Seconds before and after the workload: startup reads, then the writer's last flush
+# Per metric: 1 if higher is worse, -1 if lower is worse; and the change that never counts as a regression
+DIRECTIONS = {"latency_p50_ms": 1, "latency_p95_ms": 1, "cpu_s_per_hour": 1, "reads_per_hour": 1, "rss_mb": 1,
+              "clips_per_s": -1, "mb_per_s": -1}
+SLACK = {"latency_p50_ms": 20.0, "latency_p95_ms": 50.0, "cpu_s_per_hour": 10.0, "reads_per_hour": 1000.0,
+         "rss_mb": 10.0, "clips_per_s": 1.0, "mb_per_s": 0.5}
+
+
+def start_monitor(monitor: str, path: str, clipboard):
+    """ Starts a monitor on path; returns (wait, stop): wait(seconds) keeps it running, stop() flushes the log. """
+    if monitor == "console":
+        import Clipboard_Saver as console
+        console.FILE_PATH = path
+        console.build_monitor(path)
+        threading.Thread(target=console.save_clipboard_content, daemon=True).start()
+        return time.sleep, lambda: console.writer.close(timeout=None)
+
+    import importlib.util
+    from PyQt5 import QtCore, QtWidgets
+    from clipboard_sources import PollingSource, PushSource
+    app = QtWidgets.QApplication([])
+    app.setQuitOnLastWindowClosed(False)
+    spec = importlib.util.spec_from_file_location("clipboard_saver_gui", os.path.join(ROOT, "Clipboard_Saver-GUI.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    gui.USE_DAEMON = False
+    gui.DEFAULT_SAVE_PATH = path
+    window = gui.App(auto_start=False)
+    window.show()
+    monitor_object = window.clipboard_monitor
+    if monitor == "gui":
+        source = PushSource(selections=monitor_object.source.selections, backend=clipboard)
+        clipboard.watch(source.push)
+    else:
+        source = PollingSource(gui.POLLING_INTERVAL, scheduler=monitor_object.scheduler, backend=clipboard)
+    monitor_object.source = window.change_source = source
+    window.start_monitoring()
+
+    def wait(seconds: float) -> None:
+        loop = QtCore.QEventLoop()
+        QtCore.QTimer.singleShot(int(seconds * 1000), loop.quit)
+        loop.exec_()
+
+    def stop() -> None:
+        window.stop_monitoring()
+        app.processEvents()
+    return wait, stop
+
+
+def child(monitor: str, workload: str, workdir: str, idle_seconds: float) -> None:
+    """ One scenario, run in a subprocess. Prints one JSON line of results. """
+    import resource
+    os.environ["XDG_CACHE_HOME"] = os.path.join(workdir, "cache")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ.setdefault("PYSTRAY_BACKEND", "dummy")
+    sys.path.insert(0, ROOT)
+    from clipboard_backend import WORKLOADS, FakeClipboard, huge, idle, replay, set_backend
+    from clipboard_blobs import BlobStore, blob_dir_for
+    from clipboard_metrics import disable_trace, enable_trace
+    from clipboard_scheduler import MAX_INTERVAL
+    from clipboard_store import iter_log_records, parse_blob_ref
+
+    clipboard = FakeClipboard()
+    set_backend(clipboard)
+    path = os.path.join(workdir, "clipboard_log.txt")
+    trace_path = os.path.join(workdir, "trace.jsonl")
+    enable_trace(trace_path)
+    if workload == "idle":
+        script = idle(idle_seconds)
+    elif workload == "huge":  # Further apart than the slowest poll, so polling does not miss them by chance
+        script = huge(gap=MAX_INTERVAL + 0.5)
+    else:
+        script = WORKLOADS[workload]()
+    wait, stop = start_monitor(monitor, path, clipboard)
+    wait(SETTLE)
+
+    replayer = threading.Thread(target=replay, args=(clipboard, script))
+    cpu, started = time.process_time(), time.perf_counter()
+    replayer.start()
+    while replayer.is_alive():
+        wait(0.05)
+    wait(SETTLE)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - started
+    stop()
+    disable_trace()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    # What should have been saved: each copy that is not blank and differs from the one before it
+    expected, last = {}, {}
+    for event in clipboard.copies:
+        if event.text.strip() and event.text != last.get(event.selection):
+            expected[event.text.split(None, 1)[0]] = event
+        last[event.selection] = event.text
+    # What was: records in flush order, each with the time of the flush that wrote it
+    flushes = []
+    with open(trace_path, encoding="utf-8") as file:
+        for line in file:
+            entry = json.loads(line)
+            if entry["event"] == "flush":
+                flushes.extend([entry["ts"]] * entry["records"])
+    blobs = BlobStore(blob_dir_for(path))
+    latencies, saved, extra = [], set(), 0
+    records = list(iter_log_records(path)) if os.path.exists(path) else []
+    for record, flushed in zip(records, flushes):
+        blob = parse_blob_ref(record.content)
+        if blob is not None:
+            with open(blobs.path_for(blob[1], blob[0]), "rb") as file:
+                head = file.read(64).decode("utf-8", "replace")
+        else:
+            head = record.content
+        marker = head.split(None, 1)[0] if head.strip() else ""
+        if marker in expected and marker not in saved:
+            saved.add(marker)
+            latencies.append((flushed - expected[marker].time) * 1000)
+        else:
+            extra += 1
+    latencies.sort()
+    saved_bytes = sum(len(expected[marker].text.encode("utf-8")) for marker in saved)
+    span = (max(flushes) - min(event.time for event in clipboard.copies)) if flushes and clipboard.copies else 0.0
+    print(RESULT_PREFIX + json.dumps({
+        "copies": len(clipboard.copies),
+        "expected": len(expected),
+        "saved": len(saved),
+        "miss_rate": (len(expected) - len(saved)) / len(expected) if expected else 0.0,
+        "extra": extra,
+        "latency_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+        "cpu_s_per_hour": cpu / wall * 3600,
+        "reads_per_hour": clipboard.reads / wall * 3600,
+        "clips_per_s": len(saved) / span if span else 0.0,
+        "mb_per_s": saved_bytes / 1e6 / span if span else 0.0,
+        "rss_mb": peak_mb,
+    }), flush=True)
+
+
+def run(monitor: str, workload: str, idle_seconds: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="clip-pipeline-bench-")
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--child", monitor, workload, workdir, str(idle_seconds)]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode or not lines:
+        sys.stderr.write(completed.stderr[-2000:])
+        raise SystemExit(f"{monitor}/{workload} run failed (exit code {completed.returncode})")
+    return json.loads(lines[0][len(RESULT_PREFIX):])
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for scenario, result in results.items():
+        before = baseline.get(scenario)
+        if before is None:
+            continue
+        for metric, direction in DIRECTIONS.items():
+            old, new = before[metric], result[metric]
+            worse = (new - old) * direction
+            if worse > SLACK[metric] and worse > abs(old) * tolerance:
+                found.append(f"{scenario} {metric}: {old:.1f} -> {new:.1f}")
+        if result["miss_rate"] > before["miss_rate"] + 0.01:
+            found.append(f"{scenario} miss rate: {before['miss_rate']:.1%} -> {result['miss_rate']:.1%}")
+        if result["extra"] > before["extra"]:
+            found.append(f"{scenario} extra records: {before['extra']} -> {result['extra']}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--monitors", default=",".join(MONITORS))
+    parser.add_argument("--workloads", default="bursty,idle,huge,unicode,whitespace")
+    parser.add_argument("--idle-seconds", type=float, default=10.0, help="Length of the idle workload")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Relative change that counts as a regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline")
+    parser.add_argument("--child", nargs=4, metavar=("MONITOR", "WORKLOAD", "WORKDIR", "IDLE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.child[2], float(args.child[3]))
+        return
+
+    results = {}
+    for monitor in args.monitors.split(","):
+        for workload in args.workloads.split(","):
+            results[f"{monitor}/{workload}"] = run(monitor, workload, args.idle_seconds)
+
+    print("scenario             saved/expected   miss  extra  p50 ms  p95 ms   CPU s/h  reads/h  clips/s    MB/s  RSS MB")
+    for scenario, r in results.items():
+        print(f"{scenario:20s} {r['saved']:6d}/{r['expected']:<7d} {r['miss_rate']:6.1%} {r['extra']:6d} "
+              f"{r['latency_p50_ms']:7.0f} {r['latency_p95_ms']:7.0f} {r['cpu_s_per_hour']:9.1f} "
+              f"{r['reads_per_hour']:8.0f} {r['clips_per_s']:8.1f} {r['mb_per_s']:7.2f} {r['rss_mb']:7.0f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                                   "cpus": os.cpu_count()},
+                       "idle_seconds": args.idle_seconds, "results": results}, file, indent=1, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    found = regressions(results, baseline["results"], args.tolerance)
+    if found:
+        print("FAIL: regressions against the baseline (" + baseline["machine"]["platform"] + "):")
+        for line in found:
+            print("  " + line)
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
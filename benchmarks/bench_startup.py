@@ -0,0 +1,144 @@
+"""
+Measures GUI startup: time to window shown, time to first capture, peak RSS.
+
+Each run launches Clipboard_Saver-GUI.py's App in a fresh interpreter
+(offscreen Qt, throwaway log, icon cache and runtime directory so no
+daemon is picked up) with monitoring started on launch. As soon as the
+window shows "Monitoring" the run copies a clip, and it stops when
+the clip is saved. Times are measured from process launch, so they
+include interpreter start and imports.
+
+--eager repeats the runs the way the GUI started before imports were
+deferred: PIL, pystray, the history view, the daemon module and
+http.server imported up front and the icon drawn before the window,
+monitoring started once the window is shown. The first run of each
+mode draws the icon; later runs load it from the cache.
+
+Exits non-zero if the median time to first capture exceeds --budget-ms.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--eager] [--budget-ms 3000]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 60.0
+RESULT_PREFIX = "STARTUP "  # Marks the child's result among the GUI's own output
+
+
+def child(eager: bool, workdir: str) -> None:
+    """ One startup, run in a subprocess. Prints one JSON line of absolute times. """
+    import importlib.util
+    import resource
+    sys.path.insert(0, ROOT)
+    if eager:
+        import http.server  # noqa: F401
+        import pystray  # noqa: F401
+        from PIL import Image, ImageDraw  # noqa: F401
+        import clipboard_daemon  # noqa: F401
+        import clipboard_history_view  # noqa: F401
+    spec = importlib.util.spec_from_file_location("clipboard_saver_gui", os.path.join(ROOT, "Clipboard_Saver-GUI.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    times = {"imported": time.time()}
+
+    from PyQt5 import QtCore, QtWidgets
+    import pyperclip
+    app = QtWidgets.QApplication([])
+    app.setQuitOnLastWindowClosed(False)
+    pyperclip.paste = lambda: app.clipboard().text()  # No system clipboard in a headless run
+    gui.DEFAULT_SAVE_PATH = os.path.join(workdir, "clipboard_log.txt")
+    if eager:
+        gui.create_default_icon()
+
+    def check_ready() -> None:
+        # The monitor's status signals reach the window through the event loop; copy once it shows "Monitoring"
+        if window.status_label.text() == "Status: Monitoring":
+            times["monitoring"] = time.time()
+            ready.stop()
+            app.clipboard().setText("startup benchmark clip")
+
+    def on_saved(_message: str) -> None:
+        if "captured" not in times:
+            times["captured"] = time.time()
+            times["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            app.quit()
+
+    window = gui.App(auto_start=not eager)
+    window.clipboard_monitor.events.content_saved.connect(on_saved)
+    window.show()
+    times["shown"] = time.time()
+    if eager:
+        QtCore.QTimer.singleShot(0, window.start_monitoring)
+    ready = QtCore.QTimer(interval=5, timeout=check_ready)
+    ready.start()
+    QtCore.QTimer.singleShot(int(TIMEOUT * 1000), app.quit)
+    app.exec_()
+    window.clipboard_monitor.stop()
+    window.monitor_thread.quit()
+    window.monitor_thread.wait(5000)
+    print(RESULT_PREFIX + json.dumps(times), flush=True)
+
+
+def run_once(eager: bool, workdir: str) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", PYSTRAY_BACKEND="dummy",
+               XDG_CACHE_HOME=os.path.join(workdir, "cache"), XDG_RUNTIME_DIR=os.path.join(workdir, "run"))
+    os.makedirs(env["XDG_RUNTIME_DIR"], mode=0o700, exist_ok=True)
+    command = [sys.executable, os.path.abspath(__file__), "--child", workdir] + (["--eager"] if eager else [])
+    launched = time.time()
+    output = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True, timeout=TIMEOUT + 30).stdout
+    lines = [line for line in output.splitlines() if line.startswith(RESULT_PREFIX)]
+    times = json.loads(lines[0][len(RESULT_PREFIX):]) if lines else {}
+    if "captured" not in times:
+        raise SystemExit(f"No clip captured within {TIMEOUT:.0f} s")
+    return {
+        "import_ms": (times["imported"] - launched) * 1000,
+        "shown_ms": (times["shown"] - launched) * 1000,
+        "capture_ms": (times["captured"] - launched) * 1000,
+        "max_rss_mb": times["max_rss_kb"] / 1024,
+    }
+
+
+def measure(eager: bool, runs: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="clip-startup-bench-")
+    try:
+        results = [run_once(eager, workdir) for _ in range(runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {key: statistics.median(r[key] for r in results) for key in results[0]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="Also measure with everything imported up front")
+    parser.add_argument("--budget-ms", type=float, default=3000.0,
+                        help="Max median time from launch to first capture")
+    parser.add_argument("--child", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.eager, args.child)
+        return
+
+    modes = [("deferred", False)] + ([("eager", True)] if args.eager else [])
+    results = {name: measure(eager, args.runs) for name, eager in modes}
+    print(f"median of {args.runs} runs    imports    shown  1st capture  peak RSS")
+    for name, r in results.items():
+        print(f"{name:18s} {r['import_ms']:8.0f} ms {r['shown_ms']:5.0f} ms {r['capture_ms']:8.0f} ms "
+              f"{r['max_rss_mb']:6.1f} MB")
+    capture_ms = results["deferred"]["capture_ms"]
+    if capture_ms > args.budget_ms:
+        print(f"FAIL: first capture after {capture_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+How long App.stop_monitoring() takes, and whether it loses clips.
+
+Builds Clipboard_Saver-GUI.py's App (offscreen Qt, throwaway logs) and
+starts and stops monitoring --runs times in each situation the monitor
+thread can be in when Stop is pressed:
+
+* idle: blocked in the change source waiting for a copy,
+* polling: sleeping between polls (the macOS fallback),
+* backoff: waiting out the error backoff after clipboard reads failed,
+* burst: saving a stream of clips pushed from another thread.
+
+Every run restarts the same monitor, so a monitor that cannot be started
+a second time fails here as well. After each burst the log must hold
+every clip the monitor detected.
+
+Exits non-zero if any stop takes longer than --budget-ms or a clip is
+missing.
+
+Usage:
+    python benchmarks/bench_stop.py [--runs 5] [--budget-ms 250]
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("PYSTRAY_BACKEND", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyperclip  # noqa: E402
+from PyQt5 import QtCore, QtWidgets  # noqa: E402
+
+from clipboard_metrics import CHANGES  # noqa: E402
+from clipboard_sources import PollingSource, PushSource  # noqa: E402
+
+SETTLE_MS = 300  # Time the monitor runs before Stop is pressed
+BURST_CLIPS = 100000  # Upper bound; the burst is still being pushed when Stop is pressed
+
+
+def load_gui():
+    spec = importlib.util.spec_from_file_location("clipboard_saver_gui", os.path.join(ROOT, "Clipboard_Saver-GUI.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    return gui
+
+
+def wait_ms(ms: int) -> None:
+    """ Runs the Qt event loop for ms milliseconds. """
+    loop = QtCore.QEventLoop()
+    QtCore.QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def failing_paste() -> str:
+    raise pyperclip.PyperclipException("benchmark: clipboard unavailable")
+
+
+def count_records(path: str) -> int:
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.startswith("["))
+
+
+def run_scenario(gui, workdir: str, name: str, runs: int) -> dict:
+    gui.DEFAULT_SAVE_PATH = os.path.join(workdir, f"{name}.txt")
+    window = gui.App(auto_start=False)
+    monitor = window.clipboard_monitor
+    if name == "polling":
+        monitor.source = PollingSource(paste_func=lambda: "unchanged", scheduler=monitor.scheduler)
+    elif name == "backoff":
+        monitor.source = PollingSource(interval=0.01, paste_func=failing_paste)
+    else:
+        monitor.source = window.change_source = PushSource(maxsize=BURST_CLIPS)
+    latencies, missing = [], 0
+    for run in range(runs):
+        detected = CHANGES.value()
+        before = count_records(window.current_save_path) if os.path.exists(window.current_save_path) else 0
+        stop_pushing = threading.Event()
+        window.start_monitoring()
+        if name == "burst":
+            def pump(run=run):
+                for i in range(BURST_CLIPS):
+                    if stop_pushing.is_set():
+                        break
+                    monitor.source.push(f"burst {run} clip {i} " + "x" * (i % 200))
+            threading.Thread(target=pump, daemon=True).start()
+        wait_ms(SETTLE_MS)
+        started = time.perf_counter()
+        window.stop_monitoring()
+        latencies.append((time.perf_counter() - started) * 1000)
+        stop_pushing.set()
+        if name == "burst":
+            missing += int(CHANGES.value() - detected) - (count_records(window.current_save_path) - before)
+        if monitor.is_running() or window.monitor_thread is not None:
+            raise SystemExit(f"{name}: monitor still running after stop_monitoring()")
+    saved = count_records(window.current_save_path) if name == "burst" else 0
+    window.hide()
+    return {"median": statistics.median(latencies), "max": max(latencies), "saved": saved, "missing": missing}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="Max time for one stop_monitoring() call")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    app.setQuitOnLastWindowClosed(False)
+    pyperclip.paste = lambda: app.clipboard().text() # No system clipboard in a headless run
+    gui = load_gui()
+    gui.USE_DAEMON = False
+    gui.FILTER_SENSITIVE = False
+    gui.CAPTURE_RICH = False
+    workdir = tempfile.mkdtemp(prefix="clip-stop-bench-")
+    try:
+        results = {name: run_scenario(gui, workdir, name, args.runs)
+                   for name in ("idle", "polling", "backoff", "burst")}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"stop_monitoring() x{args.runs}   median      max")
+    for name, r in results.items():
+        saved = f"   {r['saved']} clips saved, {r['missing']} missing" if name == "burst" else ""
+        print(f"{name:20s} {r['median']:6.1f} ms {r['max']:6.1f} ms{saved}")
+    slowest = max(r["max"] for r in results.values())
+    missing = results["burst"]["missing"]
+    if slowest > args.budget_ms or missing:
+        print(f"FAIL: slowest stop {slowest:.0f} ms (budget {args.budget_ms:.0f} ms), {missing} clips missing")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compares the text log and the SQLite store: insert throughput, keyword
+search latency and time-range query latency (grep / a Python scan of the
+text log vs indexed SQLite queries).
+
+Usage:
+    python benchmarks/bench_store.py [--records 200000] [--batch 64]
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_store import ClipRecord, SQLiteStore, TextLogStore, query_db  # noqa: E402
+
+WORDS = ["git", "commit", "docker", "kubectl", "token", "path", "config", "deploy",
+         "python", "select", "from", "where", "error", "warning", "users", "build"]
+
+
+def generate(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    for i in range(count):
+        ts = (start + timedelta(seconds=i * 30)).strftime("%Y-%m-%d %H:%M:%S")
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+        if rng.random() < 0.2:
+            text += "\n" + " ".join(rng.choice(WORDS) for _ in range(5))  # Multi-line clip
+        if i % 10007 == 0:
+            text += " needle-marker"
+        yield ClipRecord(ts, text)
+
+
+def insert(store, records, batch_size: int) -> float:
+    started = time.perf_counter()
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            store.write_batch(batch)
+            store.sync()
+            batch = []
+    if batch:
+        store.write_batch(batch)
+    store.sync()
+    store.close()
+    return time.perf_counter() - started
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def scan_range(path: str, start: str, end: str) -> int:
+    # Best a reader of the flat log can do without an index: look at every line
+    hits = 0
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("[") and start <= line[1:20] <= end:
+                hits += 1
+    return hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="clip-bench-")
+    try:
+        text_path = os.path.join(workdir, "clipboard_log.txt")
+        db_path = os.path.join(workdir, "clipboard_log.db")
+
+        text_secs = insert(TextLogStore(text_path), generate(args.records), args.batch)
+        db_secs = insert(SQLiteStore(db_path), generate(args.records), args.batch)
+        print(f"insert  text: {args.records / text_secs:>10.0f} rec/s   sqlite: {args.records / db_secs:>10.0f} rec/s")
+
+        if shutil.which("grep"):
+            grep_ms, _ = timed(lambda: subprocess.run(["grep", "-F", "needle-marker", text_path],
+                                                      stdout=subprocess.DEVNULL, check=False))
+        else:
+            grep_ms, _ = timed(lambda: sum("needle-marker" in line for line in open(text_path, encoding="utf-8")))
+        fts_ms, hits = timed(lambda: query_db(db_path, keyword="needle-marker", limit=1000))
+        print(f"keyword grep: {grep_ms:>8.2f} ms         sqlite: {fts_ms:>8.2f} ms ({len(hits)} hits)")
+
+        mid = datetime(2020, 1, 1) + timedelta(seconds=(args.records // 2) * 30)
+        start, end = mid.strftime("%Y-%m-%d %H:%M:%S"), (mid + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        scan_ms, scan_hits = timed(lambda: scan_range(text_path, start, end))
+        range_ms, range_hits = timed(lambda: query_db(db_path, start=start, end=end, limit=10_000))
+        print(f"1h range scan: {scan_ms:>7.2f} ms ({scan_hits})  sqlite: {range_ms:>8.2f} ms ({len(range_hits)})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput of clipboard_transfer as the process pool grows.
+
+Writes a synthetic text log of --size-mb (multi-line clips, PRIMARY
+selection tags, one clip in --repeat-every copied again) and exports it to
+JSON Lines with 1, 2, 4, ... workers up to the number of CPUs, then once
+more with --dedup --compact to a text log. Each output is checked to hold
+every record.
+
+Exits non-zero if the JSON Lines export with the most workers is less than
+--min-efficiency times the worker count faster than with one worker (CPUs
+the machine does not have are not counted).
+
+Usage:
+    python benchmarks/bench_transfer.py [--size-mb 2048] [--min-efficiency 0.6] [--keep]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_transfer import transfer  # noqa: E402
+
+WORDS = ("the quick brown fox jumps over lazy dog clipboard history search index record "
+         "monitor writer thread queue batch commit config value server client request").split()
+
+
+def write_log(path: str, size: int, repeat_every: int, rng: random.Random) -> int:
+    """ Writes records until the file reaches size bytes. Returns the number of records. """
+    snippets = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 60))) for _ in range(1000)]
+    written = records = 0
+    with open(path, "w", encoding="utf-8") as file:
+        while written < size:
+            lines = []
+            for _ in range(10000):
+                seconds = records // 4
+                stamp = f"2020-{1 + seconds // 2600000 % 12:02d}-{1 + seconds // 86400 % 28:02d} " \
+                        f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+                if records % repeat_every == 0:
+                    body = snippets[0]
+                elif records % 5 == 0:
+                    body = f"{snippets[records % 997]}\n    line {records}\n{snippets[records % 991]}"
+                else:
+                    body = f"{snippets[records % 1000]} #{records}"
+                tag = "@sel:primary " if records % 7 == 0 else ""
+                lines.append(f"[{stamp}] {tag}{body}\n")
+                records += 1
+            block = "".join(lines)
+            file.write(block)
+            written += len(block.encode("utf-8"))
+    return records
+
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as file:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 20), b""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=2048)
+    parser.add_argument("--repeat-every", type=int, default=10, help="Every Nth record repeats an earlier clip")
+    parser.add_argument("--min-efficiency", type=float, default=0.6,
+                        help="Min speedup per worker with the most workers, vs one worker")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic log and outputs")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    if cpus == 1:
+        counts.append(2)  # Shows the pool's overhead; not held to the scaling check
+
+    workdir = tempfile.mkdtemp(prefix="clip-transfer-bench-")
+    try:
+        log = os.path.join(workdir, "clipboard_log.txt")
+        records = write_log(log, int(args.size_mb * 1e6), args.repeat_every, random.Random(42))
+        print(f"{os.path.getsize(log) / 1e6:.0f} MB synthetic log, {records} records, {cpus} CPUs")
+        print("export                      workers   seconds     MB/s   speedup")
+        rates = {}
+        for workers in counts:
+            target = os.path.join(workdir, f"export-{workers}.jsonl")
+            stats = transfer(log, target, workers=workers)
+            if stats["records_written"] != records or count_lines(target) != records:
+                raise SystemExit(f"{target}: {stats['records_written']} of {records} records written")
+            rates[workers] = stats["bytes_read"] / stats["seconds"] / 1e6
+            print(f"{'text -> jsonl':28s}{workers:7d} {stats['seconds']:9.2f} {rates[workers]:8.1f} "
+                  f"{rates[workers] / rates[1]:8.2f}x")
+            os.remove(target)
+        stats = transfer(log, os.path.join(workdir, "compact.txt"), workers=cpus, dedup=True, compact=True)
+        if stats["records_written"] != records:
+            raise SystemExit(f"dedup/compact: {stats['records_written']} of {records} records written")
+        print(f"{'text -> text, compact':28s}{cpus:7d} {stats['seconds']:9.2f} "
+              f"{stats['bytes_read'] / stats['seconds'] / 1e6:8.1f}          "
+              f"{stats['references']} references, {stats['bytes_read'] - stats['bytes_written']} bytes saved")
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    scaled = min(max(counts), cpus)
+    speedup = rates[scaled] / rates[1]
+    if scaled > 1 and speedup < args.min_efficiency * scaled:
+        print(f"FAIL: {scaled} workers are only {speedup:.2f}x faster than one (min {args.min_efficiency * scaled:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
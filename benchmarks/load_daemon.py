@@ -0,0 +1,177 @@
+"""
+Load test for the clipboard daemon.
+
+Starts a daemon in-process on a temporary log and socket, feeding it clips
+through a PushSource (no real clipboard needed), and while clips are being
+ingested runs:
+
+* --clients processes (separate interpreters, like real front ends), each
+  with its own connection, issuing a mix of recent/search/stats requests
+  as fast as replies come back,
+* --subscribers threads streaming new clips.
+
+Reports request throughput and latency percentiles, then checks that no
+request failed, that every subscriber saw every clip, and that every clip
+reached the log. Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/load_daemon.py [--clients 32] [--subscribers 4] [--clips 2000] [--rate 500]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_client import DaemonClient, daemon_running  # noqa: E402
+from clipboard_daemon import ClipboardDaemon  # noqa: E402
+from clipboard_sources import PushSource  # noqa: E402
+from clipboard_store import iter_log_records  # noqa: E402
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+
+
+def client_worker(socket_path: str, stop, results, seed: int) -> None:
+    rng = random.Random(seed)
+    latencies: list = []
+    errors: list = []
+    try:
+        with DaemonClient(socket_path) as client:
+            while not stop.is_set():
+                roll = rng.random()
+                started = time.perf_counter()
+                try:
+                    if roll < 0.6:
+                        client.recent(rng.choice((1, 10, 50)))
+                    elif roll < 0.9:
+                        client.search(rng.choice(WORDS), limit=20)
+                    else:
+                        client.stats()
+                except Exception as e:
+                    errors.append(repr(e))
+                    break
+                latencies.append(time.perf_counter() - started)
+    except Exception as e:
+        errors.append(repr(e))
+    results.put((latencies, errors))
+
+
+def subscriber_worker(socket_path: str, received: list, ready: threading.Barrier, clients: list) -> None:
+    client = DaemonClient(socket_path)
+    clients.append(client)
+    stream = client.subscribe()
+    ready.wait()
+    for record in stream:
+        received.append(record.content)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--clips", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500, help="Clips per second fed to the daemon")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="clip-daemon-load-")
+    log_path = os.path.join(workdir, "clipboard_log.txt")
+    socket_path = os.path.join(workdir, "daemon.sock")
+    source = PushSource(paste_func=lambda: "", maxsize=args.clips + 1)
+    daemon = ClipboardDaemon(log_path, socket_path, source=source)
+    daemon_thread = threading.Thread(target=lambda: asyncio.run(daemon.serve()), name="Daemon")
+    daemon_thread.start()
+    failures = []
+    try:
+        deadline = time.monotonic() + 10
+        while not daemon_running(socket_path):
+            if time.monotonic() > deadline:
+                raise SystemExit("Daemon did not start")
+            time.sleep(0.05)
+
+        received = [[] for _ in range(args.subscribers)]
+        ready = threading.Barrier(args.subscribers + 1)
+        subscriber_clients: list = []
+        subscribers = [threading.Thread(target=subscriber_worker, args=(socket_path, received[i], ready, subscriber_clients))
+                       for i in range(args.subscribers)]
+        for thread in subscribers:
+            thread.start()
+        ready.wait()
+
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client_worker, args=(socket_path, stop, results, i))
+                   for i in range(args.clients)]
+        for process in clients:
+            process.start()
+
+        # Ingest: distinct clips at the requested rate
+        started = time.perf_counter()
+        for i in range(args.clips):
+            source.push(f"clip {i} {WORDS[i % len(WORDS)]}")
+            delay = started + (i + 1) / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        while daemon.clips_saved < args.clips and time.perf_counter() - started < args.clips / args.rate + 30:
+            time.sleep(0.05)
+        ingest_seconds = time.perf_counter() - started
+        stop.set()
+        latencies: list = []
+        errors: list = []
+        for _ in clients:
+            client_latencies, client_errors = results.get(timeout=30)
+            latencies.extend(client_latencies)
+            errors.extend(client_errors)
+        for process in clients:
+            process.join()
+
+        # Let subscribers drain, then disconnect them
+        deadline = time.monotonic() + 10
+        while any(len(r) < args.clips for r in received) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for client in subscriber_clients:
+            client.close()
+        for thread in subscribers:
+            thread.join(timeout=5)
+
+        print(f"ingested {daemon.clips_saved}/{args.clips} clips in {ingest_seconds:.2f} s "
+              f"while {args.clients} clients queried and {args.subscribers} subscribed")
+        print(f"requests: {len(latencies)} ({len(latencies) / ingest_seconds:.0f}/s), "
+              f"p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+              f"mean {statistics.mean(latencies) * 1000 if latencies else 0:.2f} ms")
+        print(f"subscriber drops: {daemon.subscriber_drops}")
+        if errors:
+            failures.append(f"{len(errors)} request errors, first: {errors[0]}")
+        if daemon.clips_saved != args.clips:
+            failures.append(f"daemon saved {daemon.clips_saved} of {args.clips} clips")
+        for i, clips in enumerate(received):
+            if len(clips) != args.clips:
+                failures.append(f"subscriber {i} received {len(clips)} of {args.clips} clips")
+    finally:
+        daemon.stop()
+        daemon_thread.join(timeout=15)
+
+    written = sum(1 for _ in iter_log_records(log_path)) if os.path.exists(log_path) else 0
+    print(f"records in log: {written}")
+    if written != args.clips:
+        failures.append(f"log holds {written} of {args.clips} clips")
+    shutil.rmtree(workdir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
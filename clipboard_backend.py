@@ -0,0 +1,237 @@
+"""
+Clipboard backends: where the monitors read clipboard text from.
+
+SystemClipboard is the real clipboard, through pyperclip (xclip, xsel or
+wl-clipboard on Linux, pbpaste on macOS, the Win32 API on Windows).
+FakeClipboard is an in-process stand-in for headless runs and
+benchmarks: copy() changes it at once and notifies watchers, the way a
+toolkit change signal would, and every copy is kept with its time so a
+run can be checked against what was copied and when.
+
+Scripted workloads drive a FakeClipboard from a thread with replay():
+bursty copying, an idle clipboard, huge payloads, unicode text and
+whitespace-only clips (WORKLOADS). Change sources read through
+get_backend() unless given a backend, so set_backend(FakeClipboard())
+before a monitor starts runs it without a display. See
+benchmarks/bench_pipeline.py.
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+import typing
+
+import pyperclip
+
+from clipboard_store import CLIPBOARD, PRIMARY
+
+WORDS: typing.Tuple[str, ...] = tuple(
+    "the quick brown fox jumps over lazy dog clipboard history record monitor writer queue batch "
+    "commit config value server client request deploy release meeting notes".split())
+UNICODE_SAMPLES: typing.Tuple[str, ...] = (
+    "naïve café résumé", "Ελληνικά κείμενο", "Привет, мир", "中文剪贴板历史", "日本語のテキスト",
+    "한국어 클립보드", "עברית מימין לשמאל", "العربية من اليمين", "emoji 🎉🚀👍🏽", "flags 🇩🇪🇯🇵",
+    "combining e\u0301 a\u0308 n\u0303", "zero\u200bwidth\u200djoiner", "math 𝔸𝔹ℂ ∑∫√", "tab\tand\u00a0nbsp")
+WHITESPACE_SAMPLES: typing.Tuple[str, ...] = (
+    " ", "\n", "\t\t", " \n \n ", "\r\n", "\u00a0", "\u3000", "\u2002\u2003", "\f\v")
+
+
+def paste_command(selection: str = CLIPBOARD) -> typing.Optional[typing.List[str]]:
+    """ The command that prints a selection on this system (the one pyperclip would run), or None. """
+    primary = selection == PRIMARY
+    if sys.platform == "darwin":
+        return None if primary else ["pbpaste"]
+    if not sys.platform.startswith("linux"):
+        return None
+    if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-paste"):
+        return ["wl-paste", "--no-newline"] + (["--primary"] if primary else [])
+    if os.environ.get("DISPLAY"):
+        if shutil.which("xclip"):
+            return ["xclip", "-selection", "primary" if primary else "clipboard", "-o"]
+        if shutil.which("xsel"):
+            return ["xsel", "--primary" if primary else "--clipboard", "--output"]
+    return None
+
+
+class ClipboardBackend:
+    """
+    Base class for clipboard backends.
+
+    paste() returns the current text of a selection and copy() replaces it.
+    paste_command() names a command that prints the selection, so large
+    clips can be streamed rather than read whole (None: use paste()).
+    Backends with event_driven set call watch() callbacks with
+    (text, owner, selection) on every change; create_change_source() then
+    listens to them instead of polling.
+    """
+    name: str = "base"
+    event_driven: bool = False
+
+    def paste(self, selection: str = CLIPBOARD) -> str:
+        raise NotImplementedError
+
+    def copy(self, text: str, selection: str = CLIPBOARD) -> None:
+        raise NotImplementedError
+
+    def paste_command(self, selection: str = CLIPBOARD) -> typing.Optional[typing.List[str]]:
+        return None
+
+    def watch(self, callback: typing.Callable[[str, typing.Optional[str], str], None]) -> None:
+        raise NotImplementedError
+
+
+def _load_pyperclip() -> None:
+    # pyperclip.copy/paste start out as lazy stubs that take no arguments and pick the real
+    # mechanism on first use; PRIMARY needs primary=True, so pick it now if nothing has yet
+    if pyperclip.paste is pyperclip.lazy_load_stub_paste or pyperclip.copy is pyperclip.lazy_load_stub_copy:
+        pyperclip.copy, pyperclip.paste = pyperclip.determine_clipboard()
+
+
+class SystemClipboard(ClipboardBackend):
+    """ The desktop clipboard, through pyperclip. PRIMARY works with the xclip, xsel and wl-clipboard backends. """
+    name = "system"
+
+    def paste(self, selection: str = CLIPBOARD) -> str:
+        if selection == CLIPBOARD:
+            return pyperclip.paste()
+        _load_pyperclip()
+        try:
+            return pyperclip.paste(primary=True)
+        except TypeError:
+            raise pyperclip.PyperclipException("This clipboard backend cannot read the PRIMARY selection") from None
+
+    def copy(self, text: str, selection: str = CLIPBOARD) -> None:
+        if selection == CLIPBOARD:
+            pyperclip.copy(text)
+            return
+        _load_pyperclip()
+        try:
+            pyperclip.copy(text, primary=True)
+        except TypeError:
+            raise pyperclip.PyperclipException("This clipboard backend cannot set the PRIMARY selection") from None
+
+    def paste_command(self, selection: str = CLIPBOARD) -> typing.Optional[typing.List[str]]:
+        return paste_command(selection)
+
+
+class CopyEvent(typing.NamedTuple):
+    time: float  # time.time() of the copy
+    text: str
+    selection: str
+
+
+class FakeClipboard(ClipboardBackend):
+    """
+    In-process clipboard. copy() is seen by the next paste() and, on the
+    copying thread, by every watch() callback. copies lists each CopyEvent;
+    reads counts paste() calls (on Linux each would spawn xclip or xsel),
+    and paste_delay adds that cost to every read.
+    """
+    name = "fake"
+    event_driven = True
+
+    def __init__(self, paste_delay: float = 0.0):
+        self.paste_delay = paste_delay
+        self.copies: typing.List[CopyEvent] = []
+        self.reads: int = 0
+        self._texts: typing.Dict[str, str] = {}
+        self._watchers: typing.List[typing.Callable[[str, typing.Optional[str], str], None]] = []
+        self._lock = threading.Lock()
+
+    def paste(self, selection: str = CLIPBOARD) -> str:
+        if self.paste_delay:
+            time.sleep(self.paste_delay)
+        with self._lock:
+            self.reads += 1
+            return self._texts.get(selection, "")
+
+    def copy(self, text: str, selection: str = CLIPBOARD, owner: typing.Optional[str] = None) -> None:
+        with self._lock:
+            self._texts[selection] = text
+            self.copies.append(CopyEvent(time.time(), text, selection))
+            watchers = list(self._watchers)
+        for callback in watchers:
+            callback(text, owner, selection)
+
+    def watch(self, callback: typing.Callable[[str, typing.Optional[str], str], None]) -> None:
+        with self._lock:
+            self._watchers.append(callback)
+
+
+_backend: ClipboardBackend = SystemClipboard()
+
+
+def get_backend() -> ClipboardBackend:
+    return _backend
+
+
+def set_backend(backend: ClipboardBackend) -> None:
+    """ Makes backend the clipboard of change sources and large-clip reads created from now on. """
+    global _backend
+    _backend = backend
+
+
+# --- Scripted workloads ---
+
+class ScriptedCopy(typing.NamedTuple):
+    delay: float                # Seconds to wait before the copy
+    text: typing.Optional[str]  # None: only wait
+    selection: str = CLIPBOARD
+
+
+def replay(clipboard: FakeClipboard, script: typing.Iterable[ScriptedCopy],
+           stop: typing.Optional[threading.Event] = None) -> int:
+    """ Performs a script's copies in order on this thread. Returns how many were made. """
+    stop = stop or threading.Event()
+    copied = 0
+    for step in script:
+        if step.delay and stop.wait(step.delay):
+            break
+        if step.text is not None:
+            clipboard.copy(step.text, step.selection)
+            copied += 1
+    return copied
+
+
+def _sentence(i: int, words: int) -> str:
+    return " ".join(WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(words))
+
+
+def burst(bursts: int = 5, size: int = 100, gap: float = 0.002, pause: float = 1.0) -> typing.List[ScriptedCopy]:
+    """ Groups of size copies gap seconds apart, with pause seconds between groups. """
+    return [ScriptedCopy(pause if i % size == 0 else gap, f"#{i} {_sentence(i, 4 + i % 20)}")
+            for i in range(bursts * size)]
+
+
+def idle(seconds: float = 10.0) -> typing.List[ScriptedCopy]:
+    """ One copy, then an unchanged clipboard for seconds. """
+    return [ScriptedCopy(0.0, f"#0 {_sentence(0, 8)}"), ScriptedCopy(seconds, None)]
+
+
+def huge(count: int = 3, size: int = 8 << 20, gap: float = 1.0) -> typing.List[ScriptedCopy]:
+    """ count distinct clips of about size bytes each (prose, as from a log file or a dump). """
+    line = _sentence(1, 12) + "\n"
+    body = line * (size // len(line))
+    return [ScriptedCopy(gap, f"#{i} {body}") for i in range(count)]
+
+
+def unicode(count: int = 200, gap: float = 0.01) -> typing.List[ScriptedCopy]:
+    """ Non-ASCII clips: accents, CJK, right-to-left scripts, emoji, combining and zero-width characters. """
+    return [ScriptedCopy(gap, f"#{i} {UNICODE_SAMPLES[i % len(UNICODE_SAMPLES)]} {_sentence(i, 3)}")
+            for i in range(count)]
+
+
+def whitespace(count: int = 100, gap: float = 0.01) -> typing.List[ScriptedCopy]:
+    """ Whitespace-only clips, none of which should be saved. """
+    return [ScriptedCopy(gap, WHITESPACE_SAMPLES[i % len(WHITESPACE_SAMPLES)] * (1 + i // len(WHITESPACE_SAMPLES)))
+            for i in range(count)]
+
+
+WORKLOADS: typing.Dict[str, typing.Callable[[], typing.List[ScriptedCopy]]] = {
+    "bursty": burst,
+    "idle": idle,
+    "huge": huge,
+    "unicode": unicode,
+    "whitespace": whitespace,
+}
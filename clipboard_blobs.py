@@ -0,0 +1,115 @@
+"""
+Content-addressed store for non-text clips.
+
+Images, HTML and file lists are too big (or too binary) for the text log.
+Each payload is written once to
+
+    <log stem>_blobs/<first two hex digits>/<digest><extension>
+
+where digest is the blake2b-128 of the stored bytes, and the log only gets
+a small BLOB_PREFIX record pointing at it. Copying the same screenshot
+twice therefore costs one file. put() accepts any buffer (bytes,
+memoryview, QByteArray) and hashes and writes it in place, so a payload is
+never duplicated in memory on its way to disk. put_stream() does the same
+for payloads that arrive in pieces and never are in memory whole (large
+text clips, see clipboard_largeclip).
+"""
+import hashlib
+import os
+import threading
+import typing
+
+from clipboard_fingerprint import DIGEST_SIZE, bytes_digest
+
+BLOB_DIR_SUFFIX: str = "_blobs"
+EXTENSIONS: typing.Dict[str, str] = {
+    "image/png": ".png",
+    "text/html": ".html",
+    "text/uri-list": ".uris",
+    "text/plain": ".txt",
+}
+
+
+def blob_dir_for(log_path: str) -> str:
+    """ The blob directory that belongs to a log (or database) file. """
+    return os.path.splitext(os.path.abspath(log_path))[0] + BLOB_DIR_SUFFIX
+
+
+class BlobStore:
+    """ Directory of immutable payloads named by their digest. Safe to use from several threads. """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+        # Stats
+        self.written: int = 0
+        self.reused: int = 0  # put() calls that found the payload already stored
+        self.bytes_written: int = 0
+
+    def path_for(self, digest: str, mime_type: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + EXTENSIONS.get(mime_type, ".bin"))
+
+    def put(self, data: typing.Any, mime_type: str) -> str:
+        """ Stores the buffer unless an identical payload exists. Returns its digest. """
+        view = memoryview(data)
+        digest = bytes_digest(view)
+        path = self.path_for(digest, mime_type)
+        if os.path.exists(path):
+            with self._lock:
+                self.reused += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a private name first so readers never see a partial blob
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(view)
+        os.replace(tmp, path)
+        with self._lock:
+            self.written += 1
+            self.bytes_written += view.nbytes
+        return digest
+
+    def put_stream(self, chunks: typing.Iterable[typing.Any], mime_type: str) -> typing.Tuple[str, int]:
+        """
+        Stores a payload given as a sequence of buffers, hashing and writing
+        each as it arrives. Returns (digest, size in bytes). If chunks raises,
+        nothing is stored and the exception propagates.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        # The name is only known at the end: write under a private one in the root, then move it into place
+        tmp = os.path.join(self.root, f"incoming.{os.getpid()}-{threading.get_ident()}.tmp")
+        hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        size = 0
+        try:
+            with open(tmp, "wb") as file:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    size += file.write(chunk)
+            digest = hasher.hexdigest()
+            path = self.path_for(digest, mime_type)
+            if os.path.exists(path):
+                os.remove(tmp)
+                with self._lock:
+                    self.reused += 1
+                return digest, size
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self.written += 1
+            self.bytes_written += size
+        return digest, size
+
+    def get(self, digest: str, mime_type: str) -> bytes:
+        with open(self.path_for(digest, mime_type), "rb") as file:
+            return file.read()
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {"written": self.written, "reused": self.reused, "bytes_written": self.bytes_written}
@@ -0,0 +1,197 @@
+"""
+Capture of non-text clipboard content for the GUI saver.
+
+pyperclip only ever returns text, so screenshots and rich copies used to be
+dropped. The GUI reads QClipboard.mimeData() on the GUI thread and turns it
+into a ClipSnapshot; that step only takes implicitly shared references
+(QImage) and short strings, so it does not copy pixel data. The snapshot is
+then handed to a small worker pool which converts it, encodes images as
+PNG (lossless), stores the payloads in the BlobStore and reports a
+BLOB_PREFIX record for the log. Encoded bytes stay in their QByteArray and
+are hashed and written through a memoryview.
+
+With a ClipFilter, HTML and file lists go through the same secret rules
+as text before they are stored: HTML is stored redacted (or not at all
+when a DROP rule fires), and a file list any rule fires on is not stored,
+since a redacted link points nowhere. Consecutive copies of the same
+payload are skipped, and at most MAX_PENDING snapshots wait for the pool
+so a burst of screenshots cannot pile up in memory.
+"""
+import concurrent.futures
+import threading
+import typing
+import urllib.parse
+from datetime import datetime
+
+from PyQt5 import QtCore, QtGui
+
+from clipboard_blobs import BlobStore
+from clipboard_filter import DROP, KEEP, ClipFilter
+from clipboard_fingerprint import bytes_digest
+from clipboard_store import ClipRecord, make_blob_ref
+
+IMAGE_MIME: str = "image/png"
+HTML_MIME: str = "text/html"
+URI_LIST_MIME: str = "text/uri-list"
+CAPTURE_FORMATS: typing.Tuple[str, ...] = (IMAGE_MIME, HTML_MIME, URI_LIST_MIME)  # What is saved besides text
+ENCODE_WORKERS: int = 2  # Threads encoding and writing blobs
+MAX_PENDING: int = 8     # Snapshots waiting for the pool before new ones are dropped
+PNG_QUALITY: int = 50    # Qt maps this to zlib level; PNG stays lossless at any value
+PASSWORD_HINT_MIME: str = "x-kde-passwordManagerHint"  # Set to "secret" by KeePassXC and other password managers
+PASSWORD_MANAGER_OWNER: str = "password-manager"        # Owner reported for such clips (see clipboard_filter)
+
+
+class ClipSnapshot(typing.NamedTuple):
+    image: typing.Optional[QtGui.QImage]
+    html: typing.Optional[str]
+    uris: typing.Optional[typing.List[bytes]]  # Percent-encoded URLs
+
+
+def mime_owner(mime: QtCore.QMimeData) -> typing.Optional[str]:
+    """ PASSWORD_MANAGER_OWNER if the copying application marked the clip as secret, else None (unknown). """
+    if mime is not None and bytes(mime.data(PASSWORD_HINT_MIME)) == b"secret":
+        return PASSWORD_MANAGER_OWNER
+    return None
+
+
+def snapshot_mime(mime: QtCore.QMimeData,
+                  formats: typing.Sequence[str] = CAPTURE_FORMATS) -> typing.Optional[ClipSnapshot]:
+    """ Takes what is needed from the clipboard's QMimeData. Must run on the GUI thread. """
+    if mime is None:
+        return None
+    image = mime.imageData() if IMAGE_MIME in formats and mime.hasImage() else None
+    html = mime.html() if HTML_MIME in formats and mime.hasHtml() else None
+    uris = [bytes(url.toEncoded()) for url in mime.urls()] if URI_LIST_MIME in formats and mime.hasUrls() else None
+    if image is not None and image.isNull():
+        image = None
+    if image is None and not html and not uris:
+        return None
+    return ClipSnapshot(image, html or None, uris or None)
+
+
+def _image_pixels(image: QtGui.QImage) -> memoryview:
+    """ Read-only view of the image's pixel buffer, no copy. """
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return memoryview(bits)
+
+
+def encode_png(image: QtGui.QImage) -> QtCore.QByteArray:
+    """ Encodes an image as PNG into a QByteArray (safe off the GUI thread: QImage is not a QPixmap). """
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    if not image.save(buffer, "PNG", PNG_QUALITY):
+        raise ValueError("PNG encoding failed")
+    buffer.close()
+    return data
+
+
+class RichCapture:
+    """
+    Turns ClipSnapshots into blob records on a worker pool.
+    on_record(record, description) is called from a worker thread for every stored payload.
+    """
+
+    def __init__(self, blob_root: str,
+                 on_record: typing.Callable[[ClipRecord, str], None],
+                 on_error: typing.Optional[typing.Callable[[Exception], None]] = None,
+                 clip_filter: typing.Optional[ClipFilter] = None,
+                 workers: int = ENCODE_WORKERS,
+                 max_pending: int = MAX_PENDING):
+        self.blobs = BlobStore(blob_root)
+        self.on_record = on_record
+        self.on_error = on_error
+        self.clip_filter = clip_filter  # Secret rules for HTML and file lists (images are not checked)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ClipEncoder")
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._last: typing.Dict[str, str] = {}  # mime type -> digest of the last captured source data
+
+        # Stats
+        self.captured: int = 0
+        self.skipped: int = 0   # Same payload as the previous capture
+        self.dropped: int = 0   # Pool backlog full
+        self.filtered: int = 0  # Dropped by the filter
+
+    def set_root(self, blob_root: str) -> None:
+        """ Stores future payloads under a new directory (the log moved). """
+        self.blobs = BlobStore(blob_root)
+        with self._lock:
+            self._last.clear()
+
+    def submit(self, snapshot: ClipSnapshot) -> bool:
+        """ Queues a snapshot for encoding. Returns False if the backlog is full. Never blocks. """
+        if not self._pending.acquire(blocking=False):
+            self.dropped += 1
+            return False
+        try:
+            self._pool.submit(self._process, snapshot)
+        except RuntimeError:  # Pool already shut down
+            self._pending.release()
+            return False
+        return True
+
+    def close(self, wait: bool = True) -> None:
+        """ Stops accepting snapshots; with wait=True, finishes the queued ones first. """
+        self._pool.shutdown(wait=wait)
+
+    def _is_repeat(self, mime_type: str, digest: str) -> bool:
+        with self._lock:
+            if self._last.get(mime_type) == digest:
+                self.skipped += 1
+                return True
+            self._last[mime_type] = digest
+            return False
+
+    def _filter(self, text: str, redact: bool = True) -> typing.Optional[str]:
+        """ text as the filter would save it: unchanged, redacted (unless redact is False), or None if dropped. """
+        if self.clip_filter is None:
+            return text
+        result = self.clip_filter.apply(text)
+        if result.action == KEEP:
+            return text
+        if result.action == DROP or not redact:
+            with self._lock:
+                self.filtered += 1
+            return None
+        return result.text
+
+    def _store(self, mime_type: str, data: typing.Any, description: str) -> None:
+        digest = self.blobs.put(data, mime_type)
+        # Timestamped when stored so log records stay in time order with the text clips
+        record = ClipRecord(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), make_blob_ref(mime_type, digest))
+        with self._lock:
+            self.captured += 1
+        self.on_record(record, description)
+
+    def _process(self, snapshot: ClipSnapshot) -> None:
+        try:
+            if snapshot.image is not None:
+                image = snapshot.image
+                if image.format() not in (QtGui.QImage.Format_ARGB32, QtGui.QImage.Format_RGB32):
+                    image = image.convertToFormat(QtGui.QImage.Format_ARGB32)
+                # Hash the raw pixels first: re-copies of the same image skip the PNG encode entirely
+                if not self._is_repeat(IMAGE_MIME, bytes_digest(_image_pixels(image))):
+                    png = encode_png(image)
+                    self._store(IMAGE_MIME, png,
+                                f"<image {image.width()}x{image.height()}, {png.size() // 1024} KB PNG>")
+            if snapshot.html:
+                html = snapshot.html.encode("utf-8", "surrogatepass")
+                if not self._is_repeat(HTML_MIME, bytes_digest(html)):
+                    text = self._filter(snapshot.html)
+                    if text is not None:
+                        html = text.encode("utf-8", "surrogatepass")
+                        self._store(HTML_MIME, html, f"<HTML, {len(html) // 1024} KB>")
+            if snapshot.uris:
+                uris = b"".join(uri + b"\r\n" for uri in snapshot.uris)  # RFC 2483 line endings
+                if not self._is_repeat(URI_LIST_MIME, bytes_digest(uris)):
+                    # Checked decoded: "%3D" would hide "password=" from the rules
+                    text = "\n".join(urllib.parse.unquote(uri.decode("ascii", "replace")) for uri in snapshot.uris)
+                    if self._filter(text, redact=False) is not None:
+                        self._store(URI_LIST_MIME, uris, f"<{len(snapshot.uris)} file(s)/link(s)>")
+        except Exception as e:  # A bad clip must not kill the worker
+            if self.on_error:
+                self.on_error(e)
+        finally:
+            self._pending.release()
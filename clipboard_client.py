@@ -0,0 +1,132 @@
+"""
+Blocking client for the clipboard daemon (see clipboard_daemon).
+
+Kept apart from the daemon so front ends can find and talk to a running
+daemon without importing asyncio and the rest of the server side; the GUI
+calls daemon_running() on every start.
+"""
+import getpass
+import json
+import os
+import socket
+import tempfile
+import typing
+
+from clipboard_store import CLIPBOARD, ClipRecord
+
+DEFAULT_SEARCH_LIMIT: int = 100
+MAX_RESULTS: int = 10000              # Cap the daemon puts on `recent` n and `search` limit (one reply line each)
+CLIENT_TIMEOUT: float = 10.0          # Seconds a DaemonClient waits for a reply
+
+
+class DaemonError(Exception):
+    """ The daemon rejected a request, or none is listening. """
+
+
+def default_socket_path() -> str:
+    """ Per-user socket path, in XDG_RUNTIME_DIR when available. """
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"clipboard-saver-{getpass.getuser()}.sock")
+
+
+def record_to_json(record: ClipRecord) -> typing.Dict[str, str]:
+    return {"timestamp": record.timestamp, "content": record.content, "selection": record.selection}
+
+
+def record_from_json(item: typing.Dict[str, typing.Any]) -> ClipRecord:
+    """ Inverse of record_to_json(). A missing selection means CLIPBOARD (older daemons and exports). """
+    return ClipRecord(item["timestamp"], item["content"], item.get("selection") or CLIPBOARD)
+
+
+def encode_message(message: typing.Dict[str, typing.Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class DaemonClient:
+    """ Blocking client for the daemon socket. One request at a time; not shared between threads. """
+
+    def __init__(self, socket_path: typing.Optional[str] = None, timeout: typing.Optional[float] = CLIENT_TIMEOUT):
+        self.socket_path = socket_path or default_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(self.socket_path)
+        except OSError as e:
+            self._sock.close()
+            raise DaemonError(f"No clipboard daemon on {self.socket_path}: {e}") from e
+        self._file = self._sock.makefile("rwb")
+        self._next_id = 0
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Closes the connection; also ends a subscribe() running in another thread. """
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._file.close()
+        self._sock.close()
+
+    def _send(self, command: str, params: typing.Dict[str, typing.Any]) -> int:
+        self._next_id += 1
+        self._file.write(encode_message({"id": self._next_id, "cmd": command, **params}))
+        self._file.flush()
+        return self._next_id
+
+    def _receive(self) -> typing.Dict[str, typing.Any]:
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("Daemon closed the connection")
+        return json.loads(line)
+
+    def request(self, command: str, **params: typing.Any) -> typing.Any:
+        self._send(command, params)
+        response = self._receive()
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", "Request failed"))
+        return response["result"]
+
+    def recent(self, n: int = 10, since: typing.Optional[str] = None) -> typing.List[ClipRecord]:
+        return [ClipRecord(**item) for item in self.request("recent", n=n, since=since)]
+
+    def search(self, keyword: str, since: typing.Optional[str] = None, until: typing.Optional[str] = None,
+               ignore_case: bool = False, limit: int = DEFAULT_SEARCH_LIMIT) -> typing.List[ClipRecord]:
+        return [ClipRecord(**item) for item in self.request("search", keyword=keyword, since=since, until=until,
+                                                            ignore_case=ignore_case, limit=limit)]
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return self.request("stats")
+
+    def pause(self) -> typing.Dict[str, typing.Any]:
+        return self.request("pause")
+
+    def resume(self) -> typing.Dict[str, typing.Any]:
+        return self.request("resume")
+
+    def subscribe(self) -> typing.Iterator[ClipRecord]:
+        """ Yields new clips as the daemon saves them. Ends when the connection is closed. """
+        self.request("subscribe")
+        self._sock.settimeout(None)  # Clips may be hours apart
+        while True:
+            try:
+                message = self._receive()
+            except (DaemonError, OSError, ValueError):
+                return
+            if message.get("event") == "clip":
+                yield record_from_json(message)
+
+
+def daemon_running(socket_path: typing.Optional[str] = None) -> bool:
+    """ True if a daemon answers on the socket. """
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    try:
+        with DaemonClient(socket_path, timeout=1.0) as client:
+            return client.request("ping") == "pong"
+    except (DaemonError, OSError, ValueError):
+        return False
@@ -0,0 +1,320 @@
+"""
+Encrypted-at-rest text log.
+
+A log named like ENCRYPTED_EXTENSIONS (e.g. clipboard_log.enc) is written by
+EncryptedLogStore instead of TextLogStore. The file starts with a header
+
+    MAGIC | kdf | scrypt log2(n), r, p | salt (16) | key check (16)
+
+followed by sealed frames, one per batch the writer flushes:
+
+    ciphertext length (4) | sequence (8) | nonce (12) | AES-256-GCM ciphertext + tag
+
+A frame holds whole "[timestamp] content" records, so appending a batch
+seals and appends one frame and leaves everything before it untouched, and
+readers decrypt and parse the log frame by frame. The header and the frame
+sequence number are authenticated along with each frame: a frame that is
+altered, dropped from the middle, reordered or copied in from another log
+fails to read. A frame cut short by a crash is dropped when the log is next
+opened for writing.
+
+The key is derived from a passphrase with scrypt (salt and cost in the
+header), or read from a key file of 32 random bytes (generate_key_file()).
+unlock() registers the passphrase or key file for a log in this process;
+the writer thread and the history readers take it from there.
+
+Needs the optional `cryptography` package. Run this module to make a key file
+or print a log:
+    python clipboard_crypto.py keygen clipboard.key
+    python clipboard_crypto.py cat clipboard_log.enc [--key-file clipboard.key]
+"""
+import functools
+import getpass
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import sys
+import typing
+
+from clipboard_store import ClipRecord, ClipStore, format_record, parse_records
+
+PASSPHRASE_ENV: str = "CLIPBOARD_SAVER_PASSPHRASE"  # Read by unlock_from_environment(), e.g. for services
+SCRYPT_LOG2_N: int = 15        # scrypt cost for new logs: 2**15 * 8 * 128 bytes = 32 MB, ~0.1 s per unlock
+SCRYPT_R: int = 8
+SCRYPT_P: int = 1
+FRAME_BYTES: int = 1024 * 1024  # Records are grouped into frames of about this many characters
+
+MAGIC: bytes = b"CLIPENC1"
+KEY_BYTES: int = 32  # AES-256
+_KDF_KEY_FILE, _KDF_SCRYPT = 0, 1
+_MAX_LOG2_N = 22  # Refuse headers asking for more than 4 GB of scrypt memory
+_HEADER = struct.Struct(">8sBBBB16s16s")  # magic, kdf, log2 n, r, p, salt, key check
+_FRAME = struct.Struct(">IQ12s")          # ciphertext length, sequence, nonce
+_SEQUENCE = struct.Struct(">Q")
+
+
+class EncryptionError(OSError):
+    """ Locked log, wrong key, or a frame that failed authentication. An OSError, so the writer reports it. """
+
+
+class Secret(typing.NamedTuple):
+    passphrase: typing.Optional[str] = None
+    key: typing.Optional[bytes] = None  # Contents of a key file
+
+
+_secrets: typing.Dict[str, Secret] = {}  # Absolute log path -> secret given to unlock()
+
+
+def _aesgcm(key: bytes) -> typing.Any:
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        raise EncryptionError("Encrypted logs need the 'cryptography' package (pip install cryptography)") from None
+    return AESGCM(key)
+
+
+@functools.lru_cache(maxsize=8)
+def _derive(secret: Secret, prefix: bytes) -> bytes:
+    """ The log key for a header (without its key check). Cached: scrypt is slow on purpose. """
+    _, kdf, log2_n, r, p, salt = _HEADER.unpack(prefix + bytes(16))[:6]
+    if kdf == _KDF_KEY_FILE:
+        if secret.key is None:
+            raise EncryptionError("This log is encrypted with a key file, not a passphrase")
+        return secret.key
+    if kdf != _KDF_SCRYPT or log2_n > _MAX_LOG2_N:
+        raise EncryptionError("Unsupported key derivation in the log header")
+    if secret.passphrase is None:
+        raise EncryptionError("This log is encrypted with a passphrase, not a key file")
+    return hashlib.scrypt(secret.passphrase.encode("utf-8"), salt=salt, n=1 << log2_n, r=r, p=p,
+                          maxmem=256 * r * (1 << log2_n), dklen=KEY_BYTES)
+
+
+def _key_check(key: bytes, prefix: bytes) -> bytes:
+    return hmac.new(key, b"clipboard-saver key check" + prefix, hashlib.sha256).digest()[:16]
+
+
+def _new_header(secret: Secret) -> typing.Tuple[bytes, bytes]:
+    kdf = _KDF_KEY_FILE if secret.key is not None else _KDF_SCRYPT
+    prefix = _HEADER.pack(MAGIC, kdf, SCRYPT_LOG2_N, SCRYPT_R, SCRYPT_P, secrets.token_bytes(16), bytes(16))[:-16]
+    key = _derive(secret, prefix)
+    return prefix + _key_check(key, prefix), key
+
+
+def _header_key(path: str, header: bytes, secret: typing.Optional[Secret] = None) -> bytes:
+    """ Checks header and returns the log key, using the secret registered for path unless one is given. """
+    if len(header) < _HEADER.size or not header.startswith(MAGIC):
+        raise EncryptionError(f"{path} is not an encrypted clipboard log")
+    if secret is None:
+        secret = _secrets.get(os.path.abspath(path))
+        if secret is None:
+            raise EncryptionError(f"{path} is encrypted and locked: unlock it with its passphrase or key file")
+    prefix = header[:-16]
+    key = _derive(secret, prefix)
+    if not hmac.compare_digest(_key_check(key, prefix), header[-16:]):
+        raise EncryptionError(f"Wrong passphrase or key file for {path}")
+    return key
+
+
+def _frame_aad(header: bytes, sequence: int) -> bytes:
+    return header + _SEQUENCE.pack(sequence)
+
+
+# --- Keys ---
+
+def read_key_file(path: str) -> bytes:
+    """ A key file holds KEY_BYTES raw bytes, or the same as hex. """
+    with open(path, "rb") as file:
+        data = file.read(4 * KEY_BYTES)
+    if len(data) == KEY_BYTES:
+        return data
+    try:
+        key = bytes.fromhex(data.decode("ascii").strip())
+    except ValueError:
+        key = b""
+    if len(key) != KEY_BYTES:
+        raise EncryptionError(f"{path} is not a key file ({KEY_BYTES} random bytes)")
+    return key
+
+
+def generate_key_file(path: str) -> None:
+    """ Writes a new random key, readable by the owner only. Never overwrites a file. """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(secrets.token_bytes(KEY_BYTES))
+
+
+def is_new_log(path: str) -> bool:
+    """ True if nothing has been written to the log at path yet. """
+    return not os.path.exists(path) or os.path.getsize(path) == 0
+
+
+def unlock(path: str, passphrase: typing.Optional[str] = None, key_file: typing.Optional[str] = None) -> None:
+    """
+    Registers the passphrase or key file for the encrypted log at path. An
+    existing log is checked right away (EncryptionError if it does not
+    match); a new one is created with it on the first write.
+    """
+    if key_file:
+        secret = Secret(key=read_key_file(key_file))
+    elif passphrase:
+        secret = Secret(passphrase=passphrase)
+    else:
+        raise EncryptionError("An empty passphrase does not protect anything")
+    if not is_new_log(path):
+        with open(path, "rb") as file:
+            _header_key(path, file.read(_HEADER.size), secret)
+    _secrets[os.path.abspath(path)] = secret
+
+
+def is_unlocked(path: str) -> bool:
+    return os.path.abspath(path) in _secrets
+
+
+def unlock_from_environment(path: str, key_file: typing.Optional[str] = None) -> bool:
+    """ Unlocks path with key_file, else with $CLIPBOARD_SAVER_PASSPHRASE. False if neither is set. """
+    if is_unlocked(path):
+        return True
+    if key_file or os.environ.get(PASSPHRASE_ENV):
+        unlock(path, os.environ.get(PASSPHRASE_ENV), key_file)
+        return True
+    return False
+
+
+def unlock_interactive(path: str, key_file: typing.Optional[str] = None) -> None:
+    """ Like unlock_from_environment(), falling back to a terminal prompt (asked twice for a new log). """
+    if unlock_from_environment(path, key_file):
+        return
+    if not sys.stdin.isatty():
+        raise EncryptionError(f"{path} is encrypted: set {PASSPHRASE_ENV} or a key file")
+    passphrase = getpass.getpass(f"Passphrase for {path}: ")
+    if is_new_log(path) and getpass.getpass("Repeat the passphrase: ") != passphrase:
+        raise EncryptionError("The passphrases do not match")
+    unlock(path, passphrase)
+
+
+# --- Writing ---
+
+class EncryptedLogStore(ClipStore):
+    """ Appends each batch to an encrypted log as sealed frames. The log must be unlock()ed first. """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        secret = _secrets.get(os.path.abspath(path))
+        if secret is None:
+            raise EncryptionError(f"{path} is encrypted and locked: unlock it with its passphrase or key file")
+        self._file: typing.BinaryIO = open(path, "a+b")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size == 0:
+                self._header, key = _new_header(secret)
+                self._file.write(self._header)
+                self._sequence = 0
+            else:
+                self._file.seek(0)
+                self._header = self._file.read(_HEADER.size)
+                key = _header_key(path, self._header, secret)
+                self._sequence, end = _scan_frames(self._file, size)
+                if end < size:
+                    print(f"Dropping {size - end} bytes of an incomplete frame at the end of {path}")
+                    self._file.truncate(end)
+            self._aead = _aesgcm(key)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _seal(self, plaintext: bytes) -> bytes:
+        nonce = os.urandom(12)  # Random: safe for 2**32 frames per key, and across restarts
+        ciphertext = self._aead.encrypt(nonce, plaintext, _frame_aad(self._header, self._sequence))
+        frame = _FRAME.pack(len(ciphertext), self._sequence, nonce) + ciphertext
+        self._sequence += 1
+        return frame
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        frames: typing.List[bytes] = []
+        pending: typing.List[str] = []
+        size = 0
+        for record in records:
+            text = format_record(record)
+            if pending and size + len(text) > FRAME_BYTES:  # Characters: close enough to bytes for sizing
+                frames.append(self._seal("".join(pending).encode("utf-8", "surrogatepass")))
+                pending, size = [], 0
+            pending.append(text)
+            size += len(text)
+        if pending:
+            frames.append(self._seal("".join(pending).encode("utf-8", "surrogatepass")))
+        self._file.write(frames[0] if len(frames) == 1 else b"".join(frames))
+
+    def sync(self, durable: bool = False) -> None:
+        self._file.flush()
+        if durable:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _scan_frames(file: typing.BinaryIO, size: int) -> typing.Tuple[int, int]:
+    """ Walks the frame headers only. Returns the next sequence number and where the last complete frame ends. """
+    offset, sequence = _HEADER.size, 0
+    while offset + _FRAME.size <= size:
+        file.seek(offset)
+        length, _, _ = _FRAME.unpack(file.read(_FRAME.size))
+        if offset + _FRAME.size + length > size:
+            break
+        offset += _FRAME.size + length
+        sequence += 1
+    return sequence, min(offset, size)
+
+
+# --- Reading ---
+
+def iter_frames(path: str) -> typing.Iterator[bytes]:
+    """ Decrypts the log frame by frame. Stops quietly at a frame that is still being written. """
+    with open(path, "rb") as file:
+        header = file.read(_HEADER.size)
+        if not header:
+            return
+        aead = _aesgcm(_header_key(path, header))
+        from cryptography.exceptions import InvalidTag
+        sequence = 0
+        while True:
+            head = file.read(_FRAME.size)
+            if len(head) < _FRAME.size:
+                return
+            length, frame_sequence, nonce = _FRAME.unpack(head)
+            ciphertext = file.read(length)
+            if len(ciphertext) < length:
+                return
+            if frame_sequence != sequence:
+                raise EncryptionError(f"{path}: frame {sequence} is missing or out of order")
+            try:
+                yield aead.decrypt(nonce, ciphertext, _frame_aad(header, sequence))
+            except InvalidTag:
+                raise EncryptionError(f"{path}: frame {sequence} failed authentication (corrupted or tampered)") from None
+            sequence += 1
+
+
+def iter_encrypted_records(path: str) -> typing.Iterator[ClipRecord]:
+    """ Streams the records of an unlocked encrypted log. Reference records are returned unresolved. """
+    for plaintext in iter_frames(path):
+        yield from parse_records(plaintext.decode("utf-8", "replace"))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "keygen":
+        generate_key_file(sys.argv[2])
+        print(f"Wrote a new key to {sys.argv[2]}. Keep a copy: without it the log cannot be read.")
+    elif len(sys.argv) in (3, 5) and sys.argv[1] == "cat" and (len(sys.argv) == 3 or sys.argv[3] == "--key-file"):
+        try:
+            unlock_interactive(sys.argv[2], sys.argv[4] if len(sys.argv) == 5 else None)
+            for clip in iter_encrypted_records(sys.argv[2]):
+                sys.stdout.write(format_record(clip))
+        except EncryptionError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+    else:
+        print("Usage: python clipboard_crypto.py keygen <key file>\n"
+              "       python clipboard_crypto.py cat <log.enc> [--key-file <key file>]")
+        sys.exit(2)
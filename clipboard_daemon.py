@@ -0,0 +1,391 @@
+"""
+Headless clipboard daemon with a local query API.
+
+One ClipboardDaemon owns the change source, the monitor loop and the
+LogWriter, so the clipboard is watched and logged exactly once no matter
+how many front ends are open. It runs on asyncio and listens on a
+Unix-domain socket (mode 0600, so only the owning user can connect).
+
+The protocol is newline-delimited JSON. A request is one object with a
+"cmd" and optional "id", which is echoed back:
+
+    {"id": 1, "cmd": "recent", "n": 20}
+    {"id": 1, "ok": true, "result": [{"timestamp": "...", "content": "..."}, ...]}
+
+Commands: ping, recent (n, since), search (keyword, since, until, ignore_case,
+limit), stats, pause, resume and subscribe. After subscribe the server
+acknowledges once and then streams {"event": "clip", ...} objects for
+every new clip until the client disconnects; a subscriber that falls
+SUBSCRIBER_QUEUE_SIZE clips behind loses the oldest ones.
+
+DaemonClient (clipboard_client) is a small blocking client used by the
+console saver and the GUI. The daemon needs AF_UNIX support from asyncio
+(Linux, macOS, BSD).
+"""
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import socket
+import time
+import typing
+from datetime import datetime
+
+import pyperclip
+
+from clipboard_client import DEFAULT_SEARCH_LIMIT, MAX_RESULTS, DaemonError, default_socket_path, encode_message, record_to_json
+from clipboard_filter import KEEP, ClipFilter
+from clipboard_fingerprint import Fingerprint, fingerprint, is_new_content
+from clipboard_history import iter_since, search_history, tail_history
+from clipboard_largeclip import ClipSpiller
+from clipboard_metrics import CHANGES, CHECKS, DETECT_SECONDS, record_error, trace_event
+from clipboard_scheduler import PollScheduler
+from clipboard_sources import ChangeSource, create_change_source
+from clipboard_store import CLIPBOARD, ClipRecord, is_sqlite_path, query_db
+from clipboard_writer import LogWriter
+
+RECENT_SIZE: int = 1000               # Newest clips kept in memory for `recent`
+SUBSCRIBER_QUEUE_SIZE: int = 1000     # Clips buffered per subscriber before the oldest are dropped
+WAIT_TIMEOUT: float = 1.0             # Seconds the monitor blocks in the source before re-checking state
+
+
+class ClipboardDaemon:
+    """
+    Monitors the clipboard and serves the history over a Unix socket.
+    serve() runs until stop() is called (from any thread).
+    """
+
+    def __init__(self, path: str,
+                 socket_path: typing.Optional[str] = None,
+                 source: typing.Optional[ChangeSource] = None,
+                 dedup: bool = False,
+                 recent_size: int = RECENT_SIZE,
+                 clip_filter: typing.Optional[ClipFilter] = None,
+                 selections: typing.Sequence[str] = (CLIPBOARD,),
+                 spiller: typing.Optional[ClipSpiller] = None):
+        self.path = path
+        self.socket_path = socket_path or default_socket_path()
+        self.scheduler = PollScheduler()
+        self.source = source
+        self.selections = selections  # Watched when the daemon creates its own source
+        self.clip_filter = clip_filter  # Redacts or drops sensitive clips before they are saved or published
+        self.spiller = spiller or ClipSpiller(path)  # Reads the clipboard; clips too large to hold go to blob files
+        self.writer = LogWriter(path, dedup=dedup)
+        self.recent: "collections.deque[ClipRecord]" = collections.deque(maxlen=recent_size)
+        self.last_fingerprints: typing.Dict[str, Fingerprint] = {}  # Per selection
+        self.paused: bool = False
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: typing.Optional[asyncio.Event] = None
+        self._resumed: typing.Optional[asyncio.Event] = None
+        self._subscribers: typing.Set["asyncio.Queue[ClipRecord]"] = set()
+        self._connections: typing.Set[asyncio.StreamWriter] = set()
+        # The source blocks, so it gets its own thread; queries use the loop's default executor
+        self._source_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ClipSource")
+
+        # Stats
+        self.started_at: float = time.time()
+        self.clips_saved: int = 0
+        self.clients: int = 0
+        self.requests: int = 0
+        self.subscriber_drops: int = 0
+        self.clips_filtered: int = 0
+
+    # --- Lifecycle ---
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        await self._claim_socket()
+        server = await asyncio.start_unix_server(self._handle_client, sock=self._bind_socket())
+        self.writer.start()
+        if self.source is None:
+            self.source = create_change_source(scheduler=self.scheduler, selections=self.selections,
+                                               read_func=self.spiller.paste)
+        await self._load_recent()
+        monitor = asyncio.create_task(self._monitor())
+        print(f"Clipboard daemon monitoring ({self.source.name}), saving to {self.path}, listening on {self.socket_path}")
+        try:
+            await self._stopping.wait()
+        finally:
+            server.close()
+            for connection in list(self._connections):
+                connection.close()  # wait_closed() waits for open connections, subscribers never leave on their own
+            await server.wait_closed()
+            monitor.cancel()
+            try:
+                await monitor
+            except asyncio.CancelledError:
+                pass
+            self.source.interrupt()  # Don't leave the source thread blocked for the rest of WAIT_TIMEOUT
+            self._source_executor.shutdown(wait=False)
+            self.writer.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            print("Clipboard daemon stopped.")
+
+    def stop(self) -> None:
+        """ Asks serve() to shut down. Safe to call from any thread. """
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def _bind_socket(self) -> socket.socket:
+        # Bind with a umask that leaves the socket 0600 from the start: chmod afterwards would let
+        # another local user connect in between (the fallback directory is the shared /tmp)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(umask)
+        return sock
+
+    async def _claim_socket(self) -> None:
+        """ Refuses to start if another daemon answers on the socket; removes a stale socket file. """
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.socket_path)  # Left behind by a daemon that was killed
+            return
+        writer.close()
+        raise DaemonError(f"A clipboard daemon is already running on {self.socket_path}")
+
+    async def _load_recent(self) -> None:
+        def load() -> typing.List[ClipRecord]:
+            if not os.path.exists(self.path):
+                return []
+            if is_sqlite_path(self.path):
+                return list(reversed(query_db(self.path, limit=self.recent.maxlen)))
+            return tail_history(self.path, self.recent.maxlen)
+        try:
+            self.recent.extend(await self._loop.run_in_executor(None, load))
+        except Exception as e:  # An unreadable history should not keep the monitor from starting
+            print(f"Could not preload recent clips from {self.path}: {e}")
+
+    # --- Monitor ---
+
+    async def _read_fingerprints(self) -> typing.Dict[str, Fingerprint]:
+        fingerprints = {}
+        for selection in self.source.selections:
+            try:
+                fingerprints[selection] = fingerprint(
+                    await self._loop.run_in_executor(self._source_executor, self.source.read, selection))
+            except Exception as e:
+                print(f"Error accessing clipboard: {e}")
+        return fingerprints
+
+    def _next_clip(self) -> typing.Optional[ClipRecord]:
+        """
+        Runs on the source thread: waits for a change, checks it and hands a
+        new clip to the writer. Keeping all blocking steps here means a busy
+        event loop (many clients) never delays ingestion.
+        """
+        current_content = self.source.wait_for_change(WAIT_TIMEOUT)
+        if current_content is None or self.paused:
+            return None
+        selection = self.source.selection  # Each selection is deduplicated on its own
+        checked = time.perf_counter()
+        changed = is_new_content(current_content, self.last_fingerprints.get(selection))
+        DETECT_SECONDS.observe(time.perf_counter() - checked)
+        CHECKS.inc()  # The polling source reports each tick to the scheduler itself
+        if not changed:
+            return None
+        self.last_fingerprints[selection] = fingerprint(current_content)
+        CHANGES.inc()
+        trace_event("detect", length=len(current_content), source=self.source.name, selection=selection)
+        result = self.spiller.filter(current_content, self.source.owner, self.clip_filter)
+        if result.action != KEEP:
+            self.clips_filtered += 1
+        if result.text is None:
+            return None
+        current_content = result.text
+        record = ClipRecord(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), current_content, selection)
+        if not self.writer.submit(record):
+            print(f"Writer queue full, dropped clip from [{record.timestamp}]")
+            return None
+        return record
+
+    async def _monitor(self) -> None:
+        self.last_fingerprints = await self._read_fingerprints()
+        while True:
+            if self.paused:
+                await self._resumed.wait()
+                # Whatever was copied while paused is not saved on resume
+                self.last_fingerprints = await self._read_fingerprints()
+                continue
+            try:
+                record = await self._loop.run_in_executor(self._source_executor, self._next_clip)
+            except pyperclip.PyperclipException as e:
+                print(f"Error accessing clipboard: {e}. Retrying...")
+                record_error(e)
+                await asyncio.sleep(self.scheduler.record_error())
+                continue
+            except Exception as e:
+                print(f"An unexpected error occurred during clipboard check: {e}. Retrying...")
+                record_error(e)
+                await asyncio.sleep(self.scheduler.record_error())
+                continue
+            if record is not None:
+                self.clips_saved += 1
+                self.recent.append(record)
+                self._publish(record)
+
+    def _publish(self, record: ClipRecord) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()  # Slow subscriber: drop its oldest clip
+                self.subscriber_drops += 1
+            subscriber.put_nowait(record)
+
+    # --- Requests ---
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        self._connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                self.requests += 1
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    command = request["cmd"]
+                    if command == "subscribe":
+                        writer.write(encode_message({"id": request_id, "ok": True, "result": "subscribed"}))
+                        await self._stream(reader, writer)
+                        return
+                    response = {"id": request_id, "ok": True, "result": await self._dispatch(command, request)}
+                except (ValueError, KeyError, TypeError, DaemonError) as e:
+                    response = {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(encode_message(response))
+                await writer.drain()
+        except (ConnectionError, ValueError):  # ValueError: request line over the stream limit
+            pass
+        finally:
+            self.clients -= 1
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queue: "asyncio.Queue[ClipRecord]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        disconnected = asyncio.create_task(reader.read())  # Completes when the client goes away
+        try:
+            await writer.drain()
+            while True:
+                next_clip = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({next_clip, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if next_clip not in done:
+                    next_clip.cancel()
+                    return
+                writer.write(encode_message({"event": "clip", **record_to_json(next_clip.result())}))
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+            disconnected.cancel()
+
+    async def _dispatch(self, command: str, request: typing.Dict[str, typing.Any]) -> typing.Any:
+        if command == "ping":
+            return "pong"
+        if command == "recent":
+            return await self._recent(min(int(request.get("n", 10)), MAX_RESULTS), request.get("since"))
+        if command == "search":
+            return await self._search(str(request["keyword"]), request.get("since"), request.get("until"),
+                                      bool(request.get("ignore_case", False)),
+                                      min(int(request.get("limit", DEFAULT_SEARCH_LIMIT)), MAX_RESULTS))
+        if command == "stats":
+            return self.stats()
+        if command == "pause":
+            self.paused = True
+            self._resumed.clear()
+            return self.stats()
+        if command == "resume":
+            self.paused = False
+            self._resumed.set()
+            return self.stats()
+        raise DaemonError(f"Unknown command {command!r}")
+
+    async def _recent(self, count: int, since: typing.Optional[str] = None) -> typing.List[typing.Dict[str, str]]:
+        """ The newest count clips, optionally only those at or after since. """
+        cache_complete = len(self.recent) < self.recent.maxlen  # Holds the whole history
+        if since is None:
+            from_memory = cache_complete or count <= len(self.recent)
+        else:
+            from_memory = cache_complete or bool(self.recent) and self.recent[0].timestamp < since
+        if from_memory:
+            # Served from memory; includes clips the writer has not flushed yet
+            records = [record for record in self.recent if since is None or record.timestamp >= since]
+            records = records[-count:] if count else []
+        elif is_sqlite_path(self.path):
+            records = list(reversed(await self._loop.run_in_executor(
+                None, lambda: query_db(self.path, start=since, limit=count))))
+        elif since is None:
+            records = await self._loop.run_in_executor(None, tail_history, self.path, count)
+        else:
+            records = await self._loop.run_in_executor(
+                None, lambda: list(collections.deque(iter_since(self.path, since), maxlen=count)))
+        return [record_to_json(record) for record in records]
+
+    async def _search(self, keyword: str, since: typing.Optional[str], until: typing.Optional[str],
+                      ignore_case: bool, limit: int) -> typing.List[typing.Dict[str, str]]:
+        def run() -> typing.List[ClipRecord]:
+            if not os.path.exists(self.path):
+                return []
+            if is_sqlite_path(self.path):
+                return list(reversed(query_db(self.path, keyword=keyword, start=since, end=until, limit=limit,
+                                                 ignore_case=ignore_case)))
+            found: typing.List[ClipRecord] = []
+            for record in search_history(self.path, keyword, since, until, ignore_case):
+                found.append(record)
+                if len(found) >= limit:
+                    break
+            return found
+        return [record_to_json(record) for record in await self._loop.run_in_executor(None, run)]
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "path": self.path,
+            "source": self.source.name if self.source else None,
+            "paused": self.paused,
+            "uptime": round(time.time() - self.started_at, 1),
+            "clips_saved": self.clips_saved,
+            "clients": self.clients,
+            "subscribers": len(self._subscribers),
+            "subscriber_drops": self.subscriber_drops,
+            "clips_filtered": self.clips_filtered,
+            "requests": self.requests,
+            "writer": self.writer.stats(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+def run_daemon(path: str, socket_path: typing.Optional[str] = None, dedup: bool = False,
+               clip_filter: typing.Optional[ClipFilter] = None,
+               selections: typing.Sequence[str] = (CLIPBOARD,),
+               spiller: typing.Optional[ClipSpiller] = None) -> int:
+    """ Runs a daemon in the foreground until Ctrl+C. Returns a process exit code. """
+    if not hasattr(socket, "AF_UNIX"):
+        print("Daemon mode needs Unix-domain sockets, which this platform does not provide.")
+        return 1
+    daemon = ClipboardDaemon(path, socket_path, dedup=dedup, clip_filter=clip_filter, selections=selections,
+                             spiller=spiller)
+    try:
+        asyncio.run(daemon.serve())
+    except DaemonError as e:
+        print(e)
+        return 1
+    except KeyboardInterrupt:
+        print("\nCtrl+C detected. Daemon stopped.")
+    return 0
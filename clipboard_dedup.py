@@ -0,0 +1,148 @@
+"""
+Content-addressed deduplication of the clipboard history.
+
+DedupStore wraps another ClipStore. The first time a payload is seen it is
+written in full; every later copy of the same payload is written as a small
+reference record (REF_PREFIX + digest) that only adds a timestamp. The
+DedupIndex of known digests is loaded from the existing history when the
+store is opened. A rotated text log is deduplicated per file: the index
+covers the active file only and starts empty when the log rotates, so
+retention can delete any segment without leaving references to it.
+
+Run this module with a log path to print dedup statistics:
+    python clipboard_dedup.py clipboard_log.txt
+"""
+import sqlite3
+import sys
+import typing
+
+from clipboard_fingerprint import content_digest
+from clipboard_rotation import RotatingTextLogStore, iter_history, open_segment
+from clipboard_store import ClipRecord, ClipStore, is_encrypted_path, is_sqlite_path, iter_records, make_ref, \
+    parse_ref
+
+
+class DedupIndex:
+    """ In-memory map of payload digest -> [payload size in bytes, times copied]. """
+
+    def __init__(self):
+        self._entries: typing.Dict[str, typing.List[int]] = {}
+        self.references: int = 0  # Records written as references
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def add_payload(self, digest: str, size: int) -> bool:
+        """ Registers a copy of a payload. Returns True if it was new. """
+        entry = self._entries.get(digest)
+        if entry is None:
+            self._entries[digest] = [size, 1]
+            return True
+        entry[1] += 1
+        self.references += 1
+        return False
+
+    def add_reference(self, digest: str) -> None:
+        entry = self._entries.get(digest)
+        if entry is not None:
+            entry[1] += 1
+        self.references += 1
+
+    def stats(self) -> typing.Dict[str, float]:
+        stored = sum(size for size, _ in self._entries.values())
+        logical = sum(size * count for size, count in self._entries.values())
+        records = sum(count for _, count in self._entries.values())
+        return {
+            "records": records,
+            "distinct_payloads": len(self._entries),
+            "references": self.references,
+            "bytes_logical": logical,
+            "bytes_stored": stored,
+            "bytes_saved": logical - stored,
+            "dedup_ratio": logical / stored if stored else 1.0,
+        }
+
+
+def _payload_size(text: str) -> int:
+    return len(text.encode('utf-8', 'surrogatepass'))
+
+
+def _iter_file(path: str) -> typing.Iterator[ClipRecord]:
+    if is_encrypted_path(path):  # Not rotated
+        yield from iter_history(path)
+        return
+    with open_segment(path) as file:
+        yield from iter_records(file)
+
+
+def load_index(path: str) -> DedupIndex:
+    """
+    Builds the index from an existing history (SQLite, or the active text log
+    without its rotated segments). Missing files give an empty index.
+    """
+    index = DedupIndex()
+    try:
+        if is_sqlite_path(path):
+            db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                for content, digest in db.execute("SELECT content, digest FROM clips ORDER BY id"):
+                    if parse_ref(content):
+                        index.add_reference(digest)
+                    else:
+                        index.add_payload(digest or content_digest(content), _payload_size(content))
+            finally:
+                db.close()
+        else:
+            for record in _iter_file(path):
+                ref = parse_ref(record.content)
+                if ref:
+                    index.add_reference(ref)  # Counted only: an original left in an older segment is not reused
+                else:
+                    index.add_payload(content_digest(record.content), _payload_size(record.content))
+    except (FileNotFoundError, sqlite3.OperationalError):
+        pass  # Nothing saved yet
+    return index
+
+
+class DedupStore(ClipStore):
+    """ ClipStore wrapper that writes repeated payloads as digest references. """
+
+    def __init__(self, inner: ClipStore, index: typing.Optional[DedupIndex] = None):
+        super().__init__(inner.path)
+        self.inner = inner
+        self.index = index if index is not None else load_index(inner.path)
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        if isinstance(self.inner, RotatingTextLogStore) and self.inner.rotate_if_due():
+            self.index = DedupIndex()  # The new file holds its own originals
+        out: typing.List[ClipRecord] = []
+        for record in records:
+            digest = content_digest(record.content)
+            if self.index.add_payload(digest, _payload_size(record.content)):
+                out.append(record)
+            else:
+                out.append(record._replace(content=make_ref(digest)))
+        self.inner.write_batch(out)
+
+    def sync(self, durable: bool = False) -> None:
+        self.inner.sync(durable)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def stats(self) -> typing.Dict[str, float]:
+        return self.index.stats()
+
+
+def format_stats(stats: typing.Dict[str, float]) -> str:
+    return (f"{stats['records']} records, {stats['distinct_payloads']} distinct payloads, "
+            f"{stats['references']} references\n"
+            f"{stats['bytes_logical']} bytes copied, {stats['bytes_stored']} bytes stored, "
+            f"{stats['bytes_saved']} bytes saved (dedup ratio {stats['dedup_ratio']:.2f}x)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python clipboard_dedup.py <history file>")
+        sys.exit(2)
+    print(format_stats(load_index(sys.argv[1]).stats()))
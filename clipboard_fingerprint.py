@@ -0,0 +1,60 @@
+"""
+Cheap change detection for clipboard text.
+
+The monitors used to keep the whole previous clipboard string around and
+compare it against every new read. A Fingerprint holds only the length and
+a digest of the text, so a multi-megabyte copy is not kept alive between
+polls, and is_blank() answers the "whitespace only?" question without the
+copy that str.strip() makes. content_digest() is the stable counterpart
+used where a hash has to survive a restart (deduplicated history). Clips
+too large to read into memory (clipboard_largeclip.LargeClip) are not
+strings; they carry a fingerprint taken while they were streamed.
+"""
+import hashlib
+import typing
+
+DIGEST_SIZE: int = 16  # Bytes, blake2b-128
+
+
+class Fingerprint(typing.NamedTuple):
+    length: int
+    digest: int
+
+
+def fingerprint(text: str) -> Fingerprint:
+    """
+    Returns a fixed-size fingerprint of text.
+
+    Uses the interpreter's string hash: it runs over the string's own buffer
+    (no encoding copy) and is cached on the object. It is randomised per
+    process, which is fine for in-memory change detection; do not persist it.
+    """
+    if not isinstance(text, str):
+        return text.fingerprint  # A LargeClip, digested as it was read
+    return Fingerprint(len(text), hash(text))
+
+
+def is_blank(text: str) -> bool:
+    """ True for empty or whitespace-only text. Same rule as text.strip() == "", without the copy. """
+    return not text or text.isspace()
+
+
+def is_new_content(text: typing.Any, last: typing.Optional[Fingerprint]) -> bool:
+    """ True if text is non-blank clipboard text (or a LargeClip) that differs from the last saved fingerprint. """
+    if not isinstance(text, str):
+        return getattr(text, "fingerprint", last) != last
+    if is_blank(text):
+        return False
+    if last is None or len(text) != last.length:
+        return True  # Length differs, no need to hash to know it changed
+    return hash(text) != last.digest
+
+
+def content_digest(text: str) -> str:
+    """ Stable hex digest of text (blake2b-128 over UTF-8), safe to persist. """
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def bytes_digest(data: typing.Union[bytes, bytearray, memoryview]) -> str:
+    """ Like content_digest() for binary payloads. Hashes any buffer in place, without copying it. """
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
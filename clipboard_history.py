@@ -0,0 +1,356 @@
+"""
+Streaming reader for the text log.
+
+HistoryLog maps the log file with mmap and walks it record by record, so
+memory use stays flat no matter how large the file is. Records start at a
+line beginning with "[%Y-%m-%d %H:%M:%S] ", which lets the reader:
+
+* find the first record at or after a timestamp with a binary search over
+  byte offsets (the log is appended in time order),
+* read the last N records by scanning backwards from the end,
+* search for a keyword by jumping between raw byte matches (and
+  references) instead of decoding every record.
+
+Deduplicated references are resolved with find_original(), which walks
+back from the reference hashing raw record bodies, so memory stays flat
+with deduplication on too. The offsets of recently resolved originals are
+kept in a small LRU cache, since the same clip tends to repeat in bursts.
+"""
+import collections
+import mmap
+import os
+import re
+import threading
+import typing
+from datetime import datetime, timedelta
+
+from clipboard_fingerprint import bytes_digest, content_digest
+from clipboard_rotation import Segment, iter_history, list_segments, open_segment
+from clipboard_store import REF_PREFIX, SELECTION_PREFIX, ClipRecord, is_encrypted_path, iter_records, make_record, \
+    parse_ref
+
+TIMESTAMP_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+ORIGINAL_CACHE_SIZE: int = 256  # Digest -> original offset entries kept per open log
+_HEADER_RE = re.compile(rb"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ")
+_HEADER_LEN: int = 22  # len("[YYYY-mm-dd HH:MM:SS] ")
+_REF_PREFIX_BYTES: bytes = REF_PREFIX.encode("ascii")
+_SELECTION_PREFIX_BYTES: bytes = SELECTION_PREFIX.encode("ascii")
+_SELECTION_RE = re.compile(re.escape(_SELECTION_PREFIX_BYTES) + rb"[a-z]+ ")
+
+
+def parse_time(value: str, now: typing.Optional[datetime] = None) -> str:
+    """
+    Turns "90s", "15m", "1h", "2d" (relative to now) or an absolute
+    "YYYY-mm-dd[ HH:MM[:SS]]" into a log timestamp string.
+    """
+    now = now or datetime.now()
+    units = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip())
+    if match:
+        return (now - timedelta(**{units[match.group(2)]: int(match.group(1))})).strftime(TIMESTAMP_FORMAT)
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).strftime(TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {value!r} (use e.g. 1h, 30m, 2d or 'YYYY-mm-dd HH:MM:SS')")
+
+
+class HistoryLog:
+    """ Read-only, memory-mapped view of one uncompressed text log. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._originals: "collections.OrderedDict[str, int]" = collections.OrderedDict()  # LRU, digest -> offset
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "HistoryLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- Record boundaries ---
+
+    def _is_header(self, offset: int) -> bool:
+        return (offset == 0 or self._mm[offset - 1:offset] == b"\n") and \
+            _HEADER_RE.match(self._mm, offset) is not None
+
+    def next_record_start(self, offset: int) -> int:
+        """ Offset of the first record header at or after offset, or self.size. """
+        if self._mm is None:
+            return 0
+        if offset <= 0 and self._is_header(0):
+            return 0
+        pos = max(offset - 1, 0)
+        while True:
+            pos = self._mm.find(b"\n[", pos)
+            if pos == -1:
+                return self.size
+            if _HEADER_RE.match(self._mm, pos + 1):
+                return pos + 1
+            pos += 1
+
+    def prev_record_start(self, offset: int) -> int:
+        """ Offset of the last record header strictly before offset, or -1. """
+        if self._mm is None:
+            return -1
+        end = offset
+        while end > 1:
+            pos = self._mm.rfind(b"\n[", 0, end)
+            if pos == -1:
+                break
+            if _HEADER_RE.match(self._mm, pos + 1):
+                return pos + 1
+            end = pos + 1
+        return 0 if offset > 0 and self._is_header(0) else -1
+
+    def _find(self, needle: bytes, start: int) -> int:
+        """ Offset of the next occurrence of needle at or after start, or self.size. """
+        pos = self._mm.find(needle, start)
+        return self.size if pos == -1 else pos
+
+    def raw(self, start: int, end: int) -> bytes:
+        """ The undecoded bytes in [start, end). """
+        return self._mm[start:end] if self._mm is not None else b""
+
+    def timestamp_at(self, offset: int) -> str:
+        return self._mm[offset + 1:offset + _HEADER_LEN - 2].decode("ascii")
+
+    def seek_time(self, timestamp: str) -> int:
+        """ Binary search: offset of the first record with a timestamp >= timestamp. """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.next_record_start(mid)
+            if start >= self.size or self.timestamp_at(start) >= timestamp:
+                hi = mid
+            else:
+                lo = start + 1
+        return self.next_record_start(lo)
+
+    # --- Reading ---
+
+    def record_at(self, offset: int, resolve: bool = True) -> typing.Tuple[ClipRecord, int]:
+        """
+        Parses the record starting at offset. Returns it and the offset of the
+        next record. With resolve=False a reference comes back as it is stored.
+        """
+        end = self.next_record_start(offset + _HEADER_LEN)
+        body = self._mm[offset + _HEADER_LEN:end]
+        if body.endswith(b"\n"):
+            body = body[:-1]
+        record = make_record(self.timestamp_at(offset), body.decode("utf-8", "replace"))
+        return (self._resolve(record, offset) if resolve else record), end
+
+    def iter_from(self, offset: int = 0, until: typing.Optional[str] = None) -> typing.Iterator[ClipRecord]:
+        """ Yields records from offset onwards, stopping after the last record <= until. """
+        pos = self.next_record_start(offset)
+        while pos < self.size:
+            if until is not None and self.timestamp_at(pos) > until:
+                return
+            record, pos = self.record_at(pos)
+            yield record
+
+    def tail(self, count: int) -> typing.Iterator[ClipRecord]:
+        """ Yields the last count records, oldest first. """
+        pos = self.size
+        for _ in range(count):
+            previous = self.prev_record_start(pos)
+            if previous < 0:
+                break
+            pos = previous
+        yield from self.iter_from(pos)
+
+    def search(self, keyword: str, since: typing.Optional[str] = None, until: typing.Optional[str] = None,
+               ignore_case: bool = False) -> typing.Iterator[ClipRecord]:
+        """ Yields records containing keyword within [since, until]; references match by their original. """
+        start = self.seek_time(since) if since else 0
+        if ignore_case or self._mm is None:
+            needle = keyword.lower()
+            for record in self.iter_from(start, until):
+                if needle in (record.content.lower() if ignore_case else record.content):
+                    yield record
+            return
+        needle_bytes = keyword.encode("utf-8")
+        pos = start
+        hit = ref = -1
+        while pos < self.size:
+            # Jump to the next raw hit or the next reference, which only holds a digest and is resolved to test it
+            if hit < pos:
+                hit = self._find(needle_bytes, pos)
+            if ref < pos:
+                ref = self._find(_REF_PREFIX_BYTES, pos)
+            first = min(hit, ref)
+            if first >= self.size:
+                return
+            record_start = self.prev_record_start(first + 1)
+            if record_start < pos:
+                record_start = pos
+            if until is not None and self.timestamp_at(record_start) > until:
+                return
+            record, pos = self.record_at(record_start)
+            if keyword in record.content:  # Hit could be inside a header
+                yield record
+
+    # --- Dedup references ---
+
+    def _resolve(self, record: ClipRecord, offset: int) -> ClipRecord:
+        digest = parse_ref(record.content)
+        if digest is None:
+            return record
+        original = self._originals.get(digest)
+        if original is None:
+            original = self.find_original(digest, offset)
+            if len(self._originals) >= ORIGINAL_CACHE_SIZE:
+                self._originals.popitem(last=False)
+            self._originals[digest] = original
+        else:
+            self._originals.move_to_end(digest)
+        if original < 0:
+            return record  # Original is in an older segment (logs deduplicated across files before rotation reset it)
+        original_record, _ = self.record_at(original, resolve=False)
+        return record._replace(content=original_record.content)
+
+    def find_original(self, digest: str, before: int, cancel: typing.Optional[threading.Event] = None) -> int:
+        """
+        Offset of the last record before offset `before` (a record start) that
+        holds the payload digest names, or -1 if there is none or cancel was set.
+        Walks backwards hashing the raw bodies, so memory stays flat whatever the
+        log size; a miss reads everything before `before`.
+        """
+        end = min(before, self.size)
+        while end > 0:
+            if cancel is not None and cancel.is_set():
+                return -1
+            pos = self.prev_record_start(end)
+            if pos < 0:
+                return -1
+            body = self._mm[pos + _HEADER_LEN:end]
+            if body.endswith(b"\n"):
+                body = body[:-1]
+            tag = _SELECTION_RE.match(body) if body.startswith(_SELECTION_PREFIX_BYTES) else None
+            content = body[tag.end():] if tag else body
+            # The log holds the payload's UTF-8 (surrogatepass) bytes, which is what content_digest() hashes
+            if not content.startswith(_REF_PREFIX_BYTES) and bytes_digest(content) == digest:
+                return pos
+            end = pos
+        return -1
+
+
+def _segments_since(path: str, since: typing.Optional[str]) -> typing.List[Segment]:
+    # A segment's name is the time it was closed, so segments closed before `since` are skipped unopened
+    segments = list_segments(path)
+    if since is not None:
+        stamp = datetime.strptime(since, TIMESTAMP_FORMAT).strftime("%Y%m%d-%H%M%S")
+        segments = [segment for segment in segments if segment.stamp >= stamp]
+    return segments
+
+
+def _in_range(records: typing.Iterable[ClipRecord], since: typing.Optional[str],
+              until: typing.Optional[str]) -> typing.Iterator[ClipRecord]:
+    for record in records:
+        if since is not None and record.timestamp < since:
+            continue
+        if until is not None and record.timestamp > until:
+            return
+        yield record
+
+
+def _iter_segments(path: str, since: typing.Optional[str],
+                   until: typing.Optional[str]) -> typing.Iterator[ClipRecord]:
+    for segment in _segments_since(path, since):
+        try:
+            with open_segment(segment.path) as file:
+                yield from _in_range(iter_records(file), since, until)
+        except FileNotFoundError:
+            continue  # Removed by retention meanwhile
+
+
+def _matching(records: typing.Iterable[ClipRecord], keyword: str, ignore_case: bool) -> typing.Iterator[ClipRecord]:
+    """
+    Records containing keyword, from records read from the start of one file.
+    A reference matches when its original did: with deduplication the
+    original is the first record of that payload in the same file (see
+    clipboard_dedup). Keeps the matching originals' content until the file ends.
+    """
+    needle = keyword.lower() if ignore_case else keyword
+    matched: typing.Dict[str, str] = {}  # Digest -> content of the matching originals seen so far
+    for record in records:
+        digest = parse_ref(record.content)
+        if digest is not None:
+            if digest in matched:
+                yield record._replace(content=matched[digest])
+        elif needle in (record.content.lower() if ignore_case else record.content):
+            matched.setdefault(content_digest(record.content), record.content)
+            yield record
+
+
+def iter_since(path: str, since: typing.Optional[str] = None,
+               until: typing.Optional[str] = None) -> typing.Iterator[ClipRecord]:
+    """
+    Streams records in [since, until] across rotated segments and the active log.
+    References inside compressed segments and encrypted logs are returned unresolved.
+    """
+    if is_encrypted_path(path):  # No byte offsets to search: decrypt and filter
+        for record in iter_history(path):
+            if until is not None and record.timestamp > until:
+                return
+            if since is None or record.timestamp >= since:
+                yield record
+        return
+    yield from _iter_segments(path, since, until)
+    if os.path.exists(path):
+        with HistoryLog(path) as log:
+            yield from log.iter_from(log.seek_time(since) if since else 0, until)
+
+
+def tail_history(path: str, count: int) -> typing.List[ClipRecord]:
+    """ The last count records, oldest first, reaching into rotated segments if the active log is short. """
+    if is_encrypted_path(path):
+        return list(collections.deque(iter_history(path), maxlen=count))
+    records: typing.List[ClipRecord] = []
+    if os.path.exists(path):
+        with HistoryLog(path) as log:
+            records = list(log.tail(count))
+    for segment in reversed(list_segments(path)):
+        if len(records) >= count:
+            break
+        newest: "collections.deque[ClipRecord]" = collections.deque(maxlen=count - len(records))
+        try:
+            with open_segment(segment.path) as file:
+                newest.extend(iter_records(file))
+        except FileNotFoundError:
+            continue
+        records = list(newest) + records
+    return records
+
+
+def search_history(path: str, keyword: str, since: typing.Optional[str] = None,
+                   until: typing.Optional[str] = None, ignore_case: bool = False) -> typing.Iterator[ClipRecord]:
+    """
+    Streams records containing keyword, across rotated segments and the active
+    log. Deduplicated repeats are resolved and matched like their original,
+    with or without ignore_case.
+    """
+    if is_encrypted_path(path):
+        yield from _in_range(_matching(iter_history(path), keyword, ignore_case), since, until)
+        return
+    for segment in _segments_since(path, since):
+        try:
+            with open_segment(segment.path) as file:
+                # Read from the segment's start: a repeat after `since` may refer to an original before it
+                yield from _in_range(_matching(iter_records(file), keyword, ignore_case), since, until)
+        except FileNotFoundError:
+            continue
+    if os.path.exists(path):
+        with HistoryLog(path) as log:
+            yield from log.search(keyword, since, until, ignore_case)
@@ -0,0 +1,562 @@
+"""
+Virtualized history browser for the GUI.
+
+HistoryModel is a QAbstractListModel over the text log, newest clip first.
+It never reads the whole file: rows are discovered a page at a time by
+walking record headers backwards from the end of the memory-mapped log
+(canFetchMore/fetchMore), and a row only stores the byte offset of its
+record. Display text is decoded on demand and kept in a small LRU cache.
+
+Deduplicated repeats are stored as a digest reference. A repeat is shown
+as a placeholder row until a background thread has found its original by
+walking the log backwards from it (HistoryLog.find_original); found
+originals are kept in an LRU cache the size of the preview cache, so
+memory grows with the rows looked at rather than with the log.
+
+Filtering runs on a background thread that scans the log backwards and
+hands matching offsets to the model a page at a time. The thread pauses
+after each page until the view asks for more, so a broad filter does not
+pile up millions of offsets, and typing never blocks the GUI. A filter
+lists the first copy of a repeated clip, not its repeats.
+
+Only the active text log is listed. For SQLite and encrypted logs, and for
+clips in rotated segments, the panel says so and points to the console
+saver's tail/search commands instead of showing a short or empty list.
+"""
+import collections
+import os
+import queue
+import threading
+import time
+import typing
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
+
+from clipboard_blobs import BlobStore, blob_dir_for
+from clipboard_history import HistoryLog
+from clipboard_rotation import list_segments
+from clipboard_store import (CLIPBOARD, ClipRecord, is_encrypted_path, is_sqlite_path, parse_blob_ref, parse_ref,
+                             unescape_content)
+
+PAGE_SIZE: int = 200             # Rows loaded per fetchMore()
+PREVIEW_CACHE_SIZE: int = 1024   # Decoded row previews kept in memory
+PREVIEW_LENGTH: int = 120        # Characters shown per row
+FILTER_DELAY_MS: int = 200       # Debounce between keystrokes and starting a search
+REFRESH_DELAY_MS: int = 300      # Debounce between log file changes and picking up new rows
+SEARCH_CHUNK_SIZE: int = 1024 * 1024  # Bytes of log scanned per step by the filter search
+PARTIAL_PAGE_DELAY: float = 0.25      # Seconds before a part-filled page of matches is shown
+REPEAT_PLACEHOLDER: str = "(repeat of an earlier clip, looking it up...)"
+MISSING_ORIGINAL: str = "(repeat of a clip that is no longer in this log)"
+DEFAULT_HINT: str = "Double-click an entry to copy it to the clipboard."
+
+
+def _iter_matches_backwards(log: HistoryLog, end: int, needle: str,
+                            cancel: threading.Event) -> typing.Iterator[int]:
+    """
+    Yields the offsets of records before end whose content contains needle
+    (already lower-cased), newest first. ASCII needles are matched on raw
+    bytes a chunk at a time; only records with a hit are decoded.
+    """
+    if not needle.isascii():
+        pos = end
+        while not cancel.is_set():
+            pos = log.prev_record_start(pos)
+            if pos < 0:
+                return
+            content = log.record_at(pos, resolve=False)[0].content
+            if parse_ref(content) is None and needle in content.lower():
+                yield pos
+        return
+    needle_bytes = needle.encode("ascii")
+    while end > 0 and not cancel.is_set():
+        start = log.next_record_start(max(end - SEARCH_CHUNK_SIZE, 0))
+        if start >= end:
+            start = max(log.prev_record_start(end), 0)  # A single record larger than the chunk
+        chunk = log.raw(start, end).lower()
+        hit_end = len(chunk)
+        while True:
+            hit = chunk.rfind(needle_bytes, 0, hit_end)
+            if hit == -1:
+                break
+            record_start = max(log.prev_record_start(start + hit + 1), start)
+            content = log.record_at(record_start, resolve=False)[0].content
+            if parse_ref(content) is None and needle in content.lower():  # Hit could be inside a header
+                yield record_start
+            hit_end = record_start - start
+        end = start
+
+
+class HistoryModel(QtCore.QAbstractListModel):
+    """ Lazily loaded, newest-first list of the records in a text log. """
+    matches_found = pyqtSignal(int, list)  # (search generation, offsets) from the search thread
+    search_finished = pyqtSignal(int)
+    original_found = pyqtSignal(int, str, int)  # (file generation, digest, offset or -1) from the lookup thread
+    repeats_resolved = pyqtSignal()             # Rows showing a repeat may now show its original
+
+    def __init__(self, path: str, parent=None):
+        super().__init__(parent)
+        self._path = path
+        self._log: typing.Optional[HistoryLog] = None
+        self._offsets: typing.List[int] = []   # Record offsets, newest first
+        self._cursor: int = 0                  # Start of the oldest record loaded so far
+        self._exhausted: bool = True
+        self._filter: str = ""
+        self._generation: int = 0              # Bumped on every filter change to drop stale results
+        self._searching: bool = False
+        self._page_pending: bool = False       # A page of matches was requested from the search thread
+        self._cancel = threading.Event()
+        self._permits = threading.Semaphore(0)  # One permit per page the search thread may deliver
+        self._cache: "collections.OrderedDict[int, str]" = collections.OrderedDict()
+        self._originals: "collections.OrderedDict[str, int]" = collections.OrderedDict()  # Digest -> offset, -1: gone
+        self._lookups: typing.Optional["queue.Queue[typing.Optional[typing.Tuple[str, int]]]"] = None
+        self._lookups_pending: typing.Set[str] = set()  # Digests queued for the lookup thread
+        self._lookups_cancel = threading.Event()
+        self._file_generation: int = 0  # Bumped whenever offsets start referring to a new mapping of the file
+        self.matches_found.connect(self._on_matches_found)
+        self.search_finished.connect(self._on_search_finished)
+        self.original_found.connect(self._on_original_found)
+        self._open()
+
+    # --- Source file ---
+
+    def _open(self) -> None:
+        self._close_log()
+        self._offsets = []
+        self._cache.clear()
+        self._reset_lookups()
+        if is_sqlite_path(self._path) or is_encrypted_path(self._path) or not os.path.exists(self._path):
+            self._exhausted = True
+            return
+        self._log = HistoryLog(self._path)
+        self._cursor = self._log.size
+        self._exhausted = self._log.size == 0
+
+    def _close_log(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def close(self) -> None:
+        """ Stops any search and unmaps the log (e.g. when the panel is hidden). """
+        self._cancel.set()
+        self.beginResetModel()
+        self._reset_lookups()
+        self._close_log()
+        self._offsets = []
+        self._exhausted = True
+        self.endResetModel()
+
+    def set_path(self, path: str) -> None:
+        self._path = path
+        self.reload()
+
+    def unsupported_reason(self) -> typing.Optional[str]:
+        """ Why this log cannot be listed, or None for a text log. """
+        if is_sqlite_path(self._path):
+            return "SQLite histories are not listed here."
+        if is_encrypted_path(self._path):
+            return "Encrypted logs are not listed here."
+        return None
+
+    def rotated_segments(self) -> int:
+        """ Number of rotated segments next to the log; their clips are not listed. """
+        return 0 if self.unsupported_reason() else len(list_segments(self._path))
+
+    def reload(self) -> None:
+        """ Re-reads the log from the end, keeping the current filter. """
+        self._cancel.set()
+        self.beginResetModel()
+        self._open()
+        self.endResetModel()
+        if self._filter:
+            self._start_search()
+
+    def check_for_new(self) -> None:
+        """ Adds records appended since the log was opened to the top of the list. """
+        if self._filter or self._log is None:
+            self.reload()
+            return
+        old_size = self._log.size
+        if not os.path.exists(self._path) or os.path.getsize(self._path) < old_size:
+            self.reload()  # Rotated or replaced
+            return
+        self._close_log()  # Keeps the loaded offsets: the file was only appended to
+        self._log = HistoryLog(self._path)
+        new_offsets = []
+        pos = self._log.next_record_start(old_size)
+        while pos < self._log.size:
+            new_offsets.append(pos)
+            pos = self._log.next_record_start(pos + 1)
+        if new_offsets:
+            self.beginInsertRows(QtCore.QModelIndex(), 0, len(new_offsets) - 1)
+            self._offsets[:0] = reversed(new_offsets)
+            self.endInsertRows()
+
+    # --- Qt model interface ---
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._offsets)
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or self._log is None:
+            return None
+        offset = self._offsets[index.row()]
+        if role == Qt.DisplayRole:
+            return self._preview(offset)
+        if role == Qt.ToolTipRole:
+            record = self.record_at(index.row())
+            return REPEAT_PLACEHOLDER if record is None else unescape_content(record.content)[:1000]
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+        if self._filter:
+            return self._searching and not self._page_pending
+        return not self._exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()) -> None:
+        if self._log is None:
+            return
+        if self._filter:
+            if self._searching and not self._page_pending:
+                self._page_pending = True
+                self._permits.release()  # Let the search thread deliver one more page
+            return
+        page = []
+        pos = self._cursor
+        while len(page) < PAGE_SIZE:
+            pos = self._log.prev_record_start(pos)
+            if pos < 0:
+                self._exhausted = True
+                break
+            page.append(pos)
+            self._cursor = pos
+        if page:
+            first = len(self._offsets)
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+            self._offsets.extend(page)
+            self.endInsertRows()
+
+    # --- Records ---
+
+    def record_at(self, row: int) -> typing.Optional[ClipRecord]:
+        """ The record in row with a repeat resolved, or None while its original is being looked up. """
+        offset = self._offsets[row]
+        record, _ = self._log.record_at(offset, resolve=False)
+        digest = parse_ref(record.content)
+        if digest is None:
+            return record
+        original = self._original_of(digest, offset)
+        if original is None:
+            return None
+        if original < 0:
+            return record  # Original no longer in this file: the reference as stored
+        return record._replace(content=self._log.record_at(original, resolve=False)[0].content)
+
+    def _preview(self, offset: int) -> str:
+        preview = self._cache.get(offset)
+        if preview is not None:
+            self._cache.move_to_end(offset)
+            return preview
+        record, _ = self._log.record_at(offset, resolve=False)
+        digest = parse_ref(record.content)
+        content = record.content
+        if digest is not None:
+            original = self._original_of(digest, offset)
+            if original is None:
+                return self._format_preview(record.timestamp, record.selection, REPEAT_PLACEHOLDER)  # Not cached
+            content = self._log.record_at(original, resolve=False)[0].content if original >= 0 else MISSING_ORIGINAL
+        preview = self._format_preview(record.timestamp, record.selection, content)
+        self._cache[offset] = preview
+        if len(self._cache) > PREVIEW_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return preview
+
+    @staticmethod
+    def _format_preview(timestamp: str, selection: str, content: str) -> str:
+        blob = parse_blob_ref(content)
+        content = unescape_content(content)
+        text = f"<{blob[0]}>" if blob else content[:PREVIEW_LENGTH].replace("\n", " ")
+        tag = "" if selection == CLIPBOARD else f"({selection}) "
+        return f"[{timestamp}] {tag}{text}{'...' if len(content) > PREVIEW_LENGTH else ''}"
+
+    # --- Repeats ---
+
+    def _original_of(self, digest: str, offset: int) -> typing.Optional[int]:
+        """ Offset of a repeat's original (-1: not in this file), or None after queueing a lookup. """
+        original = self._originals.get(digest)
+        if original is not None:
+            self._originals.move_to_end(digest)
+            return original
+        if digest not in self._lookups_pending:
+            if self._lookups is None:
+                self._lookups = queue.Queue()
+                self._lookups_cancel = threading.Event()
+                threading.Thread(target=self._look_up, name="HistoryLookup", daemon=True,
+                                 args=(self._path, self._file_generation, self._lookups, self._lookups_cancel)).start()
+            self._lookups_pending.add(digest)
+            self._lookups.put((digest, offset))
+        return None
+
+    def _reset_lookups(self) -> None:
+        """ Forgets originals found in the previous mapping and stops its lookup thread. """
+        self._file_generation += 1
+        if self._lookups is not None:
+            self._lookups_cancel.set()  # Also ends a lookup in progress
+            self._lookups.put(None)
+            self._lookups = None
+        self._lookups_pending.clear()
+        self._originals.clear()
+
+    def _look_up(self, path: str, generation: int, lookups: "queue.Queue[typing.Optional[typing.Tuple[str, int]]]",
+                 cancel: threading.Event) -> None:
+        """ Runs on the lookup thread, with its own mapping of the log, until _reset_lookups() stops it. """
+        log: typing.Optional[HistoryLog] = None
+        try:
+            while True:
+                request = lookups.get()
+                if request is None or cancel.is_set():
+                    return
+                digest, offset = request
+                if log is None or offset > log.size:  # Appended since the mapping was made
+                    if log is not None:
+                        log.close()
+                    log = HistoryLog(path)
+                original = log.find_original(digest, offset, cancel)
+                if not cancel.is_set():
+                    self.original_found.emit(generation, digest, original)
+        except (OSError, ValueError):
+            pass  # File rotated away; the next reload starts over
+        finally:
+            if log is not None:
+                log.close()
+
+    @pyqtSlot(int, str, int)
+    def _on_original_found(self, generation: int, digest: str, offset: int) -> None:
+        if generation != self._file_generation:
+            return
+        self._lookups_pending.discard(digest)
+        self._originals[digest] = offset
+        if len(self._originals) > PREVIEW_CACHE_SIZE:
+            self._originals.popitem(last=False)
+        if self._offsets:
+            # Rows of that repeat are not tracked; the view only repaints the visible ones
+            self.dataChanged.emit(self.index(0), self.index(len(self._offsets) - 1))
+        self.repeats_resolved.emit()
+
+    # --- Filtering ---
+
+    def is_searching(self) -> bool:
+        return self._searching
+
+    def set_filter(self, text: str) -> None:
+        self._filter = text
+        if self._log is None:
+            self._open()
+        self._cancel.set()
+        self.beginResetModel()
+        self._offsets = []
+        self._cache.clear()
+        self._cursor = self._log.size if self._log else 0
+        self._exhausted = self._log is None or self._log.size == 0
+        self.endResetModel()
+        if text:
+            self._start_search()
+
+    def _start_search(self) -> None:
+        if self._log is None:
+            return
+        self._generation += 1
+        self._cancel = threading.Event()
+        self._permits = threading.Semaphore(1)  # First page right away
+        self._page_pending = True
+        self._searching = True
+        thread = threading.Thread(target=self._search, name="HistorySearch", daemon=True,
+                                  args=(self._path, self._log.size, self._filter, self._generation,
+                                        self._cancel, self._permits))
+        thread.start()
+
+    def _search(self, path: str, size: int, needle: str, generation: int,
+                cancel: threading.Event, permits: threading.Semaphore) -> None:
+        """ Runs on the search thread: scans backwards, newest first, with its own mapping of the log. """
+        page: typing.List[int] = []
+        page_started = 0.0
+        try:
+            with HistoryLog(path) as log:
+                for offset in _iter_matches_backwards(log, min(size, log.size), needle.lower(), cancel):
+                    if not page:
+                        # Wait until the view wants another page
+                        while not permits.acquire(timeout=0.1):
+                            if cancel.is_set():
+                                return
+                        page_started = time.monotonic()
+                    page.append(offset)
+                    # Hand over full pages, or what was found so far if matches are sparse
+                    if len(page) >= PAGE_SIZE or time.monotonic() - page_started >= PARTIAL_PAGE_DELAY:
+                        self.matches_found.emit(generation, page)
+                        page = []
+        except (OSError, ValueError):
+            pass  # File rotated away mid-search; the next reload starts over
+        if page and not cancel.is_set():
+            self.matches_found.emit(generation, page)
+        self.search_finished.emit(generation)
+
+    @pyqtSlot(int, list)
+    def _on_matches_found(self, generation: int, offsets: list) -> None:
+        if generation != self._generation or self._log is None:
+            return
+        self._page_pending = False
+        first = len(self._offsets)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(offsets) - 1)
+        self._offsets.extend(offsets)
+        self.endInsertRows()
+
+    @pyqtSlot(int)
+    def _on_search_finished(self, generation: int) -> None:
+        if generation == self._generation:
+            self._searching = False
+
+
+class HistoryPanel(QtWidgets.QWidget):
+    """ Window listing saved clips with an incremental filter. Double-click copies a clip back. """
+
+    def __init__(self, path: str, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("Clipboard History")
+        self.model = HistoryModel(path, self)
+
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter...")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.list_view = QtWidgets.QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setUniformItemSizes(True)  # Lets the view skip measuring every row
+        self.list_view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.info_label = QtWidgets.QLabel(DEFAULT_HINT)
+        self.info_label.setStyleSheet("color: gray;")
+        self.notice_label = QtWidgets.QLabel()  # What the list cannot show for this log
+        self.notice_label.setWordWrap(True)
+        self.notice_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.notice_label.hide()
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.filter_edit)
+        layout.addWidget(self.notice_label)
+        layout.addWidget(self.list_view, 1)
+        layout.addWidget(self.info_label)
+        self.resize(600, 450)
+
+        # Debounce typing so a search starts only once the user pauses
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(FILTER_DELAY_MS)
+        self._filter_timer.timeout.connect(self._apply_filter)
+        self.filter_edit.textChanged.connect(self._filter_timer.start)
+        self.list_view.doubleClicked.connect(self.copy_entry)
+        self._pending_copy: typing.Optional[QtCore.QPersistentModelIndex] = None  # Repeat waiting for its original
+        self.model.repeats_resolved.connect(self._copy_pending)
+
+        # New clips reach the file from the writer thread; watch the file rather than the monitor
+        self._path = path
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._refresh_timer = QtCore.QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self._watcher.fileChanged.connect(self._refresh_timer.start)
+
+    def set_path(self, path: str) -> None:
+        self._unwatch()
+        self._path = path
+        self.model.set_path(path)
+        self._update_notice()
+        if self.isVisible():
+            self._watch()
+
+    def _update_notice(self) -> None:
+        """ Says what the list leaves out instead of silently showing less. """
+        command = f'"python Clipboard_Saver.py tail --file {self._path}" (or search <keyword>)'
+        reason = self.model.unsupported_reason()
+        segments = 0 if reason else self.model.rotated_segments()
+        if reason:
+            notice = f"{reason} Use {command} to read it."
+        elif segments:
+            notice = (f"Older clips are in {segments} rotated segment{'s' if segments > 1 else ''}, "
+                      f"which this list does not include. Use {command} to read them.")
+        else:
+            notice = ""
+        self.notice_label.setText(notice)
+        self.notice_label.setVisible(bool(notice))
+        self.filter_edit.setEnabled(reason is None)
+        self.list_view.setEnabled(reason is None)
+        if reason:
+            self.info_label.setText("")
+        elif not self.info_label.text():
+            self.info_label.setText(DEFAULT_HINT)
+
+    def _watch(self) -> None:
+        if os.path.exists(self._path) and self._path not in self._watcher.files():
+            self._watcher.addPath(self._path)
+
+    def _unwatch(self) -> None:
+        if self._watcher.files():
+            self._watcher.removePaths(self._watcher.files())
+
+    @pyqtSlot()
+    def _apply_filter(self):
+        self.model.set_filter(self.filter_edit.text())
+
+    @pyqtSlot(QtCore.QModelIndex)
+    def copy_entry(self, index: QtCore.QModelIndex):
+        self._pending_copy = None
+        record = self.model.record_at(index.row())
+        if record is None:
+            self._pending_copy = QtCore.QPersistentModelIndex(index)  # Copied once its original is found
+            self.info_label.setText("Looking up the original of this repeated clip...")
+            return
+        if parse_ref(record.content) is not None:
+            self.info_label.setText(f"The clip repeated at {record.timestamp} is no longer in this log.")
+            return
+        blob = parse_blob_ref(record.content)
+        if blob is None:
+            QtWidgets.QApplication.clipboard().setText(unescape_content(record.content))
+        else:
+            mime_type, digest = blob
+            try:
+                data = BlobStore(blob_dir_for(self._path)).get(digest, mime_type)
+            except OSError as e:
+                self.info_label.setText(f"Cannot restore entry: {e}")
+                return
+            mime = QtCore.QMimeData()
+            mime.setData(mime_type, data)
+            if mime_type.startswith("image/"):
+                mime.setImageData(QtGui.QImage.fromData(data))
+            QtWidgets.QApplication.clipboard().setMimeData(mime)
+        self.info_label.setText(f"Copied entry from {record.timestamp}.")
+
+    @pyqtSlot()
+    def _copy_pending(self):
+        pending = self._pending_copy
+        if pending is not None and pending.isValid() and self.model.record_at(pending.row()) is not None:
+            self.copy_entry(QtCore.QModelIndex(pending))
+
+    @pyqtSlot()
+    def refresh(self):
+        """ Picks up clips saved since the panel was opened. """
+        if self.isVisible():
+            self.model.check_for_new()
+            self._update_notice()  # A rotation adds a segment
+            self._watch()  # Rotation replaces the file, which drops the watch
+
+    def showEvent(self, event):
+        self.model.reload()
+        self._update_notice()
+        self._watch()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._unwatch()
+        self.model.close()  # Unmap the log so rotation can rename it
+        super().hideEvent(event)
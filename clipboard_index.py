@@ -0,0 +1,358 @@
+"""
+In-memory search index behind the quick-paste picker.
+
+ClipIndex holds the most recently used distinct clips (capacity, least
+recently used evicted first) and a trigram index over the first
+INDEX_CHARS characters of each, lowercased. search() ranks clips by how
+well they match, how recently and how often they were copied:
+
+    score = MATCH_WEIGHT * match + RECENCY_WEIGHT * recency + FREQUENCY_WEIGHT * frequency
+
+match is 1 when every word of the query occurs in the clip (plus
+PREFIX_BONUS when the clip starts with the query); otherwise it is the
+share of the query's trigrams the clip has, rare trigrams weighing more,
+which forgives typos and word order; clips with less than MIN_SIMILARITY
+are left out. recency halves every RECENCY_HALF_LIFE seconds; frequency
+grows with the log of the copy count.
+
+Each trigram's postings are an array of entry ids. A clip gets a new id
+every time it is copied, so ids run in order of last use and a search
+walks postings backwards, newest first, stopping once it has
+MAX_CANDIDATES matches. Ids of evicted or re-copied clips stay in the
+arrays until they make up half of all postings; then the arrays are
+filtered in one pass.
+
+The index follows the log: add() is called for every clip the monitor
+saves, catch_up() reads records newer than the newest one indexed, and
+save() writes a snapshot (marshal) that load() restores without
+re-indexing, so a restart does not read the whole history again.
+Snapshots are not written for encrypted logs. See benchmarks/bench_picker.py.
+"""
+import array
+import collections
+import heapq
+import marshal
+import math
+import os
+import threading
+import time
+import typing
+from datetime import datetime
+
+from clipboard_fingerprint import content_digest
+from clipboard_history import iter_since
+from clipboard_store import ClipRecord, is_encrypted_path, is_sqlite_path, parse_blob_ref, parse_ref, query_db
+
+INDEX_CAPACITY: int = 100000       # Distinct clips kept; the least recently used are evicted
+INDEX_CHARS: int = 256             # Leading characters of a clip that are indexed and searched
+MAX_ENTRY_CHARS: int = 64 * 1024   # Longer clips are left to the history browser
+RESULT_LIMIT: int = 10
+MAX_CANDIDATES: int = 300          # Matches ranked per search: the newest word matches, or the most similar
+MAX_SCANNED: int = 50000           # Postings looked at for word matches per search
+FUZZY_TAIL: int = 2000             # Newest postings per trigram counted for similarity matches
+MIN_SIMILARITY: float = 0.5        # Share of the query's trigram weight a similarity match must have
+MATCH_WEIGHT: float = 0.6
+RECENCY_WEIGHT: float = 0.3
+FREQUENCY_WEIGHT: float = 0.1
+PREFIX_BONUS: float = 0.2
+RECENCY_HALF_LIFE: float = 3 * 86400.0  # Seconds
+FREQUENCY_SATURATION: int = 32          # Copies at which the frequency term reaches 1
+SNAPSHOT_DIR: str = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                                 "clipboard-saver")
+SNAPSHOT_VERSION: int = 1
+
+_EMPTY = array.array("I")
+
+
+class Match(typing.NamedTuple):
+    content: str
+    timestamp: str  # Last copied, "%Y-%m-%d %H:%M:%S"
+    count: int      # Times copied
+    score: float
+
+
+class _Entry:
+    __slots__ = ("content", "lowered", "timestamp", "epoch", "count", "grams")
+
+    def __init__(self, content: str, lowered: str, timestamp: str, epoch: float, count: int, grams: int):
+        self.content = content
+        self.lowered = lowered      # content[:INDEX_CHARS].lower()
+        self.timestamp = timestamp
+        self.epoch = epoch          # timestamp in seconds since the epoch
+        self.count = count
+        self.grams = grams          # Postings that point at this entry
+
+
+def trigrams(text: str) -> typing.Set[str]:
+    """ The three-character substrings of text's words (whitespace never part of one). """
+    return {word[i:i + 3] for word in text.split() for i in range(len(word) - 2)}
+
+
+def snapshot_path_for(log_path: str) -> str:
+    """ Where the index snapshot of a log is kept (a cache: safe to delete). """
+    return os.path.join(SNAPSHOT_DIR, f"picker-{content_digest(os.path.abspath(log_path))[:16]}.idx")
+
+
+def _epoch(timestamp: str) -> float:
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _history_since(log_path: str, since: typing.Optional[str]) -> typing.Iterable[ClipRecord]:
+    if is_sqlite_path(log_path):
+        return reversed(query_db(log_path, start=since, limit=-1))  # Negative LIMIT: all rows
+    return iter_since(log_path, since)
+
+
+class ClipIndex:
+    """ Searchable, bounded set of recent clips. Safe to use from several threads. """
+
+    def __init__(self, capacity: int = INDEX_CAPACITY):
+        self.capacity = capacity
+        self.newest: typing.Optional[str] = None  # Timestamp of the newest clip indexed
+        self._entries: "collections.OrderedDict[int, _Entry]" = collections.OrderedDict()  # id -> entry, oldest first
+        self._ids: typing.Dict[str, int] = {}  # content -> id
+        self._postings: typing.Dict[str, array.array] = {}
+        self._next_id: int = 0
+        self._live: int = 0  # Postings that point at current entries
+        self._dead: int = 0  # Postings left behind by evicted and re-copied entries
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Updating ---
+
+    def add(self, timestamp: str, content: str) -> bool:
+        """
+        Records that content was copied at timestamp. Returns False if it is
+        not indexed: blob or reference records, empty or overlong clips, or
+        a copy not newer than the one already indexed (the same record
+        arriving twice, from the monitor and from catch_up()).
+        """
+        if not content or len(content) > MAX_ENTRY_CHARS or parse_blob_ref(content) or parse_ref(content):
+            return False
+        lowered = content[:INDEX_CHARS].lower()
+        with self._lock:
+            count = 1
+            old_id = self._ids.get(content)
+            if old_id is not None:
+                old = self._entries[old_id]
+                if timestamp <= old.timestamp:
+                    return False
+                count = old.count + 1
+                self._drop(old_id)
+            grams = trigrams(lowered)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(content, lowered, timestamp, _epoch(timestamp), count, len(grams))
+            self._ids[content] = entry_id
+            postings = self._postings
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = array.array("I", (entry_id,))
+                else:
+                    posting.append(entry_id)
+            self._live += len(grams)
+            if self.newest is None or timestamp > self.newest:
+                self.newest = timestamp
+            while len(self._entries) > self.capacity:
+                self._drop(next(iter(self._entries)))
+            if self._dead > self._live:
+                self._compact()
+        return True
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        del self._ids[entry.content]
+        self._live -= entry.grams
+        self._dead += entry.grams
+
+    def _compact(self) -> None:
+        """ Removes the ids of dropped entries from every posting. Runs once per index-sized batch of drops. """
+        live = self._entries
+        postings = {}
+        for gram, posting in self._postings.items():
+            kept = array.array("I", (entry_id for entry_id in posting if entry_id in live))
+            if kept:
+                postings[gram] = kept
+        self._postings = postings
+        self._dead = 0
+
+    def absorb(self, other: "ClipIndex") -> int:
+        """ Adds other's clips, oldest first (e.g. those saved while this index was loading). """
+        with other._lock:
+            entries = [(entry.timestamp, entry.content) for entry in other._entries.values()]
+        return sum(self.add(timestamp, content) for timestamp, content in entries)
+
+    def catch_up(self, log_path: str) -> int:
+        """ Indexes the log's records newer than the newest clip indexed. Returns how many were added. """
+        added = 0
+        for record in _history_since(log_path, self.newest):
+            added += self.add(record.timestamp, record.content)
+        return added
+
+    # --- Searching ---
+
+    def search(self, query: str, limit: int = RESULT_LIMIT, now: typing.Optional[float] = None) -> typing.List[Match]:
+        """ The best limit clips for query, best first. An empty query lists the most recent clips. """
+        needle = " ".join(query.lower().split())
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._entries
+            if not needle:
+                found = {entry_id: 0.0 for entry_id in _take(reversed(entries), limit)}
+            else:
+                found = self._word_matches(needle)
+                if len(found) < limit:
+                    self._similar(needle, found)
+            ranked = heapq.nlargest(limit, ((self._score(entries[entry_id], match, now), entry_id)
+                                            for entry_id, match in found.items()))
+            return [Match(entries[entry_id].content, entries[entry_id].timestamp, entries[entry_id].count, score)
+                    for score, entry_id in ranked]
+
+    def _word_matches(self, needle: str) -> typing.Dict[int, float]:
+        """ Entries containing every word of needle, newest first: id -> match score. """
+        words = needle.split()
+        grams = trigrams(needle)
+        entries = self._entries
+        if grams:  # Every match is in the shortest posting of the query's trigrams
+            candidates: typing.Iterable[int] = reversed(min((self._postings.get(gram, _EMPTY) for gram in grams), key=len))
+        else:  # Words too short for trigrams: look at the newest clips
+            candidates = reversed(entries)
+        found: typing.Dict[int, float] = {}
+        for entry_id in _take(candidates, MAX_SCANNED):
+            entry = entries.get(entry_id)
+            if entry is None:
+                continue  # Evicted or re-copied
+            lowered = entry.lowered
+            if all(word in lowered for word in words):
+                found[entry_id] = 1.0 + PREFIX_BONUS if lowered.startswith(needle) else 1.0
+                if len(found) >= MAX_CANDIDATES:
+                    break
+        return found
+
+    def _similar(self, needle: str, found: typing.Dict[int, float]) -> None:
+        """
+        Adds the entries sharing most of needle's trigrams, scored by the
+        shared weight: rare trigrams count more (inverse document frequency),
+        and trigrams no clip has (the typo) not at all.
+        """
+        entries = self._entries
+        weights = {}
+        for gram in trigrams(needle):
+            posting = self._postings.get(gram)
+            if posting:
+                weights[gram] = math.log((len(entries) + 1) / len(posting))
+        total = sum(weights.values())
+        if not total:
+            return
+        scores: typing.Dict[int, float] = {}
+        get = scores.get
+        for gram, weight in weights.items():
+            for entry_id in self._postings[gram][-FUZZY_TAIL:]:
+                scores[entry_id] = get(entry_id, 0.0) + weight
+        needed = MIN_SIMILARITY * total
+        for entry_id in heapq.nlargest(MAX_CANDIDATES, scores, key=scores.__getitem__):
+            if scores[entry_id] < needed:
+                break
+            if entry_id not in found and entry_id in entries:
+                found[entry_id] = scores[entry_id] / total
+
+    @staticmethod
+    def _score(entry: _Entry, match: float, now: float) -> float:
+        recency = 0.5 ** (max(0.0, now - entry.epoch) / RECENCY_HALF_LIFE)
+        frequency = min(1.0, math.log2(1 + entry.count) / math.log2(1 + FREQUENCY_SATURATION))
+        return MATCH_WEIGHT * match + RECENCY_WEIGHT * recency + FREQUENCY_WEIGHT * frequency
+
+    # --- Snapshots ---
+
+    def save(self, path: str) -> None:
+        """ Writes the index to path (atomically). """
+        with self._lock:
+            if self._dead:
+                self._compact()
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "itemsize": _EMPTY.itemsize,
+                "capacity": self.capacity,
+                "newest": self.newest,
+                "next_id": self._next_id,
+                "ids": array.array("I", self._entries).tobytes(),
+                "entries": [(entry.content, entry.timestamp, entry.epoch, entry.count, entry.grams)
+                            for entry in self._entries.values()],
+                "postings": {gram: posting.tobytes() for gram, posting in self._postings.items()},
+            }
+            blob = marshal.dumps(data)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(blob)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> None:
+        """ Replaces the index's contents with a snapshot. Raises ValueError if it is unusable. """
+        with open(path, "rb") as file:
+            try:
+                data = marshal.loads(file.read())
+            except (EOFError, TypeError) as e:
+                raise ValueError(f"Corrupt index snapshot {path}: {e}") from None
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION or \
+                data.get("itemsize") != _EMPTY.itemsize:
+            raise ValueError(f"Index snapshot {path} is from another version")
+        ids = array.array("I")
+        ids.frombytes(data["ids"])
+        entries = collections.OrderedDict(
+            (entry_id, _Entry(content, content[:INDEX_CHARS].lower(), timestamp, epoch, count, grams))
+            for entry_id, (content, timestamp, epoch, count, grams) in zip(ids, data["entries"]))
+        postings = {}
+        for gram, raw in data["postings"].items():
+            posting = array.array("I")
+            posting.frombytes(raw)
+            postings[gram] = posting
+        with self._lock:
+            self.newest = data["newest"]
+            self._entries = entries
+            self._ids = {entry.content: entry_id for entry_id, entry in entries.items()}
+            self._postings = postings
+            self._next_id = data["next_id"]
+            self._live = sum(entry.grams for entry in entries.values())
+            self._dead = 0
+            while len(self._entries) > self.capacity:  # Capacity lowered since the snapshot
+                self._drop(next(iter(self._entries)))
+
+
+def open_index(log_path: str, capacity: int = INDEX_CAPACITY,
+               snapshot_path: typing.Optional[str] = None) -> ClipIndex:
+    """
+    The index for a log: its snapshot, brought up to date with the log,
+    or built from the whole history when there is no usable snapshot (the
+    result is then saved, so the next start is fast).
+    """
+    index = ClipIndex(capacity)
+    if is_encrypted_path(log_path):
+        from clipboard_crypto import is_unlocked
+        if is_unlocked(log_path):
+            index.catch_up(log_path)  # Never written to disk in clear
+        return index
+    snapshot_path = snapshot_path or snapshot_path_for(log_path)
+    try:
+        index.load(snapshot_path)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Rebuilding the clip index: {e}")
+    restored = index.newest is not None
+    if os.path.exists(log_path) and (index.catch_up(log_path) or not restored):
+        index.save(snapshot_path)
+    return index
+
+
+def _take(iterable: typing.Iterable[int], count: int) -> typing.Iterator[int]:
+    for i, item in enumerate(iterable):
+        if i >= count:
+            return
+        yield item
@@ -0,0 +1,317 @@
+"""
+Large-clip policy: what happens to clips too big to hold in memory.
+
+pyperclip reads a selection whole (the output of xclip, wl-paste or
+pbpaste, then decoded), so one 500 MB copy used to cost a gigabyte or more
+before the monitor even looked at it, and every later step (filter, log
+line, writer) made another copy. ClipSpiller.paste() runs the same
+commands itself (the clipboard backend's paste_command()) and reads
+their output STREAM_CHUNK bytes at a time:
+
+* up to MAX_INLINE_BYTES the clip comes back as text, as before;
+* past that only its size and digest are kept, as a LargeClip, which the
+  monitor's change detection handles like text. If it is new, save()
+  reads the selection a second time, runs the sensitive-content filter
+  over it window by window and streams it into the blob store
+  (clipboard_blobs). The log gets a "@blob:text/plain:<digest>" line.
+* a clip over MAX_CLIP_BYTES is cut to that size (OVERSIZE_POLICY =
+  TRUNCATE) or not saved at all (SKIP).
+
+Reading twice means an unchanged large clip that is polled again is
+hashed but never written. Hashing it on every poll would still read the
+whole selection each time, so while the last read was a LargeClip, a poll
+first reads only its first HEAD_BYTES: if they are unchanged the previous
+LargeClip is returned, and the whole selection is only read again every
+few polls (doubling up to RECHECK_MAX_POLLS while it stays the same).
+A change past the head is therefore noticed late, never missed.
+Text that is already in memory (Qt hands the
+GUI the whole string; platforms without a paste command) is spilled the
+same way once it is over MAX_INLINE_BYTES characters, so the writer and
+the log never see it.
+
+apply_memory_limit() puts a hard ceiling on the monitor process
+(MEMORY_LIMIT, enforced by the kernel as RLIMIT_DATA): anything that
+still tries to read a huge clip whole fails with MemoryError, which the
+monitor loops report and survive, rather than pushing the machine into
+swap. Encrypted logs keep no blobs (they would be stored in clear), so
+large clips are not saved to them.
+
+benchmarks/bench_large_clip.py checks peak memory with a 500 MB clip.
+"""
+import hashlib
+import subprocess
+import typing
+
+from clipboard_backend import ClipboardBackend, get_backend
+from clipboard_blobs import BlobStore, blob_dir_for
+from clipboard_filter import DROP, KEEP, REDACT, ClipFilter, FilterResult
+from clipboard_fingerprint import DIGEST_SIZE, Fingerprint
+from clipboard_metrics import LARGE_CLIPS, trace_event
+from clipboard_store import CLIPBOARD, escape_content, is_encrypted_path, make_blob_ref
+
+TRUNCATE: str = "truncate"  # Keep the first MAX_CLIP_BYTES of an oversized clip
+SKIP: str = "skip"          # Do not save an oversized clip at all
+
+MAX_INLINE_BYTES: int = 1 << 20                    # Larger clips are stored as blobs, not in the log
+MAX_CLIP_BYTES: typing.Optional[int] = 1 << 30     # Cap on a single clip (None: no cap)
+OVERSIZE_POLICY: str = TRUNCATE                    # What happens to clips over MAX_CLIP_BYTES
+MEMORY_LIMIT: typing.Optional[int] = 1 << 30       # Hard ceiling on the monitor process's heap (None: no limit)
+STREAM_CHUNK: int = 1 << 20                        # Bytes read from the paste command at a time
+FILTER_TAIL: int = 64 << 10                        # Window ends are moved back to whitespace within this many bytes
+HEAD_BYTES: int = 64 << 10                         # Bytes compared to tell if a large clip is still there
+RECHECK_MAX_POLLS: int = 64                        # Max polls between full reads of an unchanged large clip
+TEXT_MIME: str = "text/plain"
+
+
+class LargeClip:
+    """
+    A clip found to be larger than the inline limit while it was read:
+    its size and digest, not its text. Compares equal to another read of
+    the same content; len() is its size in bytes.
+    """
+    __slots__ = ("selection", "size", "fingerprint", "truncated", "command")
+
+    def __init__(self, selection: str, size: int, fingerprint: Fingerprint, truncated: bool,
+                 command: typing.List[str]):
+        self.selection = selection
+        self.size = size                # Bytes read, at most MAX_CLIP_BYTES
+        self.fingerprint = fingerprint  # Size and blake2b of what was read
+        self.truncated = truncated      # The selection holds more than MAX_CLIP_BYTES
+        self.command = command          # Reads the selection again for save()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __eq__(self, other: typing.Any) -> bool:
+        return isinstance(other, LargeClip) and other.fingerprint == self.fingerprint
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    def __repr__(self) -> str:
+        return f"LargeClip({self.selection!r}, {self.size} bytes{', truncated' if self.truncated else ''})"
+
+
+class _Held(typing.NamedTuple):
+    """ The last large clip read from a selection, and when to read it whole again. """
+    clip: LargeClip
+    head: bytes     # Its first HEAD_BYTES
+    interval: int   # Polls between full reads, doubled while the clip stays the same
+    skip: int       # Polls left before the next full read
+
+
+class _Dropped(Exception):
+    def __init__(self, result: FilterResult):
+        super().__init__(result.rules)
+        self.result = result
+
+
+def apply_memory_limit(limit: typing.Optional[int] = MEMORY_LIMIT) -> bool:
+    """
+    Caps this process's data segment (heap and private mappings) at limit
+    bytes; allocations past it raise MemoryError. Never raises an existing
+    lower limit. Returns False where no limit can be set (Windows, or limit
+    is None).
+    """
+    if limit is None:
+        return False
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return False
+    soft, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    if soft == resource.RLIM_INFINITY or soft > limit:
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+    return True
+
+
+def _stream(command: typing.List[str], limit: typing.Optional[int]) -> typing.Iterator[bytes]:
+    """ The command's output in STREAM_CHUNK pieces, at most limit bytes. Stops the command when closed early. """
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            chunk = process.stdout.read(STREAM_CHUNK if remaining is None else min(STREAM_CHUNK, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+
+def _encoded(text: str, limit: typing.Optional[int]) -> typing.Iterator[bytes]:
+    """ text as UTF-8, STREAM_CHUNK characters at a time, up to limit characters. """
+    end = len(text) if limit is None else min(len(text), limit)
+    for start in range(0, end, STREAM_CHUNK):
+        yield text[start:min(start + STREAM_CHUNK, end)].encode("utf-8", "surrogatepass")
+
+
+def _complete_utf8(data: bytes) -> int:
+    """ Length of data without a trailing incomplete UTF-8 sequence. """
+    end = len(data)
+    for back in range(1, min(4, end) + 1):
+        byte = data[end - back]
+        if byte < 0x80:
+            return end
+        if byte >= 0xC0:  # Lead byte: is its sequence complete?
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return end if back >= needed else end - back
+    return end
+
+
+def _windows(chunks: typing.Iterable[bytes], truncated: bool) -> typing.Iterator[bytes]:
+    """
+    Regroups chunks into windows that end at whitespace where there is
+    some near the end (so the filter sees tokens whole), and never inside
+    a UTF-8 sequence. A truncated stream loses its incomplete last character.
+    """
+    carry = b""
+    for chunk in chunks:
+        data = carry + chunk if carry else chunk
+        floor = max(0, len(data) - FILTER_TAIL)
+        cut = max(data.rfind(b" ", floor), data.rfind(b"\n", floor)) + 1
+        if cut <= 0:
+            cut = _complete_utf8(data)
+        if cut:
+            yield data[:cut]
+        carry = data[cut:]
+    if carry:
+        yield carry[:_complete_utf8(carry)] if truncated else carry
+
+
+def _filtered(windows: typing.Iterable[bytes], clip_filter: ClipFilter,
+              fired: typing.List[str]) -> typing.Iterator[bytes]:
+    """ Runs clip_filter over each window; redacted ones are re-encoded. Raises _Dropped for a DROP rule. """
+    for window in windows:
+        result = clip_filter.check(window.decode("utf-8", "replace"))
+        if result.text is None:
+            raise _Dropped(result)
+        if result.action == KEEP:
+            yield window  # Unchanged: written as read, no re-encode
+            continue
+        fired.extend(rule for rule in result.rules if rule not in fired)
+        yield result.text.encode("utf-8", "surrogatepass")
+
+
+class ClipSpiller:
+    """
+    Applies the large-clip policy for one log. paste() is the monitor's
+    clipboard read (create_change_source(read_func=spiller.paste));
+    filter() takes the place of ClipFilter.apply() for new clips.
+    """
+
+    def __init__(self, log_path: str,
+                 max_inline: int = MAX_INLINE_BYTES,
+                 max_size: typing.Optional[int] = MAX_CLIP_BYTES,
+                 oversize: str = OVERSIZE_POLICY,
+                 command: typing.Optional[typing.Callable[[str], typing.Optional[typing.List[str]]]] = None,
+                 backend: typing.Optional[ClipboardBackend] = None):
+        if oversize not in (TRUNCATE, SKIP):
+            raise ValueError(f"Unknown oversize policy: {oversize}")
+        self.max_inline = max_inline
+        self.max_size = max_size
+        self.oversize = oversize
+        self.command = command  # selection -> argv printing it, or None to paste() it (default: the backend's)
+        self.backend = backend  # None: get_backend() at each read
+        self.blobs: typing.Optional[BlobStore] = None
+        self._held: typing.Dict[str, _Held] = {}  # Per selection, while its last read was a LargeClip
+        self.set_log(log_path)
+
+    def set_log(self, log_path: str) -> None:
+        """ Stores future large clips next to a new log (none for an encrypted one). """
+        self.blobs = None if is_encrypted_path(log_path) else BlobStore(blob_dir_for(log_path))
+
+    def paste(self, selection: str = CLIPBOARD) -> typing.Union[str, LargeClip]:
+        """ Reads a selection: its text, or a LargeClip if it is over the inline limit. """
+        backend = self.backend or get_backend()
+        command = (self.command or backend.paste_command)(selection)
+        if command is None:
+            return backend.paste(selection)
+        held = self._held.pop(selection, None)
+        if held is not None and held.skip > 0 and b"".join(_stream(command, HEAD_BYTES)) == held.head:
+            self._held[selection] = held._replace(skip=held.skip - 1)
+            return held.clip  # Same start: taken to be the same clip until the next full read
+        hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        head: typing.Optional[bytearray] = bytearray()  # The text, until it is over the inline limit
+        start = bytearray()  # First HEAD_BYTES, for the next poll's quick check
+        blank = True
+        size = 0
+        for chunk in _stream(command, None if self.max_size is None else self.max_size + 1):
+            if len(start) < HEAD_BYTES:
+                start += chunk[:HEAD_BYTES - len(start)]
+            size += len(chunk)
+            hasher.update(chunk)
+            blank = blank and chunk.isspace()
+            if head is not None:
+                head += chunk
+                if len(head) > self.max_inline:
+                    head = None
+        if head is not None:
+            return head.decode("utf-8", "replace")
+        if blank:
+            return ""  # Whitespace only: not saved, however large
+        truncated = self.max_size is not None and size > self.max_size
+        size = min(size, self.max_size) if truncated else size
+        clip = LargeClip(selection, size, Fingerprint(size, int(hasher.hexdigest(), 16)), truncated, command)
+        interval = min(held.interval * 2, RECHECK_MAX_POLLS) if held is not None and held.clip == clip else 1
+        self._held[selection] = _Held(clip, bytes(start), interval, interval)
+        return clip
+
+    def filter(self, content: typing.Union[str, LargeClip], owner: typing.Optional[str] = None,
+               clip_filter: typing.Optional[ClipFilter] = None) -> FilterResult:
+        """
+        What to log for a new clip. Large ones are saved as blobs (save());
+        others go through clip_filter, if there is one, as before, and are
+        escaped so they cannot pass for a marker (see clipboard_store).
+        """
+        if isinstance(content, LargeClip) or len(content) > self.max_inline:
+            return self.save(content, owner, clip_filter)
+        result = clip_filter.apply(content, owner) if clip_filter else FilterResult(KEEP, content)
+        return result if result.text is None else result._replace(text=escape_content(result.text))
+
+    def save(self, content: typing.Union[str, LargeClip], owner: typing.Optional[str] = None,
+             clip_filter: typing.Optional[ClipFilter] = None) -> FilterResult:
+        """
+        Filters a large clip and streams it into the blob store. The
+        result's text is the blob reference to log, or None if the clip is
+        not saved (dropped by the filter, oversized under SKIP, or the log
+        is encrypted).
+        """
+        if clip_filter is not None:
+            if clip_filter.excludes(owner):
+                return clip_filter.record(FilterResult(DROP, None, ("excluded_app",)))
+            if clip_filter.max_length is not None and len(content) > clip_filter.max_length:
+                return clip_filter.record(FilterResult(DROP, None, ("max_length",)))
+        if isinstance(content, LargeClip):
+            truncated = content.truncated
+            chunks = _stream(content.command, self.max_size)
+        else:  # Already in memory: limits count characters
+            truncated = self.max_size is not None and len(content) > self.max_size
+            chunks = _encoded(content, self.max_size)
+        blobs = self.blobs
+        if blobs is None or (truncated and self.oversize == SKIP):
+            rule = "max_clip_bytes" if blobs is not None else "encrypted_log"
+            LARGE_CLIPS.inc(action=SKIP)
+            trace_event("large_clip", action=SKIP, size=len(content), rule=rule)
+            return FilterResult(DROP, None, (rule,))
+
+        fired: typing.List[str] = []
+        pieces = _windows(chunks, truncated)
+        if clip_filter is not None:
+            pieces = _filtered(pieces, clip_filter, fired)
+        try:
+            digest, size = blobs.put_stream(pieces, TEXT_MIME)
+        except _Dropped as dropped:
+            return clip_filter.record(dropped.result)
+        action = TRUNCATE if truncated else "spill"
+        LARGE_CLIPS.inc(action=action)
+        trace_event("large_clip", action=action, size=size, digest=digest)
+        result = FilterResult(REDACT if fired else KEEP, make_blob_ref(TEXT_MIME, digest), tuple(fired))
+        return clip_filter.record(result) if fired else result
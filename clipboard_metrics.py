@@ -0,0 +1,391 @@
+"""
+Metrics and event tracing for the savers.
+
+A single process-wide REGISTRY holds the counters and latency histograms
+below. The console loop, the GUI monitor, the change sources and the log
+writer all update them. Updating a metric is a lock and an add (plus a
+bisect for histograms): a microsecond or two per loop iteration, against
+the milliseconds a pyperclip.paste() takes; see benchmarks/bench_metrics.py.
+
+Metrics can be exported in the Prometheus text format, either over HTTP
+(MetricsExporter(port=...), served at /metrics) or as a file rewritten every
+few seconds for node_exporter's textfile collector (MetricsExporter(textfile=...)).
+
+The optional event trace writes one JSON object per line (detections,
+flushes, errors) to a file. It is off unless enable_trace() is called;
+while off, trace_event() returns after a single None check.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+import typing
+
+LATENCY_BUCKETS: typing.Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05,
+                                             0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+EXPORT_INTERVAL: float = 15.0  # Seconds between textfile rewrites
+TRACE_FLUSH_INTERVAL: float = 1.0  # Seconds the trace may sit in the file buffer
+
+_LabelKey = typing.Tuple[str, ...]
+
+
+def _format_labels(names: typing.Sequence[str], values: _LabelKey, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """ Base class: a named family of values, one per combination of label values. """
+    kind: str = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: typing.Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: typing.Dict[str, str]) -> _LabelKey:
+        if not labels:
+            return ()
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        """ Yields (suffix, label string, value) for the text exposition. """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """ Monotonically increasing count, e.g. records written or errors by type. """
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: typing.Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: typing.Dict[_LabelKey, float] = {} if labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels) if labels else ()
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "_total", _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """ Value read from a callback at export time, e.g. the writer's queue depth. """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, func: typing.Callable[[], float] = lambda: 0):
+        super().__init__(name, help_text)
+        self.func = func
+
+    def set_function(self, func: typing.Callable[[], float]) -> None:
+        self.func = func
+
+    def samples(self):
+        try:
+            yield "", "", self.func()
+        except Exception:  # A broken callback must not break the whole export
+            return
+
+
+class Histogram(Metric):
+    """ Distribution of observed values (latencies in seconds) over fixed buckets. """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: typing.Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label key: [count per bucket..., +Inf bucket, sum]
+        self._values: typing.Dict[_LabelKey, typing.List[float]] = {} if labelnames else {(): self._empty()}
+
+    def _empty(self) -> typing.List[float]:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if labels:
+            key = self._key(labels)
+            with self._lock:
+                counts = self._values.get(key)
+                if counts is None:
+                    counts = self._values[key] = self._empty()
+                counts[index] += 1
+                counts[-1] += value
+            return
+        counts = self._values[()]
+        with self._lock:
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, **labels: str) -> "_Timer":
+        """ Context manager that observes the duration of its block. """
+        return _Timer(self, labels)
+
+    def count(self, **labels: str) -> int:
+        counts = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def total(self, **labels: str) -> float:
+        counts = self._values.get(self._key(labels))
+        return counts[-1] if counts else 0.0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), counts[-1]
+            yield "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: typing.Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """ Collection of metrics with Prometheus text exposition. """
+
+    def __init__(self):
+        self._metrics: typing.Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered as a {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: typing.Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, func: typing.Callable[[], float] = lambda: 0) -> Gauge:
+        return self.register(Gauge(name, help_text, func))
+
+    def histogram(self, name: str, help_text: str, buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: typing.Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets, labelnames))
+
+    def get(self, name: str) -> typing.Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """ All metrics in the Prometheus text format (version 0.0.4). """
+        lines: typing.List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """ Writes render() to path atomically, so a scraper never reads half a file. """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as file:
+            file.write(self.render())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+PASTE_SECONDS = REGISTRY.histogram("clipboard_paste_seconds", "Time spent reading the clipboard")
+PASTE_ERRORS = REGISTRY.counter("clipboard_paste_errors", "Clipboard reads that raised")
+DETECT_SECONDS = REGISTRY.histogram("clipboard_detect_seconds", "Time spent deciding whether a read is a new clip",
+                                    buckets=(0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1))
+CHECKS = REGISTRY.counter("clipboard_checks", "Clipboard reads checked for new content")
+CHANGES = REGISTRY.counter("clipboard_changes", "New clips detected")
+PERSIST_SECONDS = REGISTRY.histogram("clipboard_persist_seconds",
+                                     "Time from detecting a clip to its batch being written")
+WRITE_SECONDS = REGISTRY.histogram("clipboard_write_seconds", "Time to write and sync one batch")
+RECORDS_WRITTEN = REGISTRY.counter("clipboard_records_written", "Records written to the store")
+BYTES_WRITTEN = REGISTRY.counter("clipboard_bytes_written", "UTF-8 bytes of clip content written")
+RECORDS_DROPPED = REGISTRY.counter("clipboard_records_dropped", "Records dropped because the writer queue was full")
+CLIPS_FILTERED = REGISTRY.counter("clipboard_clips_filtered", "Clips redacted or dropped by the sensitive-content filter",
+                                  labelnames=("action",))
+LARGE_CLIPS = REGISTRY.counter("clipboard_large_clips", "Clips over the inline size, by what was done with them",
+                               labelnames=("action",))
+ERRORS = REGISTRY.counter("clipboard_errors", "Errors by exception type", labelnames=("type",))
+WRITER_QUEUE_DEPTH = REGISTRY.gauge("clipboard_writer_queue_depth", "Records waiting for the writer thread")
+
+
+def text_bytes(text: str) -> int:
+    """ UTF-8 size of text. ASCII text (the common case) is answered without encoding it. """
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+
+
+def record_error(error: BaseException) -> None:
+    """ Counts an error by type and traces it. """
+    name = type(error).__name__
+    ERRORS.inc(type=name)
+    trace_event("error", type=name, message=str(error)[:200])
+
+
+# --- Event trace ---
+
+class EventTrace:
+    """ Appends JSON-lines events to a file. Thread-safe; buffered and flushed at most every TRACE_FLUSH_INTERVAL. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8", buffering=64 * 1024)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def emit(self, event: str, fields: typing.Dict[str, typing.Any]) -> None:
+        line = json.dumps({"ts": round(time.time(), 6), "event": event, **fields}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            now = time.monotonic()
+            if now - self._last_flush >= TRACE_FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_trace: typing.Optional[EventTrace] = None
+
+
+def enable_trace(path: str) -> EventTrace:
+    """ Starts writing the event trace to path (replacing any previous trace). """
+    global _trace
+    disable_trace()
+    _trace = EventTrace(path)
+    return _trace
+
+
+def disable_trace() -> None:
+    global _trace
+    trace, _trace = _trace, None
+    if trace is not None:
+        trace.close()
+
+
+def trace_event(event: str, **fields: typing.Any) -> None:
+    trace = _trace
+    if trace is not None:
+        trace.emit(event, fields)
+
+
+# --- Export ---
+
+def _make_handler(registry: Registry):
+    """ Request handler class serving `registry`; http.server is only imported when the HTTP export is used. """
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console
+
+    return MetricsHandler
+
+
+class MetricsExporter:
+    """
+    Publishes a registry over HTTP (port) and/or as a Prometheus textfile,
+    each from its own daemon thread. Binds to localhost only by default.
+    """
+
+    def __init__(self, registry: Registry = REGISTRY,
+                 port: typing.Optional[int] = None,
+                 textfile: typing.Optional[str] = None,
+                 host: str = "127.0.0.1",
+                 interval: float = EXPORT_INTERVAL):
+        self.registry = registry
+        self.port = port
+        self.textfile = textfile
+        self.host = host
+        self.interval = interval
+        self._server: typing.Optional["http.server.ThreadingHTTPServer"] = None
+        self._stop = threading.Event()
+        self._threads: typing.List[threading.Thread] = []
+
+    def start(self) -> "MetricsExporter":
+        if self.port is not None:
+            import http.server
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), _make_handler(self.registry))
+            self._server.daemon_threads = True
+            self.port = self._server.server_address[1]  # Resolves port 0 to the one picked
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="MetricsHTTP", daemon=True))
+        if self.textfile:
+            self._threads.append(threading.Thread(target=self._write_loop, name="MetricsTextfile", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                self.registry.write_textfile(self.textfile)
+            except OSError as e:
+                print(f"Error writing metrics to {self.textfile}: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        if self.textfile:
+            try:
+                self.registry.write_textfile(self.textfile)  # Final values
+            except OSError:
+                pass
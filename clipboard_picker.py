@@ -0,0 +1,114 @@
+"""
+Quick-paste picker: a small popup that searches the clip history as you type.
+
+QuickPastePicker is a frameless, always-on-top box with a search field
+and the best RESULT_LIMIT matches from a ClipIndex (clipboard_index),
+ranked by match, recency and frequency. Every keystroke searches the
+in-memory index directly, with no debounce: a search takes a few
+milliseconds even over 100k clips. Up/Down move the selection, Enter or
+a double-click copies the selected clip to the clipboard and closes the
+popup; Esc or clicking elsewhere closes it.
+"""
+import typing
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt, pyqtSlot
+
+from clipboard_index import RESULT_LIMIT, ClipIndex
+from clipboard_store import unescape_content
+
+PREVIEW_LENGTH: int = 100  # Characters shown per result
+
+
+def _preview(content: str) -> str:
+    text = " ".join(content[:PREVIEW_LENGTH * 2].split())
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1] + "…"
+
+
+class QuickPastePicker(QtWidgets.QWidget):
+    """ Search-as-you-type popup over a ClipIndex. Enter copies the selected clip. """
+
+    def __init__(self, index: typing.Optional[ClipIndex] = None, parent=None):
+        super().__init__(parent, Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.setWindowTitle("Quick Paste")
+        self.index = index  # None while the index is loading
+
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("Search clips...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.installEventFilter(self)  # Up/Down/Esc while typing
+        self.result_list = QtWidgets.QListWidget()
+        self.result_list.setUniformItemSizes(True)
+        self.info_label = QtWidgets.QLabel()
+        self.info_label.setStyleSheet("color: gray;")
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.search_edit)
+        layout.addWidget(self.result_list, 1)
+        layout.addWidget(self.info_label)
+        self.resize(560, 320)
+
+        self.search_edit.textChanged.connect(self.search)
+        self.search_edit.returnPressed.connect(self.copy_selected)
+        self.result_list.itemActivated.connect(self.copy_selected)
+
+    def set_index(self, index: typing.Optional[ClipIndex]) -> None:
+        self.index = index
+        if self.isVisible():
+            self.search(self.search_edit.text())
+
+    def popup(self) -> None:
+        """ Shows the picker, empty, centered on the screen under the mouse pointer. """
+        self.search_edit.clear()
+        screen = QtWidgets.QApplication.screenAt(QtGui.QCursor.pos()) or QtWidgets.QApplication.primaryScreen()
+        geometry = self.frameGeometry()
+        geometry.moveCenter(screen.availableGeometry().center())
+        self.move(geometry.topLeft())
+        self.search("")
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.search_edit.setFocus()
+
+    @pyqtSlot(str)
+    def search(self, query: str):
+        self.result_list.clear()
+        if self.index is None:
+            self.info_label.setText("Loading clip history...")
+            return
+        for match in self.index.search(query, RESULT_LIMIT):
+            count = f"  ×{match.count}" if match.count > 1 else ""
+            content = unescape_content(match.content)  # The index holds clips as logged
+            item = QtWidgets.QListWidgetItem(f"{_preview(content)}\n{match.timestamp}{count}")
+            item.setData(Qt.UserRole, content)
+            item.setToolTip(content[:1000])
+            self.result_list.addItem(item)
+        if self.result_list.count():
+            self.result_list.setCurrentRow(0)
+            self.info_label.setText("Enter copies the selected clip, Esc closes.")
+        else:
+            self.info_label.setText(f"No clips match \"{query}\"." if query else "No clips saved yet.")
+
+    @pyqtSlot()
+    def copy_selected(self):
+        item = self.result_list.currentItem()
+        if item is None:
+            return
+        QtWidgets.QApplication.clipboard().setText(item.data(Qt.UserRole))
+        self.hide()
+
+    def eventFilter(self, watched: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if watched is self.search_edit and event.type() == QtCore.QEvent.KeyPress:
+            key = event.key()
+            if key in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+                QtWidgets.QApplication.sendEvent(self.result_list, event)  # Move the selection, keep typing
+                return True
+            if key == Qt.Key_Escape:
+                self.hide()
+                return True
+        return super().eventFilter(watched, event)
+
+    def changeEvent(self, event: QtCore.QEvent):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.ActivationChange and not self.isActiveWindow():
+            self.hide()  # Clicked elsewhere
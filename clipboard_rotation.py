@@ -0,0 +1,292 @@
+"""
+Size/age based rotation of the text log.
+
+The active file keeps its configured name (e.g. clipboard_log.txt). When it
+grows past RotationPolicy.max_bytes or its first record is older than
+max_age seconds, it is renamed to a closed segment
+
+    clipboard_log.<YYYYmmdd-HHMMSS-ffffff>.txt
+
+and a fresh active file is started. Closed segments are compressed (zstd if
+the `zstandard` package is installed, gzip otherwise) on a background thread
+and the oldest ones are deleted once they exceed retention_bytes in total.
+With deduplication on, every file is self-contained: references only point
+to records in the same file (see clipboard_dedup), so deleting a segment
+never leaves a reference elsewhere without its original.
+
+iter_history() streams records across all segments and the active file in
+chronological order, whether segments are compressed or not.
+"""
+import gzip
+import io
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import typing
+from datetime import datetime
+
+from clipboard_store import ClipRecord, ClipStore, TextLogStore, is_encrypted_path, is_sqlite_path, iter_records, \
+    open_store
+
+try:
+    import zstandard  # Optional, faster and smaller than gzip
+except ImportError:
+    zstandard = None
+
+MAX_SEGMENT_BYTES: int = 64 * 1024 * 1024       # Rotate once the active file reaches this size
+MAX_SEGMENT_AGE: float = 30 * 24 * 60 * 60      # Seconds, rotate once the oldest record is this old
+RETENTION_BYTES: int = 1024 * 1024 * 1024       # Cap for all closed segments together, 0 = keep everything
+COMPRESSION: str = "zstd" if zstandard else "gzip"
+SEGMENT_STAMP_FORMAT: str = "%Y%m%d-%H%M%S-%f"  # Segment names carry the time they were closed
+
+_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+_STOP = ""
+
+# Segments some compressor thread is working on right now. A store closed
+# by a restart or log switch leaves its thread finishing the queue, and the
+# new store must not start on the same segment (same .tmp file) meanwhile.
+_compressing: typing.Set[str] = set()
+_compressing_lock = threading.Lock()
+
+
+class RotationPolicy(typing.NamedTuple):
+    max_bytes: int = MAX_SEGMENT_BYTES
+    max_age: float = MAX_SEGMENT_AGE
+    retention_bytes: int = RETENTION_BYTES
+    compression: typing.Optional[str] = COMPRESSION  # "zstd", "gzip" or None
+
+
+class Segment(typing.NamedTuple):
+    path: str
+    stamp: str
+    compressed: bool
+
+
+def _segment_pattern(path: str) -> "re.Pattern[str]":
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return re.compile(rf"{re.escape(stem)}\.(\d{{8}}-\d{{6}}-\d{{6}}){re.escape(ext)}(\.gz|\.zst)?")
+
+
+def segment_path(path: str, stamp: str, compression: typing.Optional[str] = None) -> str:
+    """ Path of the closed segment of the log at path with the given stamp, compressed if compression is set. """
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{stamp}{ext}{_SUFFIXES[compression] if compression else ''}"
+
+
+def list_segments(path: str) -> typing.List[Segment]:
+    """ Closed segments of the log at path, oldest first. A segment that exists both compressed and plain is listed once. """
+    directory = os.path.dirname(os.path.abspath(path))
+    pattern = _segment_pattern(path)
+    by_stamp: typing.Dict[str, Segment] = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        match = pattern.fullmatch(name)
+        if not match:
+            continue
+        segment = Segment(os.path.join(directory, name), match.group(1), match.group(2) is not None)
+        # Compression finished but the plain file is not deleted yet: prefer the compressed copy
+        if segment.stamp not in by_stamp or segment.compressed:
+            by_stamp[segment.stamp] = segment
+    return [by_stamp[stamp] for stamp in sorted(by_stamp)]
+
+
+def open_segment(path: str) -> typing.TextIO:
+    """ Opens a segment or log file for reading as text, decompressing on the fly. """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the 'zstandard' package")
+        raw = open(path, "rb")
+        # Exported segments are a series of frames, one per chunk (see clipboard_transfer)
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True, read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def iter_history(path: str) -> typing.Iterator[ClipRecord]:
+    """ Streams every record of a rotated text log, oldest segment first, then the active file. """
+    if is_encrypted_path(path):  # Not rotated; decrypted frame by frame
+        from clipboard_crypto import iter_encrypted_records
+        yield from iter_encrypted_records(path)
+        return
+    for segment in list_segments(path):
+        try:
+            with open_segment(segment.path) as file:
+                yield from iter_records(file)
+        except FileNotFoundError:
+            continue  # Removed by retention or replaced by its compressed copy meanwhile
+    if os.path.exists(path):
+        with open_segment(path) as file:
+            yield from iter_records(file)
+
+
+def compress_segment(path: str, compression: str) -> str:
+    """ Compresses a closed segment next to itself and removes the original. Returns the new path. """
+    target = path + _SUFFIXES[compression]
+    tmp = target + ".tmp"
+    with open(path, "rb") as src:
+        if compression == "zstd":
+            with open(tmp, "wb") as raw, zstandard.ZstdCompressor(level=10).stream_writer(raw) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            with gzip.open(tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+def discard_compressed_originals(path: str) -> typing.List[str]:
+    """
+    Deletes plain segments whose compressed copy is complete, left behind
+    when the process died between the two steps at the end of
+    compress_segment(). Returns deleted paths.
+    """
+    deleted = []
+    for segment in list_segments(path):
+        if not segment.compressed:
+            continue
+        original = os.path.splitext(segment.path)[0]
+        with _compressing_lock:
+            if original in _compressing:
+                continue  # Still being compressed; its thread removes it
+            try:
+                os.remove(original)
+                deleted.append(original)
+            except FileNotFoundError:
+                pass
+    return deleted
+
+
+def enforce_retention(path: str, retention_bytes: int) -> typing.List[str]:
+    """ Deletes the oldest closed segments until they fit in retention_bytes. Returns deleted paths. """
+    if retention_bytes <= 0:
+        return []
+    segments = list_segments(path)
+    sizes = []
+    for segment in segments:
+        try:
+            sizes.append(os.path.getsize(segment.path))
+        except FileNotFoundError:
+            sizes.append(0)
+    total = sum(sizes)
+    deleted = []
+    for segment, size in zip(segments, sizes):
+        if total <= retention_bytes:
+            break
+        try:
+            os.remove(segment.path)
+            deleted.append(segment.path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return deleted
+
+
+class _Compressor:
+    """ Background thread that compresses closed segments and applies retention. """
+
+    def __init__(self, log_path: str, policy: RotationPolicy):
+        self.log_path = log_path
+        self.policy = policy
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="LogCompressor", daemon=True)
+        self._thread.start()
+
+    def submit(self, segment_path: str) -> None:
+        self._queue.put(segment_path)
+
+    def close(self) -> None:
+        """ Lets the thread finish the queued segments and exit (does not wait for it; a new store skips its segment). """
+        self._queue.put(_STOP)
+
+    def _run(self) -> None:
+        while True:
+            segment_path = self._queue.get()
+            if segment_path == _STOP:
+                return
+            with _compressing_lock:
+                if segment_path in _compressing:
+                    continue  # The thread of a closed store is still on it
+                _compressing.add(segment_path)
+            try:
+                if self.policy.compression and os.path.exists(segment_path):
+                    compress_segment(segment_path, self.policy.compression)
+                enforce_retention(self.log_path, self.policy.retention_bytes)
+            except Exception as e:  # Never let a bad segment kill the thread
+                print(f"Error compressing log segment {segment_path}: {e}")
+            finally:
+                with _compressing_lock:
+                    _compressing.discard(segment_path)
+
+
+def _first_record_time(path: str) -> typing.Optional[float]:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            first = file.readline()
+    except FileNotFoundError:
+        return None
+    try:
+        return datetime.strptime(first[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+class RotatingTextLogStore(TextLogStore):
+    """ TextLogStore that rotates the active file by size/age and hands closed segments to a compressor. """
+
+    def __init__(self, path: str, policy: RotationPolicy = RotationPolicy()):
+        super().__init__(path)
+        self.policy = policy
+        self.segment_started: float = _first_record_time(path) or time.time()
+        self._compressor = _Compressor(path, policy)
+        # Segments left uncompressed by an earlier run (e.g. killed mid-compression)
+        discard_compressed_originals(path)
+        for segment in list_segments(path):
+            if not segment.compressed:
+                self._compressor.submit(segment.path)
+
+    def _needs_rotation(self) -> bool:
+        size = self._file.tell()
+        if size == 0:
+            return False
+        return size >= self.policy.max_bytes or time.time() - self.segment_started >= self.policy.max_age
+
+    def rotate(self) -> str:
+        """ Closes the active file as a segment and starts a new one. Returns the segment path. """
+        self._file.close()
+        closed = segment_path(self.path, datetime.now().strftime(SEGMENT_STAMP_FORMAT))
+        os.replace(self.path, closed)
+        self._file = open(self.path, 'a', encoding='utf-8', errors='surrogatepass')
+        self.segment_started = time.time()
+        self._compressor.submit(closed)
+        return closed
+
+    def rotate_if_due(self) -> bool:
+        """ Rotates if the active file is due. Returns True if a new one was started. """
+        if not self._needs_rotation():
+            return False
+        self.rotate()
+        return True
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        self.rotate_if_due()
+        super().write_batch(records)
+
+    def close(self) -> None:
+        super().close()
+        self._compressor.close()
+
+
+def open_rotating_store(path: str, policy: typing.Optional[RotationPolicy]) -> ClipStore:
+    """ Like open_store(), but text logs rotate according to policy (None disables rotation; encrypted logs do not rotate). """
+    if policy is None or is_sqlite_path(path) or is_encrypted_path(path):
+        return open_store(path)
+    return RotatingTextLogStore(path, policy)
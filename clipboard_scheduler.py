@@ -0,0 +1,108 @@
+"""
+Adaptive polling scheduler shared by the console and GUI savers.
+
+Right after a change the scheduler switches to a short "burst" interval so
+copies made in quick succession are caught; every idle poll afterwards
+multiplies the interval by BACKOFF_FACTOR until MAX_INTERVAL is reached.
+Clipboard access errors get their own jittered exponential backoff.
+"""
+import random
+import threading
+import time
+import typing
+
+BASE_INTERVAL: float = 1.0     # Seconds, interval used at startup
+BURST_INTERVAL: float = 0.2    # Seconds, interval right after a change
+MAX_INTERVAL: float = 5.0      # Seconds, ceiling while the clipboard is idle
+BACKOFF_FACTOR: float = 1.5    # Growth per idle poll
+ERROR_BASE_DELAY: float = 1.0  # Seconds, first retry delay after an access error
+ERROR_MAX_DELAY: float = 30.0  # Seconds, ceiling for error retries
+
+
+class PollScheduler:
+    """
+    Decides how long to wait before the next clipboard poll and keeps
+    counters that describe how the monitor has been behaving.
+    """
+
+    def __init__(self,
+                 base_interval: float = BASE_INTERVAL,
+                 burst_interval: float = BURST_INTERVAL,
+                 max_interval: float = MAX_INTERVAL,
+                 backoff_factor: float = BACKOFF_FACTOR,
+                 error_base_delay: float = ERROR_BASE_DELAY,
+                 error_max_delay: float = ERROR_MAX_DELAY,
+                 clock: typing.Callable[[], float] = time.monotonic,
+                 rng: typing.Callable[[], float] = random.random):
+        self.burst_interval = burst_interval
+        self.max_interval = max(max_interval, burst_interval)
+        self.backoff_factor = backoff_factor
+        self.error_base_delay = error_base_delay
+        self.error_max_delay = error_max_delay
+        self._clock = clock
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._interval: float = min(base_interval, self.max_interval)
+        self._consecutive_errors: int = 0
+        self._last_poll_at: typing.Optional[float] = None
+
+        # Counters
+        self.polls: int = 0
+        self.changes: int = 0
+        self.errors: int = 0
+        self._gap_total: float = 0.0
+        self._gap_samples: int = 0
+
+    def next_delay(self) -> float:
+        """ Seconds to wait before the next poll. """
+        with self._lock:
+            return self._interval
+
+    def record_poll(self, changed: bool) -> None:
+        """ Records a successful poll (every watched selection read once) and adapts the interval. """
+        now = self._clock()
+        with self._lock:
+            self.polls += 1
+            self._consecutive_errors = 0
+            if changed:
+                self.changes += 1
+                # The change happened at some point since the previous poll: the gap
+                # bounds how late it was seen, it does not measure it
+                if self._last_poll_at is not None:
+                    self._gap_total += now - self._last_poll_at
+                    self._gap_samples += 1
+                self._interval = self.burst_interval
+            else:
+                self._interval = min(self._interval * self.backoff_factor, self.max_interval)
+            self._last_poll_at = now
+
+    def record_error(self) -> float:
+        """ Records a failed clipboard read and returns the jittered retry delay. """
+        with self._lock:
+            self.errors += 1
+            delay = min(self.error_max_delay, self.error_base_delay * (2 ** min(self._consecutive_errors, 16)))
+            self._consecutive_errors += 1
+        # "Equal jitter": keep at least half the delay so retries stay spaced out
+        return delay / 2 + self._rng() * delay / 2
+
+    @property
+    def average_poll_gap(self) -> float:
+        """
+        Mean time, in seconds, between the previous poll and a poll that
+        found a change: an upper bound on how late polling sees a copy.
+        0.0 until a change is polled, so always for event-driven sources,
+        which never report polls.
+        """
+        with self._lock:
+            if not self._gap_samples:
+                return 0.0
+            return self._gap_total / self._gap_samples
+
+    def stats(self) -> typing.Dict[str, float]:
+        return {
+            "polls": self.polls,
+            "changes": self.changes,
+            "errors": self.errors,
+            "interval": self.next_delay(),
+            "average_poll_gap": self.average_poll_gap,
+        }
@@ -0,0 +1,356 @@
+"""
+Clipboard change sources shared by the console and GUI savers.
+
+A change source decides *when* the monitor loop looks at the clipboard.
+Event-driven sources block until the system reports that the selection
+changed, so an idle monitor does not wake up at all. The polling source
+keeps the original "paste every POLLING_INTERVAL seconds" behaviour as a
+fallback for platforms without change notifications. Sources read through a
+ClipboardBackend (clipboard_backend): the system clipboard, or a fake one.
+
+On Linux a source can watch several selections at once (CLIPBOARD and the
+select-to-copy PRIMARY) from the same thread; each change it returns says
+which selection it came from. DebouncedSource holds PRIMARY back until a
+drag-selection has settled.
+"""
+import os
+import queue
+import select
+import collections
+import functools
+import sys
+import threading
+import time
+import typing
+
+from clipboard_backend import ClipboardBackend, SystemClipboard, get_backend
+from clipboard_fingerprint import Fingerprint, fingerprint, is_new_content
+from clipboard_metrics import PASTE_ERRORS, PASTE_SECONDS
+from clipboard_scheduler import PollScheduler
+from clipboard_store import CLIPBOARD, PRIMARY
+
+POLLING_INTERVAL: float = 1  # Seconds, used by the polling fallback
+PUSH_QUEUE_SIZE: int = 1000  # Max pending notifications before copies are dropped
+PRIMARY_DEBOUNCE: float = 0.5  # Seconds PRIMARY must stay unchanged before it is passed on
+
+_INTERRUPT = object()  # Queued by PushSource.interrupt()
+
+
+def supported_selections(selections: typing.Sequence[str]) -> typing.Tuple[str, ...]:
+    """ The given selections minus PRIMARY where there is none (only X11 and Wayland have it). """
+    if sys.platform.startswith("linux"):
+        return tuple(selections)
+    return tuple(selection for selection in selections if selection != PRIMARY)
+
+
+class ChangeSource:
+    """
+    Base class for clipboard change sources.
+
+    wait_for_change() blocks until the clipboard may have changed and returns
+    the candidate text, or None if the timeout expired first. The monitor is
+    still responsible for deciding whether the text is actually new.
+    owner names the application that set the text last returned, when the
+    source can tell (None otherwise); the sensitive-content filter uses it.
+    selection names the selection it was read from, one of selections.
+    Selections are read from backend (get_backend() if not given), or
+    CLIPBOARD through paste_func if there is one. read_func, when set,
+    reads a selection in their place (ClipSpiller.paste streams large
+    clips to disk instead).
+    interrupt() may be called from any thread: the current (or next)
+    wait_for_change() returns None right away, so a stopping monitor does
+    not sit out the rest of its timeout.
+    """
+    name: str = "base"
+    event_driven: bool = False
+
+    def __init__(self, paste_func: typing.Optional[typing.Callable[[], str]] = None,
+                 selections: typing.Sequence[str] = (CLIPBOARD,),
+                 backend: typing.Optional[ClipboardBackend] = None):
+        self.backend = backend or get_backend()
+        self.paste = paste_func or self.backend.paste
+        self.paste_primary = functools.partial(self.backend.paste, PRIMARY)
+        self.read_func: typing.Optional[typing.Callable[[str], typing.Any]] = None
+        self.selections: typing.Tuple[str, ...] = tuple(selections)
+        self.owner: typing.Optional[str] = None
+        self.selection: str = CLIPBOARD
+        self.wakeups: int = 0  # Times wait_for_change() returned control to the monitor
+        self.reads: int = 0    # Clipboard reads (a subprocess spawn per read on Linux)
+
+    def read(self, selection: str = CLIPBOARD) -> str:
+        """ Reads the current text of a selection. """
+        self.reads += 1
+        started = time.perf_counter()
+        try:
+            if self.read_func is not None:
+                return self.read_func(selection)
+            return self.paste() if selection == CLIPBOARD else self.paste_primary()
+        except Exception:
+            PASTE_ERRORS.inc()
+            raise
+        finally:
+            PASTE_SECONDS.observe(time.perf_counter() - started)
+
+    def wait_for_change(self, timeout: typing.Optional[float] = None) -> typing.Optional[str]:
+        raise NotImplementedError
+
+    def interrupt(self) -> None:
+        """ Wakes a blocked wait_for_change(), which then returns None. Sources without a way to wake just time out. """
+
+    def close(self) -> None:
+        """ Releases any resources held by the source. """
+
+
+class PollingSource(ChangeSource):
+    """
+    Reads the clipboard on an interval: fixed, or chosen by a PollScheduler
+    when one is given. Each tick reads every selection, one per
+    wait_for_change() call, and once the last one is read reports the
+    tick to the scheduler as a single poll that changed if any selection
+    did. Monitors do not report polls themselves: a DebouncedSource in
+    between holds PRIMARY reads back from them.
+    """
+    name = "poll"
+
+    def __init__(self, interval: float = POLLING_INTERVAL,
+                 paste_func: typing.Optional[typing.Callable[[], str]] = None,
+                 scheduler: typing.Optional[PollScheduler] = None,
+                 selections: typing.Sequence[str] = (CLIPBOARD,),
+                 backend: typing.Optional[ClipboardBackend] = None):
+        super().__init__(paste_func, selections, backend)
+        self.interval = interval
+        self.scheduler = scheduler
+        self._interrupted = threading.Event()
+        self._due: "collections.deque[str]" = collections.deque()  # Selections still to read this tick
+        self._tick_changed: bool = False
+        self._last: typing.Dict[str, Fingerprint] = {}  # Per selection, what the previous tick read
+
+    def wait_for_change(self, timeout: typing.Optional[float] = None) -> typing.Optional[str]:
+        # Polling cannot know whether anything changed, so every tick is a read.
+        if not self._due:
+            if self._interrupted.wait(self.scheduler.next_delay() if self.scheduler else self.interval):
+                self._interrupted.clear()
+                return None
+            self.wakeups += 1
+            self._due.extend(self.selections)
+            self._tick_changed = False
+        self.selection = self._due.popleft()
+        try:
+            text = self.read(self.selection)
+        except Exception:
+            self._due.clear()  # The monitor backs off through the scheduler; the next tick starts over
+            raise
+        if not self._due and self.scheduler:
+            self.scheduler.record_poll(self._tick_changed)
+        return text
+
+    def read(self, selection: str = CLIPBOARD) -> typing.Any:
+        text = super().read(selection)
+        if selection not in self._last:
+            self._last[selection] = fingerprint(text)  # The first read (the monitor's) is the baseline, blank or not
+        elif is_new_content(text, self._last[selection]):
+            self._tick_changed = True
+            self._last[selection] = fingerprint(text)
+        return text
+
+    def interrupt(self) -> None:
+        self._interrupted.set()
+
+
+class PushSource(ChangeSource):
+    """
+    Source fed by a toolkit change notification, e.g. Qt's QClipboard.dataChanged,
+    or by an event-driven backend's watch().
+
+    push() is called from the notifying thread with the new clipboard text
+    (and its owner, if the toolkit knows it); the monitor thread receives
+    every pushed value in order, so copies made in quick succession are not
+    collapsed into one.
+    """
+    name = "push"
+    event_driven = True
+
+    def __init__(self, paste_func: typing.Optional[typing.Callable[[], str]] = None,
+                 maxsize: int = PUSH_QUEUE_SIZE,
+                 selections: typing.Sequence[str] = (CLIPBOARD,),
+                 backend: typing.Optional[ClipboardBackend] = None):
+        super().__init__(paste_func, selections, backend)
+        self._queue: "queue.Queue[typing.Tuple[str, typing.Optional[str], str]]" = queue.Queue(maxsize=maxsize)
+        self.dropped: int = 0  # Notifications lost because the queue was full
+
+    def push(self, text: str, owner: typing.Optional[str] = None, selection: str = CLIPBOARD) -> None:
+        try:
+            self._queue.put_nowait((text, owner, selection))
+        except queue.Full:
+            self.dropped += 1
+
+    def wait_for_change(self, timeout: typing.Optional[float] = None) -> typing.Optional[str]:
+        try:
+            text, owner, selection = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if text is _INTERRUPT:
+            return None
+        self.owner, self.selection = owner, selection
+        self.wakeups += 1
+        return text
+
+    def interrupt(self) -> None:
+        try:
+            self._queue.put_nowait((_INTERRUPT, None, CLIPBOARD))
+        except queue.Full:
+            pass  # A full queue wakes the monitor anyway
+
+
+class XFixesSource(ChangeSource):
+    """
+    Event-driven source for X11 using XFixes selection-owner notifications.
+
+    The X server tells us whenever a client takes ownership of a watched
+    selection; only then is that selection actually read. All selections
+    share one display connection.
+    """
+    name = "xfixes"
+    event_driven = True
+
+    def __init__(self, selections: typing.Sequence[str] = (CLIPBOARD,),
+                 paste_func: typing.Optional[typing.Callable[[], str]] = None):
+        super().__init__(paste_func, selections)
+        from Xlib import display as xdisplay  # Optional dependency (python-xlib)
+        from Xlib.ext import xfixes
+
+        self._xfixes = xfixes
+        self._display = xdisplay.Display()
+        if not self._display.has_extension("XFIXES"):
+            self._display.close()
+            raise RuntimeError("X server does not support the XFIXES extension")
+        self._display.xfixes_query_version()
+        self._atoms = {self._display.get_atom(selection.upper()): selection for selection in self.selections}
+        root = self._display.screen().root
+        for atom in self._atoms:
+            self._display.xfixes_select_selection_input(root, atom, xfixes.XFixesSetSelectionOwnerNotifyMask)
+        self._display.flush()
+        self._wake_read, self._wake_write = os.pipe()  # interrupt() writes a byte to end the select()
+        os.set_blocking(self._wake_write, False)
+
+    def wait_for_change(self, timeout: typing.Optional[float] = None) -> typing.Optional[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self._display.pending_events():
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _, _ = select.select([self._display, self._wake_read], [], [], remaining)
+                if not ready:
+                    return None
+                if self._wake_read in ready:
+                    os.read(self._wake_read, 512)
+                    return None
+            event = self._display.next_event()
+            self.wakeups += 1
+            if isinstance(event, self._xfixes.SetSelectionOwnerNotify) and event.selection in self._atoms:
+                self.owner = self._owner_name(event.owner)
+                self.selection = self._atoms[event.selection]
+                return self.read(self.selection)
+
+    @staticmethod
+    def _owner_name(window) -> typing.Optional[str]:
+        """ WM_CLASS class of the selection owner ("KeePassXC"); None for toolkit helper windows without one. """
+        try:
+            wm_class = window.get_wm_class()
+        except Exception:  # BadWindow: the owner may already be gone
+            return None
+        return wm_class[1] if wm_class else None
+
+    def interrupt(self) -> None:
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            pass  # Already full of unread wake-ups
+
+    def close(self) -> None:
+        self._display.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+
+class DebouncedSource(ChangeSource):
+    """
+    Wraps another source and holds back changes to the selections in delays
+    until they have stayed the same for that many seconds. Dragging out a
+    PRIMARY selection changes it with every mouse move; only the settled
+    text is passed on. Other selections pass straight through, also while
+    a held one is waiting. Returns None while it is only holding a change.
+    """
+
+    def __init__(self, inner: ChangeSource,
+                 delays: typing.Optional[typing.Dict[str, float]] = None):
+        super().__init__(inner.paste, inner.selections)
+        self.inner = inner
+        self.name = inner.name
+        self.event_driven = inner.event_driven
+        self.delays = {PRIMARY: PRIMARY_DEBOUNCE} if delays is None else delays
+        self._held: typing.Dict[str, typing.Tuple[str, typing.Optional[str], float]] = {}  # selection -> (text, owner, due)
+
+    def read(self, selection: str = CLIPBOARD) -> str:
+        return self.inner.read(selection)
+
+    def wait_for_change(self, timeout: typing.Optional[float] = None) -> typing.Optional[str]:
+        if self._held:
+            until_due = max(0.0, min(due for _, _, due in self._held.values()) - time.monotonic())
+            timeout = until_due if timeout is None else min(timeout, until_due)
+        text = self.inner.wait_for_change(timeout)
+        if text is not None:
+            delay = self.delays.get(self.inner.selection)
+            if not delay:
+                self.owner, self.selection = self.inner.owner, self.inner.selection
+                return text
+            held = self._held.get(self.inner.selection)
+            if held is None or held[0] != text:  # Same text again (polling) keeps its place
+                self._held[self.inner.selection] = (text, self.inner.owner, time.monotonic() + delay)
+        return self._release_due()
+
+    def _release_due(self) -> typing.Optional[str]:
+        now = time.monotonic()
+        for selection, (text, owner, due) in self._held.items():
+            if due <= now:
+                del self._held[selection]
+                self.owner, self.selection = owner, selection
+                return text
+        return None
+
+    def interrupt(self) -> None:
+        self.inner.interrupt()
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def create_change_source(prefer_events: bool = True,
+                         paste_func: typing.Optional[typing.Callable[[], str]] = None,
+                         scheduler: typing.Optional[PollScheduler] = None,
+                         selections: typing.Sequence[str] = (CLIPBOARD,),
+                         read_func: typing.Optional[typing.Callable[[str], typing.Any]] = None,
+                         backend: typing.Optional[ClipboardBackend] = None) -> ChangeSource:
+    """
+    Returns the best available change source for this platform, watching
+    the given selections (PRIMARY is dropped where there is none, and
+    debounced otherwise). Falls back to polling when no event-driven
+    backend can be set up. read_func replaces the source's own reads (see
+    ChangeSource). backend defaults to get_backend(); one that reports its
+    own changes (FakeClipboard) is listened to directly.
+    """
+    selections = supported_selections(selections)
+    backend = backend or get_backend()
+    source: typing.Optional[ChangeSource] = None
+    if prefer_events and backend.event_driven:
+        source = PushSource(paste_func, selections=selections, backend=backend)
+        backend.watch(source.push)
+    elif prefer_events and isinstance(backend, SystemClipboard) and sys.platform.startswith("linux") \
+            and os.environ.get("DISPLAY"):
+        try:
+            source = XFixesSource(selections, paste_func=paste_func)
+        except Exception as e:  # Missing python-xlib, no X server, no XFIXES...
+            print(f"Event-driven clipboard source unavailable ({e}). Falling back to polling.")
+    if source is None:
+        source = PollingSource(paste_func=paste_func, scheduler=scheduler, selections=selections, backend=backend)
+    source.read_func = read_func
+    return DebouncedSource(source) if PRIMARY in selections else source
@@ -0,0 +1,350 @@
+"""
+Storage backends for saved clips.
+
+LogWriter talks to a ClipStore and does not care what is behind it:
+
+* TextLogStore: the original "[timestamp] content" text log.
+* SQLiteStore: a SQLite database in WAL mode with an FTS5 trigram index,
+  so keyword and time-range lookups do not scan the whole history. The
+  index only narrows a keyword search down; matches are plain substring
+  matches, as in the text log.
+
+open_store() picks the backend from the file extension, so pointing the
+savers at "clipboard_log.db" is enough to switch to SQLite, and
+"clipboard_log.enc" to the encrypted log (see clipboard_crypto).
+
+With deduplicated history (see clipboard_dedup) a repeated clip is stored
+as a reference record whose content is REF_PREFIX + the payload digest;
+readers resolve it back to the first record with that digest. Non-text
+clips (images, HTML, file lists) live in a blob store next to the log and
+are logged as BLOB_PREFIX + mime type + digest. Clips taken from a
+selection other than CLIPBOARD (the X11 PRIMARY selection) are logged with
+SELECTION_PREFIX + selection name + " " in front of their content.
+
+These markers are stored in-band, so a clip that itself starts with "@" is
+logged with one more "@" in front (escape_content()); a stored content
+starting with "@@" is always such a clip, never a marker. Readers that hand
+a clip back to the user take the extra "@" off again (unescape_content()).
+"""
+import os
+import re
+import sqlite3
+import typing
+
+from clipboard_fingerprint import DIGEST_SIZE, content_digest
+
+SQLITE_EXTENSIONS: typing.Tuple[str, ...] = (".db", ".sqlite", ".sqlite3")
+ENCRYPTED_EXTENSIONS: typing.Tuple[str, ...] = (".enc",)  # Text log sealed in AES-GCM frames (clipboard_crypto)
+CLIPBOARD: str = "clipboard"  # Selection names a clip can come from: the regular clipboard (Ctrl+C)
+PRIMARY: str = "primary"      # X11 select-to-copy, pasted with the middle mouse button
+
+
+class ClipRecord(typing.NamedTuple):
+    timestamp: str  # "%Y-%m-%d %H:%M:%S"
+    content: str
+    selection: str = CLIPBOARD
+
+
+MARKER_START: str = "@"  # Every in-band marker starts with it; clips that do are escaped by doubling it
+
+
+def escape_content(text: str) -> str:
+    """ The content to log for a clip: one more MARKER_START in front if it could pass for a marker. """
+    return MARKER_START + text if text.startswith(MARKER_START) else text
+
+
+def unescape_content(content: str) -> str:
+    """ The clip a stored content stands for (see escape_content()). Markers come back unchanged. """
+    return content[1:] if content.startswith(MARKER_START * 2) else content
+
+
+SELECTION_PREFIX: str = "@sel:"
+_SELECTION_RE = re.compile(rf"{re.escape(SELECTION_PREFIX)}([a-z]+) ")
+
+
+def format_record(record: ClipRecord) -> str:
+    """ Formats a record the way it appears in the text log. """
+    if record.selection != CLIPBOARD:
+        return f"[{record.timestamp}] {SELECTION_PREFIX}{record.selection} {record.content}\n"
+    return f"[{record.timestamp}] {record.content}\n"
+
+
+def make_record(timestamp: str, body: str) -> ClipRecord:
+    """ Builds a record from a text log entry's body, taking the selection tag off the content. """
+    if body.startswith(SELECTION_PREFIX):
+        match = _SELECTION_RE.match(body)
+        if match:
+            return ClipRecord(timestamp, body[match.end():], match.group(1))
+    return ClipRecord(timestamp, body)
+
+
+REF_PREFIX: str = "@ref:"
+_REF_RE = re.compile(rf"{re.escape(REF_PREFIX)}([0-9a-f]{{{DIGEST_SIZE * 2}}})")
+_RECORD_START_RE = re.compile(r"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ")
+_NEXT_HEADER_RE = re.compile(r"\n\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ")  # Literal prefix: fast to scan for
+
+
+def make_ref(digest: str) -> str:
+    return REF_PREFIX + digest
+
+
+def parse_ref(content: str) -> typing.Optional[str]:
+    """ Returns the digest if content is a reference record, else None. """
+    if not content.startswith(REF_PREFIX):
+        return None
+    match = _REF_RE.fullmatch(content)
+    return match.group(1) if match else None
+
+
+BLOB_PREFIX: str = "@blob:"
+_BLOB_RE = re.compile(rf"{re.escape(BLOB_PREFIX)}([\w.+-]+/[\w.+-]+):([0-9a-f]{{{DIGEST_SIZE * 2}}})")
+
+
+def make_blob_ref(mime_type: str, digest: str) -> str:
+    return f"{BLOB_PREFIX}{mime_type}:{digest}"
+
+
+def parse_blob_ref(content: str) -> typing.Optional[typing.Tuple[str, str]]:
+    """ Returns (mime type, digest) if content refers to a stored blob (see clipboard_blobs), else None. """
+    if not content.startswith(BLOB_PREFIX):
+        return None
+    match = _BLOB_RE.fullmatch(content)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def iter_records(file: typing.Iterable[str]) -> typing.Iterator[ClipRecord]:
+    """
+    Streams records from the lines of a text log. A record starts at a line
+    beginning with "[%Y-%m-%d %H:%M:%S] " and runs until the next such line,
+    so multi-line clips come back whole. Reference records are returned unresolved.
+    """
+    timestamp: typing.Optional[str] = None
+    lines: typing.List[str] = []
+    for line in file:
+        match = _RECORD_START_RE.match(line)
+        if match:
+            if timestamp is not None:
+                yield make_record(timestamp, "".join(lines)[:-1])  # Drop the record's trailing newline
+            timestamp = match.group(1)
+            lines = [line[match.end():]]
+        elif timestamp is not None:
+            lines.append(line)
+    if timestamp is not None:
+        content = "".join(lines)
+        yield make_record(timestamp, content[:-1] if content.endswith("\n") else content)
+
+
+def parse_records(data: str) -> typing.Iterator[ClipRecord]:
+    """ iter_records() for text already in memory: finds the headers with one regex scan instead of line by line. """
+    first = _RECORD_START_RE.match(data)
+    timestamp, start = (first.group(1), first.end()) if first else (None, 0)
+    for match in _NEXT_HEADER_RE.finditer(data):
+        if timestamp is not None:
+            yield make_record(timestamp, data[start:match.start()])  # The match starts at the record's last newline
+        timestamp, start = match.group(1), match.end()
+    if timestamp is not None:
+        body = data[start:]
+        yield make_record(timestamp, body[:-1] if body.endswith("\n") else body)
+
+
+def iter_log_records(path: str) -> typing.Iterator[ClipRecord]:
+    """ Streams records from a single uncompressed text log file. """
+    with open(path, encoding='utf-8', errors='replace') as file:
+        yield from iter_records(file)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    content TEXT NOT NULL,
+    digest TEXT,
+    selection TEXT
+);
+CREATE INDEX IF NOT EXISTS clips_ts ON clips(ts);
+"""
+
+_DIGEST_INDEX = "CREATE INDEX IF NOT EXISTS clips_digest ON clips(digest);"
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS clips_fts USING fts5(content, content='clips', content_rowid='id', {tokenize});
+CREATE TRIGGER IF NOT EXISTS clips_ai AFTER INSERT ON clips BEGIN
+    INSERT INTO clips_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+class ClipStore:
+    """ Interface for clip storage backends. Used from a single (writer) thread. """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        raise NotImplementedError
+
+    def sync(self, durable: bool = False) -> None:
+        """ Makes written records visible to readers; durable=True also forces them to disk. """
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class TextLogStore(ClipStore):
+    """ Appends records to the plain text log, keeping the file open. """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file: typing.TextIO = open(path, 'a', encoding='utf-8', errors='surrogatepass')
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        self._file.write("".join(format_record(record) for record in records))
+
+    def sync(self, durable: bool = False) -> None:
+        self._file.flush()
+        if durable:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _has_fts5(connection: sqlite3.Connection, tokenize: str = "") -> bool:
+    try:
+        connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x{tokenize})")
+        connection.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _fts_prefilter(db: sqlite3.Connection, keyword: str, ignore_case: bool) -> bool:
+    """ True if the clips_fts index can narrow a substring search for keyword down without missing a match. """
+    row = db.execute("SELECT sql FROM sqlite_master WHERE name = 'clips_fts'").fetchone()
+    # A trigram index (SQLite 3.34+) finds any substring of 3+ characters, case-folded. Databases made
+    # with the word tokenizer would miss matches inside words, and Unicode case folding is not Python's.
+    return row is not None and "trigram" in row[0] and len(keyword) >= 3 and (not ignore_case or keyword.isascii())
+
+
+def _contains_folded(content: str, needle: str) -> bool:
+    return content is not None and needle in content.lower()
+
+
+def record_row(record: ClipRecord) -> typing.Tuple[str, str, str, typing.Optional[str]]:
+    """ The clips table row for a record. Rows can be built off the writer thread (see clipboard_transfer). """
+    content = record.content
+    if not content.isascii():
+        # SQLite only takes valid UTF-8: lone surrogates read back as U+FFFD, as they do from a text log
+        content = content.encode("utf-8", "surrogatepass").decode("utf-8", "replace")
+    return (record.timestamp, content, parse_ref(record.content) or content_digest(record.content),
+            None if record.selection == CLIPBOARD else record.selection)
+
+
+class SQLiteStore(ClipStore):
+    """
+    Stores clips in SQLite (WAL mode) with an FTS5 index over the content.
+    Each batch is inserted in a single transaction. Every row carries the
+    payload digest, so reference rows resolve with an indexed lookup.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; durability comes from sync(durable=True)
+        self._db.executescript(_SCHEMA)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(clips)")]
+        if "digest" not in columns:  # Database created before digests were stored
+            self._db.execute("ALTER TABLE clips ADD COLUMN digest TEXT")
+        if "selection" not in columns:  # Or before selections were recorded (NULL: CLIPBOARD)
+            self._db.execute("ALTER TABLE clips ADD COLUMN selection TEXT")
+        self._db.execute(_DIGEST_INDEX)
+        self.fts_enabled = _has_fts5(self._db)
+        if self.fts_enabled:
+            trigram = _has_fts5(self._db, ", tokenize='trigram'")
+            self._db.executescript(_FTS_SCHEMA.format(tokenize="tokenize='trigram'" if trigram else ""))
+        self._db.commit()
+
+    def write_batch(self, records: typing.Sequence[ClipRecord]) -> None:
+        self.insert_rows(record_row(record) for record in records)
+
+    def insert_rows(self, rows: typing.Iterable[typing.Tuple[str, str, str, typing.Optional[str]]]) -> None:
+        """ Inserts (ts, content, digest, selection) rows made by record_row(), in one transaction. """
+        with self._db:
+            self._db.executemany("INSERT INTO clips (ts, content, digest, selection) VALUES (?, ?, ?, ?)", rows)
+
+    def sync(self, durable: bool = False) -> None:
+        if durable:
+            self._db.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def is_sqlite_path(path: str) -> bool:
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+def is_encrypted_path(path: str) -> bool:
+    return path.lower().endswith(ENCRYPTED_EXTENSIONS)
+
+
+def open_store(path: str) -> ClipStore:
+    """ Opens the backend matching the file extension. """
+    if is_sqlite_path(path):
+        return SQLiteStore(path)
+    if is_encrypted_path(path):
+        from clipboard_crypto import EncryptedLogStore  # Needs the optional 'cryptography' package
+        return EncryptedLogStore(path)
+    return TextLogStore(path)
+
+
+def query_db(path: str,
+             keyword: typing.Optional[str] = None,
+             start: typing.Optional[str] = None,
+             end: typing.Optional[str] = None,
+             limit: int = 100,
+             ignore_case: bool = False) -> typing.List[ClipRecord]:
+    """
+    Returns the newest clips containing keyword (a substring, as in the text
+    log) and/or in the [start, end] timestamp range ("%Y-%m-%d %H:%M:%S"
+    strings, either may be omitted).
+    Opens its own read connection, so it can run while a writer is active.
+    """
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        clauses: typing.List[str] = []
+        params: typing.List[typing.Any] = []
+        if start:
+            clauses.append("c.ts >= ?")
+            params.append(start)
+        if end:
+            clauses.append("c.ts <= ?")
+            params.append(end)
+        if keyword:
+            # Match on the digest so deduplicated repeats of a matching payload are found too
+            matches = [f"o.content NOT LIKE '{REF_PREFIX}%'"]
+            if _fts_prefilter(db, keyword, ignore_case):
+                matches.append("o.id IN (SELECT rowid FROM clips_fts WHERE clips_fts MATCH ?)")
+                params.append('"' + keyword.replace('"', '""') + '"')  # Phrase query, no FTS syntax
+            if ignore_case:
+                # Python's lower(), as the text log search uses; SQLite's only folds ASCII
+                db.create_function("contains_folded", 2, _contains_folded, deterministic=True)
+                matches.append("contains_folded(o.content, ?)")
+                params.append(keyword.lower())
+            else:
+                matches.append("instr(o.content, ?) > 0")
+                params.append(keyword)
+            clauses.append(f"c.digest IN (SELECT o.digest FROM clips o WHERE {' AND '.join(matches)})")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = [row[1] for row in db.execute("PRAGMA table_info(clips)")]
+        selection = "c.selection" if "selection" in columns else "NULL"  # Read-only: cannot add the column here
+        # Reference rows take their content from the first row with the same digest
+        rows = db.execute(
+            f"SELECT c.ts, CASE WHEN c.content LIKE '{REF_PREFIX}%' THEN "
+            f"(SELECT o.content FROM clips o WHERE o.digest = c.digest ORDER BY o.id LIMIT 1) "
+            f"ELSE c.content END, {selection} FROM clips c {where} ORDER BY c.id DESC LIMIT ?",
+            (*params, limit)).fetchall()
+        return [ClipRecord(ts, content, selection or CLIPBOARD) for ts, content, selection in rows]
+    finally:
+        db.close()
@@ -0,0 +1,536 @@
+"""
+Bulk export, import and compaction of the clipboard history.
+
+transfer() copies a whole history from one format to another without
+loading it into memory:
+
+* text: the "[timestamp] content" log (rotated segments included on input),
+* jsonl: one {"timestamp", "content", "selection"} object per line,
+* sqlite: a SQLiteStore database (appended to if it exists),
+* segments: compressed closed segments of a text log (see clipboard_rotation).
+  Importing into a text log writes segments, so imported history sits
+  next to the active file without rewriting it.
+
+Inputs are cut into CHUNK_BYTES pieces whose boundaries are moved forward
+to the next record header (or line, for JSON Lines), so every record lands
+in exactly one chunk; compressed segments are one chunk each and SQLite is
+cut into id ranges. Chunks are parsed and encoded on a process pool and
+written in input order, with at most IN_FLIGHT_PER_WORKER chunks per worker
+queued or waiting to be written.
+
+dedup=True drops a record identical to one already written (same time,
+selection and content: the same history imported twice, overlapping
+exports). compact=True writes a repeated payload as a REF_PREFIX reference,
+for text and SQLite targets where readers resolve them. Either needs the
+history seen so far, so a chunk takes two trips to the pool: the first
+returns 64-bit keys for its records, the parent decides in input order
+which to keep (~70 bytes of memory per distinct record), and the second
+encodes the chunk with that decision. References in the source are
+always resolved to their original, so no target receives a reference it
+cannot resolve (compact writes its own).
+"""
+import array
+import collections
+import concurrent.futures
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import sqlite3
+import time
+import typing
+from datetime import datetime
+
+from clipboard_client import encode_message, record_from_json, record_to_json
+from clipboard_fingerprint import content_digest
+from clipboard_history import TIMESTAMP_FORMAT, HistoryLog
+from clipboard_rotation import COMPRESSION, MAX_SEGMENT_BYTES, list_segments, open_segment, segment_path, zstandard
+from clipboard_store import (REF_PREFIX, ClipRecord, SQLiteStore, format_record, is_encrypted_path, is_sqlite_path,
+                             iter_records, make_ref, parse_records, parse_ref, record_row)
+
+CHUNK_BYTES: int = 16 * 1024 * 1024   # Input bytes per task, before moving the boundary to the next record
+SQLITE_CHUNK_ROWS: int = 50000        # Rows per task when reading a SQLite history
+IN_FLIGHT_PER_WORKER: int = 2         # Chunks per worker queued or waiting to be written; bounds memory
+WORKERS: typing.Optional[int] = None  # Process pool size, None = one per CPU
+
+TEXT: str = "text"
+JSONL: str = "jsonl"
+SQLITE: str = "sqlite"
+SEGMENTS: str = "segments"
+FORMATS: typing.Tuple[str, ...] = (TEXT, JSONL, SQLITE, SEGMENTS)
+JSONL_EXTENSIONS: typing.Tuple[str, ...] = (".jsonl", ".ndjson")
+
+_DROP, _KEEP, _AS_REF = 0, 1, 2  # Per-record decisions sent back with a chunk
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+
+
+class Chunk(typing.NamedTuple):
+    kind: str   # TEXT, JSONL or SQLITE: how the range is read
+    path: str
+    start: int  # Byte offset, or first row id for SQLITE
+    end: int    # Exclusive; -1 reads the whole file (compressed segments)
+
+
+class ChunkOutput(typing.NamedTuple):
+    data: typing.Any  # Encoded bytes, or clips table rows for a SQLite target
+    records: int
+    size: int         # Encoded bytes before compression (content bytes for rows)
+    last_timestamp: typing.Optional[str]
+
+
+def detect_format(path: str) -> str:
+    """ TEXT, JSONL or SQLITE, from the file extension. """
+    if is_sqlite_path(path):
+        return SQLITE
+    if path.lower().endswith(JSONL_EXTENSIONS):
+        return JSONL
+    return TEXT
+
+
+# --- Planning (parent process) ---
+
+def _ranges(size: int, chunk_bytes: int, next_start: typing.Callable[[int], int]) -> typing.List[typing.Tuple[int, int]]:
+    bounds = [0]
+    while bounds[-1] < size:
+        wanted = bounds[-1] + chunk_bytes
+        bounds.append(size if wanted >= size else next_start(wanted))
+    return list(zip(bounds, bounds[1:]))
+
+
+def _text_chunks(path: str, chunk_bytes: int) -> typing.List[Chunk]:
+    with HistoryLog(path) as log:
+        return [Chunk(TEXT, path, start, end) for start, end in _ranges(log.size, chunk_bytes, log.next_record_start)]
+
+
+def _jsonl_chunks(path: str, chunk_bytes: int) -> typing.List[Chunk]:
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if not size:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            def next_line(offset: int) -> int:
+                newline = mm.find(b"\n", offset - 1)
+                return size if newline == -1 else newline + 1
+            return [Chunk(JSONL, path, start, end) for start, end in _ranges(size, chunk_bytes, next_line)]
+
+
+def _sqlite_chunks(path: str) -> typing.List[Chunk]:
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        first, last = db.execute("SELECT MIN(id), MAX(id) FROM clips").fetchone()
+    finally:
+        db.close()
+    if first is None:
+        return []
+    return [Chunk(SQLITE, path, start, min(start + SQLITE_CHUNK_ROWS, last + 1))
+            for start in range(first, last + 1, SQLITE_CHUNK_ROWS)]
+
+
+def plan_chunks(path: str, chunk_bytes: int = CHUNK_BYTES) -> typing.List[Chunk]:
+    """ Splits a history into chunks, oldest first. A text log includes its rotated segments. """
+    fmt = detect_format(path)
+    if fmt == SQLITE:
+        return _sqlite_chunks(path)
+    if fmt == JSONL:
+        return _jsonl_chunks(path, chunk_bytes)
+    chunks: typing.List[Chunk] = []
+    for segment in list_segments(path):
+        if segment.compressed:
+            chunks.append(Chunk(TEXT, segment.path, 0, -1))  # A compressed stream cannot be entered midway
+        else:
+            chunks.extend(_text_chunks(segment.path, chunk_bytes))
+    if os.path.exists(path):
+        chunks.extend(_text_chunks(path, chunk_bytes))
+    return chunks
+
+
+def _chunk_bytes(chunk: Chunk) -> int:
+    return os.path.getsize(chunk.path) if chunk.end < 0 else chunk.end - chunk.start
+
+
+# --- Workers ---
+
+def _parse_jsonl(data: str, path: str) -> typing.Iterator[ClipRecord]:
+    for line in data.split("\n"):  # Not splitlines(): content may hold U+2028 and friends unescaped
+        if not line.strip():
+            continue
+        record = record_from_json(json.loads(line))
+        if not _TIMESTAMP_RE.fullmatch(record.timestamp):
+            raise ValueError(f"{path}: bad timestamp {record.timestamp!r} (expected YYYY-mm-dd HH:MM:SS)")
+        yield record
+
+
+def _read_rows(chunk: Chunk) -> typing.Iterator[ClipRecord]:
+    db = sqlite3.connect(f"file:{chunk.path}?mode=ro", uri=True)
+    try:
+        columns = [row[1] for row in db.execute("PRAGMA table_info(clips)")]
+        selection = "c.selection" if "selection" in columns else "NULL"
+        # References are resolved the way query_db() does; the original may sit in another chunk
+        rows = db.execute(
+            f"SELECT c.ts, CASE WHEN c.content LIKE '{REF_PREFIX}%' THEN "
+            f"(SELECT o.content FROM clips o WHERE o.digest = c.digest ORDER BY o.id LIMIT 1) "
+            f"ELSE c.content END, {selection} FROM clips c WHERE c.id >= ? AND c.id < ? ORDER BY c.id",
+            (chunk.start, chunk.end))
+        for ts, content, sel in rows:
+            yield ClipRecord(ts, content) if sel is None else ClipRecord(ts, content, sel)
+    finally:
+        db.close()
+
+
+def _read_compressed(path: str) -> typing.Iterator[ClipRecord]:
+    # A reference's original is earlier in the same file (see clipboard_dedup). The stream
+    # cannot be searched backwards, so a first pass finds which originals to keep.
+    with open_segment(path) as file:
+        wanted = {digest for digest in (parse_ref(record.content) for record in iter_records(file)) if digest}
+    originals: typing.Dict[str, str] = {}
+    with open_segment(path) as file:
+        for record in iter_records(file):
+            digest = parse_ref(record.content) if wanted else None
+            if digest is not None:
+                if digest in originals:
+                    record = record._replace(content=originals[digest])
+            elif wanted:
+                digest = content_digest(record.content)
+                if digest in wanted:
+                    originals.setdefault(digest, record.content)
+            yield record
+
+
+def _read_text(chunk: Chunk) -> typing.Iterator[ClipRecord]:
+    with HistoryLog(chunk.path) as log:
+        data = log.raw(chunk.start, chunk.end)
+        if REF_PREFIX.encode("ascii") not in data:  # Not deduplicated: parse the chunk in one go
+            yield from parse_records(data.decode("utf-8", "replace"))
+            return
+        del data
+        # References resolve against the whole file, so an original in an earlier chunk is found too
+        pos = chunk.start
+        while pos < chunk.end:
+            record, pos = log.record_at(pos)
+            yield record
+
+
+def read_chunk(chunk: Chunk) -> typing.Iterator[ClipRecord]:
+    """ Records of one chunk, in order, with text log references resolved. """
+    if chunk.kind == SQLITE:
+        yield from _read_rows(chunk)
+        return
+    if chunk.end < 0:
+        yield from _read_compressed(chunk.path)
+        return
+    if chunk.kind == TEXT:
+        # Chunks start at a record, so no multi-byte character is cut in half
+        yield from _read_text(chunk)
+        return
+    with open(chunk.path, "rb") as file:
+        file.seek(chunk.start)
+        data = file.read(chunk.end - chunk.start).decode("utf-8", "replace")
+    yield from _parse_jsonl(data, chunk.path)
+
+
+def chunk_keys(chunk: Chunk) -> typing.Tuple[bytes, bytes]:
+    """
+    First pass for dedup/compact: a 64-bit key per record (time, selection
+    and payload digest) and a 64-bit payload key (0 for reference records),
+    as packed arrays so they cross the process boundary cheaply.
+    """
+    keys, payloads = array.array("Q"), array.array("Q")
+    for record in read_chunk(chunk):
+        ref = parse_ref(record.content)
+        digest = ref or content_digest(record.content)
+        identity = f"{record.timestamp}\0{record.selection}\0{digest}".encode("utf-8", "surrogatepass")
+        keys.append(int.from_bytes(hashlib.blake2b(identity, digest_size=8).digest(), "big"))
+        payloads.append(0 if ref else int(digest[:16], 16) or 1)
+    return keys.tobytes(), payloads.tobytes()
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    # Each chunk is its own zstd frame / gzip member; concatenated they read back as one stream
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def encode_chunk(chunk: Chunk, target_format: str, mask: typing.Optional[bytes] = None,
+                 compression: typing.Optional[str] = None) -> ChunkOutput:
+    """ Second pass: encodes the records of a chunk for the target, keeping or referencing them as mask says. """
+    if target_format == SQLITE:
+        encode: typing.Callable[[ClipRecord], typing.Any] = record_row
+    elif target_format == JSONL:
+        encode = lambda record: encode_message(record_to_json(record))  # noqa: E731
+    else:
+        encode = lambda record: format_record(record).encode("utf-8", "replace")  # noqa: E731
+    out: typing.List[typing.Any] = []
+    last: typing.Optional[str] = None
+    for i, record in enumerate(read_chunk(chunk)):
+        if mask is not None:
+            if mask[i] == _DROP:
+                continue
+            if mask[i] == _AS_REF:
+                record = record._replace(content=make_ref(content_digest(record.content)))
+        out.append(encode(record))
+        last = record.timestamp
+    if target_format == SQLITE:
+        return ChunkOutput(out, len(out), sum(len(row[1].encode("utf-8", "replace")) for row in out), last)
+    data = b"".join(out)
+    size = len(data)
+    return ChunkOutput(_compress(data, compression) if compression else data, len(out), size, last)
+
+
+# --- Ordering and decisions (parent process) ---
+
+class _InlineExecutor:
+    """ Runs tasks in the calling process, for workers=1: no pool start-up and no pickling. """
+
+    def submit(self, fn: typing.Callable[..., typing.Any], *args: typing.Any,
+               **kwargs: typing.Any) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+def _ordered(executor: typing.Any, fn: typing.Callable[[Chunk], typing.Any], chunks: typing.Iterable[Chunk],
+             window: int) -> typing.Iterator[typing.Any]:
+    """ fn(chunk) for every chunk, computed on the executor, yielded in input order with at most window pending. """
+    pending: "collections.deque[concurrent.futures.Future]" = collections.deque()
+    for chunk in chunks:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, chunk))
+    while pending:
+        yield pending.popleft().result()
+
+
+class _Decisions:
+    """ Which records to keep, decided in input order from the keys of chunk_keys(). """
+
+    def __init__(self, dedup: bool, compact: bool):
+        self.dedup = dedup
+        self.compact = compact
+        self._records: typing.Set[int] = set()
+        self._payloads: typing.Set[int] = set()  # Payloads written in full
+        self.records = 0
+        self.duplicates = 0
+        self.references = 0
+
+    def decide(self, keys: bytes, payloads: bytes) -> bytes:
+        key_array, payload_array = array.array("Q"), array.array("Q")
+        key_array.frombytes(keys)
+        payload_array.frombytes(payloads)
+        mask = bytearray(len(key_array))
+        self.records += len(key_array)
+        for i, (key, payload) in enumerate(zip(key_array, payload_array)):
+            if self.dedup:
+                if key in self._records:
+                    self.duplicates += 1
+                    continue
+                self._records.add(key)
+            if self.compact and payload:
+                if payload in self._payloads:
+                    mask[i] = _AS_REF
+                    self.references += 1
+                    continue
+                self._payloads.add(payload)
+            mask[i] = _KEEP
+        return bytes(mask)
+
+
+def _pipeline(executor: typing.Any, chunks: typing.List[Chunk], window: int, target_format: str,
+              compression: typing.Optional[str],
+              decisions: typing.Optional[_Decisions]) -> typing.Iterator[ChunkOutput]:
+    """ Encoded chunks in input order. With decisions, each chunk's keys are decided before it is encoded. """
+    encode = functools.partial(encode_chunk, target_format=target_format, compression=compression)
+    if decisions is None:
+        yield from _ordered(executor, encode, chunks, window)
+        return
+    todo = collections.deque(chunks)
+    keyed: "collections.deque[typing.Tuple[Chunk, concurrent.futures.Future]]" = collections.deque()
+    encoded: "collections.deque[concurrent.futures.Future]" = collections.deque()
+    while todo or keyed or encoded:
+        while todo and len(keyed) + len(encoded) < window:
+            chunk = todo.popleft()
+            keyed.append((chunk, executor.submit(chunk_keys, chunk)))
+        # Decide as soon as the oldest keys are in; otherwise hand out the oldest finished chunk
+        if keyed and (not encoded or keyed[0][1].done()):
+            chunk, future = keyed.popleft()
+            encoded.append(executor.submit(encode, chunk, mask=decisions.decide(*future.result())))
+        else:
+            yield encoded.popleft().result()
+
+
+# --- Targets ---
+
+class _FileSink:
+    """ A new text log or JSON Lines file. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "xb")  # Never overwrite a history
+
+    def write(self, output: ChunkOutput) -> None:
+        self._file.write(output.data)
+
+    def finish(self) -> typing.List[str]:
+        self._file.close()
+        return [self.path]
+
+    def abort(self) -> None:
+        self._file.close()
+        os.remove(self.path)
+
+
+class _SQLiteSink:
+    """ A SQLite history, new or existing. Each chunk is one transaction; an aborted run keeps what was committed. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._store = SQLiteStore(path)
+
+    def write(self, output: ChunkOutput) -> None:
+        self._store.insert_rows(output.data)
+
+    def finish(self) -> typing.List[str]:
+        self._store.close()
+        return [self.path]
+
+    def abort(self) -> None:
+        self._store.close()
+
+
+class _SegmentSink:
+    """
+    Closed, compressed segments of the text log at path. A segment is named
+    after its last record and is renamed into place only once complete, so
+    readers never see a partial one.
+    """
+
+    def __init__(self, path: str, compression: str, max_bytes: int = MAX_SEGMENT_BYTES):
+        self.path = path
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self._tmp = f"{path}.import-{os.getpid()}.tmp"
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self._size = 0
+        self._last: typing.Optional[str] = None
+        self._written: typing.List[str] = []
+
+    def write(self, output: ChunkOutput) -> None:
+        if not output.records:
+            return
+        if self._file is None:
+            self._file = open(self._tmp, "wb")
+        self._file.write(output.data)
+        self._size += output.size
+        self._last = output.last_timestamp
+        if self._size >= self.max_bytes:
+            self._close_segment()
+
+    def _close_segment(self) -> None:
+        self._file.close()
+        self._file = None
+        self._size = 0
+        stamp = datetime.strptime(self._last, TIMESTAMP_FORMAT).strftime("%Y%m%d-%H%M%S")
+        taken = {segment.stamp for segment in list_segments(self.path)}
+        # The sub-second field numbers segments closed in the same second, in order
+        stamp = next(f"{stamp}-{n:06d}" for n in itertools.count() if f"{stamp}-{n:06d}" not in taken)
+        path = segment_path(self.path, stamp, self.compression)
+        os.replace(self._tmp, path)
+        self._written.append(path)
+
+    def finish(self) -> typing.List[str]:
+        if self._file is not None:
+            self._close_segment()
+        return self._written
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._tmp)
+
+
+def _open_sink(path: str, target_format: str) -> typing.Any:
+    if target_format == SQLITE:
+        return _SQLiteSink(path)
+    if target_format == SEGMENTS:
+        return _SegmentSink(path, COMPRESSION)
+    return _FileSink(path)
+
+
+def transfer(source: str, target: str, target_format: typing.Optional[str] = None,
+             workers: typing.Optional[int] = WORKERS, dedup: bool = False, compact: bool = False,
+             chunk_bytes: int = CHUNK_BYTES) -> typing.Dict[str, typing.Any]:
+    """
+    Copies the history at source (text log with its segments, JSON Lines or
+    SQLite) to target in target_format (default: from target's extension;
+    SEGMENTS must be asked for). Text and JSON Lines targets must not exist.
+    With dedup or compact, records already in a SQLite or segments target
+    count as seen. Returns counters and the paths written.
+    """
+    target_format = target_format or detect_format(target)
+    if target_format not in FORMATS:
+        raise ValueError(f"Unknown format {target_format!r} (use one of {', '.join(FORMATS)})")
+    if compact and target_format not in (TEXT, SQLITE):
+        raise ValueError("compact writes references, which only text logs and SQLite resolve")
+    if is_encrypted_path(source) or is_encrypted_path(target):
+        raise ValueError("Encrypted logs cannot be transferred; workers would need the key (see clipboard_crypto)")
+    if os.path.abspath(source) == os.path.abspath(target):
+        raise ValueError("Source and target are the same history")
+    if not os.path.exists(source) and not list_segments(source):
+        raise FileNotFoundError(f"No history found at {source}")
+    if target_format in (TEXT, JSONL) and os.path.exists(target):
+        raise FileExistsError(f"{target} already exists")
+
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    window = workers * IN_FLIGHT_PER_WORKER
+    chunks = plan_chunks(source, chunk_bytes)
+    decisions = _Decisions(dedup, compact) if dedup or compact else None
+    bytes_read = os.path.getsize(source) if is_sqlite_path(source) else sum(map(_chunk_bytes, chunks))
+    stats: typing.Dict[str, typing.Any] = {"records_read": 0, "records_written": 0, "duplicates": 0,
+                                           "references": 0, "bytes_read": bytes_read, "bytes_written": 0,
+                                           "workers": workers}
+    executor: typing.Any = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else _InlineExecutor()
+    try:
+        if decisions is not None and target_format in (SQLITE, SEGMENTS) and \
+                (os.path.exists(target) or list_segments(target)):
+            for keys in _ordered(executor, chunk_keys, plan_chunks(target, chunk_bytes), window):
+                decisions.decide(*keys)
+            decisions.records = decisions.duplicates = decisions.references = 0
+        sink = _open_sink(target, target_format)
+        try:
+            for output in _pipeline(executor, chunks, window, target_format,
+                                    COMPRESSION if target_format == SEGMENTS else None, decisions):
+                sink.write(output)
+                stats["records_written"] += output.records
+                stats["bytes_written"] += output.size
+        except BaseException:
+            sink.abort()
+            raise
+        stats["paths"] = sink.finish()
+    finally:
+        executor.shutdown(wait=True)
+    if decisions is not None:
+        stats.update(records_read=decisions.records, duplicates=decisions.duplicates,
+                     references=decisions.references)
+    else:
+        stats["records_read"] = stats["records_written"]
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def format_stats(stats: typing.Dict[str, typing.Any]) -> str:
+    rate = stats["bytes_read"] / stats["seconds"] / 1e6 if stats["seconds"] else 0.0
+    return (f"{stats['records_read']} records read, {stats['records_written']} written "
+            f"({stats['duplicates']} duplicates dropped, {stats['references']} written as references)\n"
+            f"{stats['bytes_read']} bytes in, {stats['bytes_written']} bytes out in {stats['seconds']:.2f} s "
+            f"({rate:.1f} MB/s, {stats['workers']} workers)")
@@ -0,0 +1,231 @@
+"""
+Buffered log writer shared by the console and GUI savers.
+
+The monitor hands finished records to LogWriter.submit() and goes straight
+back to watching the clipboard. A dedicated writer thread keeps the log
+file open, groups queued records into batches and flushes them when the
+batch is full or the time budget runs out. fsync is optional and governed
+by FSYNC_POLICY. Where the records end up is decided by the ClipStore that
+open_store() picks for the path (text log or SQLite); text logs rotate
+according to ROTATION.
+"""
+import queue
+import threading
+import time
+import typing
+
+from clipboard_dedup import DedupStore
+from clipboard_metrics import (BYTES_WRITTEN, PERSIST_SECONDS, RECORDS_DROPPED, RECORDS_WRITTEN, WRITE_SECONDS,
+                               WRITER_QUEUE_DEPTH, record_error, text_bytes, trace_event)
+from clipboard_rotation import RotationPolicy, open_rotating_store
+from clipboard_store import ClipRecord, ClipStore, format_record  # noqa: F401 (re-exported)
+
+QUEUE_SIZE: int = 1000        # Records waiting for the writer before submit() applies backpressure
+BATCH_SIZE: int = 64          # Max records per write
+FLUSH_INTERVAL: float = 0.5   # Seconds a record may wait in a partial batch
+SUBMIT_TIMEOUT: float = 2.0   # Seconds submit() blocks on a full queue before dropping the record
+
+FSYNC_NEVER: str = "never"        # Leave it to the OS (same durability as the old open/close)
+FSYNC_ALWAYS: str = "always"      # fsync after every flushed batch
+FSYNC_INTERVAL: str = "interval"  # fsync at most every FSYNC_EVERY seconds
+FSYNC_POLICY: str = FSYNC_NEVER
+FSYNC_EVERY: float = 5.0
+DEDUP_HISTORY: bool = False  # Store repeated payloads once (see clipboard_dedup)
+ROTATION: typing.Optional[RotationPolicy] = RotationPolicy()  # None disables log rotation
+
+
+class _SetPath(typing.NamedTuple):
+    path: str
+
+
+class _Pending(typing.NamedTuple):
+    record: ClipRecord
+    submitted: float  # time.monotonic() at submit(), for the detect-to-persist latency
+
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Writes ClipRecords to a ClipStore from a background thread.
+    on_error(path, exception) is called from the writer thread if a batch cannot be written;
+    that batch is dropped and the thread carries on with the next one.
+    """
+
+    def __init__(self, path: str,
+                 queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 fsync_policy: str = FSYNC_POLICY,
+                 fsync_every: float = FSYNC_EVERY,
+                 dedup: bool = DEDUP_HISTORY,
+                 rotation: typing.Optional[RotationPolicy] = ROTATION,
+                 on_error: typing.Optional[typing.Callable[[str, Exception], None]] = None):
+        if fsync_policy not in (FSYNC_NEVER, FSYNC_ALWAYS, FSYNC_INTERVAL):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_every = fsync_every
+        self.dedup = dedup
+        self.rotation = rotation
+        self.on_error = on_error
+        self._queue: "queue.Queue[typing.Any]" = queue.Queue(maxsize=queue_size)
+        self._store: typing.Optional[ClipStore] = None
+        self._thread: typing.Optional[threading.Thread] = None
+        self._last_fsync: float = 0.0
+
+        # Stats
+        self.written: int = 0
+        self.dropped: int = 0
+        self.batches: int = 0
+        self.last_flush_latency: float = 0.0
+        self.max_flush_latency: float = 0.0
+        self._flush_latency_total: float = 0.0
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+            self._thread.start()
+            WRITER_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def submit(self, record: ClipRecord, timeout: float = SUBMIT_TIMEOUT) -> bool:
+        """ Queues a record for writing. Returns False if it was dropped because the queue stayed full. """
+        try:
+            self._queue.put(_Pending(record, time.monotonic()), timeout=timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            RECORDS_DROPPED.inc()
+            return False
+
+    def set_path(self, path: str) -> None:
+        """ Switches to a new log file; records queued before the call still go to the old one. """
+        self._queue.put(_SetPath(path))
+
+    def close(self, timeout: typing.Optional[float] = None) -> None:
+        """
+        Writes everything still queued, closes the file and stops the thread.
+        By default waits as long as that takes. With a timeout it stops waiting
+        after timeout seconds and reports the records not written yet, which
+        are lost if the process exits before the thread gets to them.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            with self._queue.mutex:
+                queued = sum(isinstance(item, _Pending) for item in self._queue.queue)
+            print(f"Log writer still busy after {timeout} s: {queued} queued records not written to {self.path} yet")
+        self._thread = None
+
+    def stats(self) -> typing.Dict[str, float]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": self._flush_latency_total / self.batches if self.batches else 0.0,
+        }
+
+    def dedup_stats(self) -> typing.Optional[typing.Dict[str, float]]:
+        """ Dedup ratio and bytes saved for the current file, or None if dedup is off or nothing was written yet. """
+        store = self._store
+        return store.stats() if isinstance(store, DedupStore) else None
+
+    # --- Writer thread ---
+
+    def _run(self) -> None:
+        batch: typing.List[_Pending] = []
+        deadline: typing.Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Time budget for the partial batch ran out
+
+            if isinstance(item, _Pending):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, time budget spent, or a command: flush what we have first
+            if batch:
+                self._write_batch(batch)
+                batch = []
+            deadline = None
+
+            if isinstance(item, _SetPath):
+                self._close_store()
+                self.path = item.path
+            elif item is _STOP:
+                self._close_store()
+                return
+
+    def _open_store(self) -> ClipStore:
+        if self._store is None:
+            store = open_rotating_store(self.path, self.rotation)
+            # The dedup index is loaded here, on the writer thread, so a large history doesn't delay monitoring
+            self._store = DedupStore(store) if self.dedup else store
+        return self._store
+
+    def _close_store(self) -> None:
+        if self._store is not None:
+            try:
+                self._sync(force=self.fsync_policy != FSYNC_NEVER)
+                self._store.close()
+            except Exception as e:
+                self._report(e)
+            self._store = None
+
+    def _sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        durable = force or self.fsync_policy == FSYNC_ALWAYS or \
+            (self.fsync_policy == FSYNC_INTERVAL and now - self._last_fsync >= self.fsync_every)
+        self._store.sync(durable)
+        if durable:
+            self._last_fsync = now
+
+    def _write_batch(self, batch: typing.List[_Pending]) -> None:
+        started = time.perf_counter()
+        records = [pending.record for pending in batch]
+        try:
+            self._open_store().write_batch(records)
+            self._sync()
+        except Exception as e:  # Not only I/O: a bad record must not kill the thread and lose every later clip
+            if self._store is not None:
+                try:
+                    self._store.close()
+                except Exception:
+                    pass
+                self._store = None  # Reopen on the next batch
+            self._report(e)
+            return
+        latency = time.perf_counter() - started
+        done = time.monotonic()
+        WRITE_SECONDS.observe(latency)
+        RECORDS_WRITTEN.inc(len(batch))
+        BYTES_WRITTEN.inc(sum(text_bytes(record.content) for record in records))
+        for pending in batch:
+            PERSIST_SECONDS.observe(done - pending.submitted)
+        trace_event("flush", records=len(batch), seconds=round(latency, 6), path=self.path)
+        self.written += len(batch)
+        self.batches += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._flush_latency_total += latency
+
+    def _report(self, error: Exception) -> None:
+        record_error(error)
+        if self.on_error:
+            self.on_error(self.path, error)
+        else:
+            print(f"Error writing to file {self.path}: {error}")
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+import clipboard_crypto  # noqa: E402
+from clipboard_crypto import EncryptedLogStore, EncryptionError, generate_key_file, iter_encrypted_records, \
+    unlock  # noqa: E402
+from clipboard_store import ClipRecord  # noqa: E402
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    monkeypatch.setattr(clipboard_crypto, "_secrets", {})
+    key_file = str(tmp_path / "log.key")
+    generate_key_file(key_file)
+    path = str(tmp_path / "log.enc")
+    unlock(path, key_file=key_file)
+    return path
+
+
+def batch(start, count):
+    return [ClipRecord(f"2024-01-01 00:00:{start + i:02d}", f"clip {start + i}\nline two") for i in range(count)]
+
+
+def append(path, records):
+    store = EncryptedLogStore(path)
+    store.write_batch(records)
+    store.sync(durable=True)
+    store.close()
+
+
+def test_round_trip(log):
+    append(log, batch(0, 3))
+    append(log, batch(3, 2))
+    assert list(iter_encrypted_records(log)) == batch(0, 5)
+    with open(log, "rb") as file:
+        assert b"clip 0" not in file.read()
+
+
+@pytest.mark.parametrize("cut", [1, 10, 30])
+def test_a_frame_cut_short_is_dropped_on_the_next_open(log, cut, capsys):
+    append(log, batch(0, 3))
+    complete = os.path.getsize(log)
+    append(log, batch(3, 3))
+    os.truncate(log, os.path.getsize(log) - cut)  # Crash while the second frame was written
+    assert list(iter_encrypted_records(log)) == batch(0, 3)  # Readers stop quietly before it
+    append(log, batch(6, 2))
+    assert "incomplete frame" in capsys.readouterr().out
+    assert list(iter_encrypted_records(log)) == batch(0, 3) + batch(6, 2)
+    assert os.path.getsize(log) > complete
+
+
+def test_a_header_cut_short_keeps_nothing_after_it(log):
+    append(log, batch(0, 2))
+    size = os.path.getsize(log)
+    append(log, batch(2, 2))
+    os.truncate(log, size + 5)  # Not even the second frame's header is complete
+    append(log, batch(4, 1))
+    assert list(iter_encrypted_records(log)) == batch(0, 2) + batch(4, 1)
+
+
+def test_a_tampered_frame_fails(log):
+    append(log, batch(0, 2))
+    with open(log, "r+b") as file:
+        file.seek(-5, os.SEEK_END)
+        byte = file.read(1)
+        file.seek(-5, os.SEEK_END)
+        file.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(EncryptionError):
+        list(iter_encrypted_records(log))
+
+
+def test_a_wrong_key_is_refused(log, tmp_path):
+    append(log, batch(0, 1))
+    other = str(tmp_path / "other.key")
+    generate_key_file(other)
+    with pytest.raises(EncryptionError):
+        unlock(log, key_file=other)
@@ -0,0 +1,71 @@
+from clipboard_dedup import DedupStore, load_index
+from clipboard_fingerprint import content_digest
+from clipboard_history import HistoryLog, search_history, tail_history
+from clipboard_store import PRIMARY, ClipRecord, TextLogStore, escape_content, iter_log_records, make_ref, \
+    unescape_content
+
+
+def write(path, contents, selection=None):
+    store = DedupStore(TextLogStore(str(path)))
+    records = [ClipRecord(f"2024-01-01 00:00:{i:02d}", content) for i, content in enumerate(contents)]
+    if selection:
+        records = [record._replace(selection=selection) for record in records]
+    store.write_batch(records)
+    store.close()
+    return store
+
+
+def test_repeats_are_written_as_references(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["alpha", "beta", "alpha", "alpha"])
+    stored = [record.content for record in iter_log_records(str(path))]
+    assert stored == ["alpha", "beta", make_ref(content_digest("alpha")), make_ref(content_digest("alpha"))]
+
+
+def test_references_resolve_to_their_original(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["alpha", "beta\nsecond line", "alpha", "beta\nsecond line"])
+    assert [record.content for record in tail_history(str(path), 10)] == \
+        ["alpha", "beta\nsecond line", "alpha", "beta\nsecond line"]
+    with HistoryLog(str(path)) as log:
+        record, _ = log.record_at(log.prev_record_start(log.size))
+    assert record == ClipRecord("2024-01-01 00:00:03", "beta\nsecond line")
+
+
+def test_references_match_a_search_like_their_original(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["Needle here", "other", "Needle here"])
+    assert len(list(search_history(str(path), "needle", ignore_case=True))) == 2
+    assert len(list(search_history(str(path), "needle"))) == 0
+
+
+def test_surrogates_resolve(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["bad \udcff byte", "bad \udcff byte"])
+    records = tail_history(str(path), 2)
+    assert records[0].content == records[1].content
+
+
+def test_selections_are_deduplicated_with_their_tag(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["picked", "picked"], selection=PRIMARY)
+    assert tail_history(str(path), 2) == [ClipRecord("2024-01-01 00:00:00", "picked", PRIMARY),
+                                          ClipRecord("2024-01-01 00:00:01", "picked", PRIMARY)]
+
+
+def test_clips_that_look_like_markers_round_trip(tmp_path):
+    path = tmp_path / "log.txt"
+    clips = [make_ref("a" * 32), "@sel:primary text", "@@two", "@blob:text/plain:" + "b" * 32]
+    write(path, [escape_content(clip) for clip in clips])
+    records = tail_history(str(path), 10)
+    assert [unescape_content(record.content) for record in records] == clips
+    assert {record.selection for record in records} == {"clipboard"}
+
+
+def test_index_is_rebuilt_from_the_existing_log(tmp_path):
+    path = tmp_path / "log.txt"
+    write(path, ["alpha", "beta", "alpha"])
+    stats = load_index(str(path)).stats()
+    assert (stats["records"], stats["distinct_payloads"], stats["references"]) == (3, 2, 1)
+    write(path, ["beta"])  # A new store picks up where the last one stopped
+    assert list(iter_log_records(str(path)))[-1].content == make_ref(content_digest("beta"))
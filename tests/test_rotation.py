@@ -0,0 +1,94 @@
+import gzip
+import os
+
+from clipboard_dedup import DedupStore
+from clipboard_rotation import RotatingTextLogStore, RotationPolicy, compress_segment, \
+    discard_compressed_originals, enforce_retention, iter_history, list_segments, segment_path
+from clipboard_fingerprint import content_digest
+from clipboard_store import ClipRecord, format_record, make_ref
+
+
+def records(start, count, prefix="clip"):
+    return [ClipRecord(f"2024-01-01 00:{(start + i) // 60:02d}:{(start + i) % 60:02d}", f"{prefix} {start + i}")
+            for i in range(count)]
+
+
+def write_segment(log, stamp, batch):
+    path = segment_path(str(log), stamp)
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(format_record(record) for record in batch)
+    return path
+
+
+def test_rotates_by_size_and_reads_back_in_order(tmp_path):
+    path = str(tmp_path / "log.txt")
+    store = RotatingTextLogStore(path, RotationPolicy(max_bytes=200, retention_bytes=0, compression=None))
+    written = []
+    for i in range(0, 40, 4):
+        batch = records(i, 4)
+        store.write_batch(batch)
+        store.sync()
+        written += batch
+    store.close()
+    assert len(list_segments(path)) >= 3
+    assert list(iter_history(path)) == written
+
+
+def test_rotation_by_age(tmp_path):
+    path = str(tmp_path / "log.txt")
+    store = RotatingTextLogStore(path, RotationPolicy(max_age=60, retention_bytes=0, compression=None))
+    store.write_batch(records(0, 1))
+    store.sync()
+    assert not store.rotate_if_due()
+    store.segment_started -= 61
+    assert store.rotate_if_due()
+    store.close()
+    assert len(list_segments(path)) == 1
+    assert os.path.getsize(path) == 0
+
+
+def test_compressed_segments_are_read_and_preferred(tmp_path):
+    log = tmp_path / "log.txt"
+    plain = write_segment(log, "20240101-000000-000000", records(0, 3))
+    compressed = compress_segment(plain, "gzip")
+    assert not os.path.exists(plain)
+    with gzip.open(compressed, "rt", encoding="utf-8") as file:
+        assert file.read() == "".join(map(format_record, records(0, 3)))
+    write_segment(log, "20240101-000000-000000", records(0, 3))  # Plain copy left by a crash
+    assert [segment.path for segment in list_segments(str(log))] == [compressed]
+    assert list(iter_history(str(log))) == records(0, 3)
+
+
+def test_plain_copies_of_compressed_segments_are_discarded(tmp_path):
+    log = tmp_path / "log.txt"
+    compress_segment(write_segment(log, "20240101-000000-000000", records(0, 3)), "gzip")
+    leftover = write_segment(log, "20240101-000000-000000", records(0, 3))
+    pending = write_segment(log, "20240102-000000-000000", records(3, 3))
+    assert discard_compressed_originals(str(log)) == [leftover]
+    assert os.path.exists(pending)
+
+
+def test_retention_deletes_the_oldest_segments(tmp_path):
+    log = tmp_path / "log.txt"
+    paths = [write_segment(log, f"2024010{day}-000000-000000", records(day * 10, 5)) for day in range(1, 5)]
+    size = os.path.getsize(paths[0])
+    assert enforce_retention(str(log), 2 * size) == paths[:2]
+    assert [segment.path for segment in list_segments(str(log))] == paths[2:]
+    assert enforce_retention(str(log), 0) == []
+
+
+def test_each_file_holds_the_originals_of_its_references(tmp_path):
+    path = str(tmp_path / "log.txt")
+    inner = RotatingTextLogStore(path, RotationPolicy(max_bytes=1, retention_bytes=0, compression=None))
+    store = DedupStore(inner)
+    clip = ClipRecord("2024-01-01 00:00:00", "repeated")
+    store.write_batch([clip, clip._replace(timestamp="2024-01-01 00:00:01")])
+    store.sync()
+    store.write_batch([clip._replace(timestamp="2024-01-01 00:00:02")])  # Rotates first
+    store.close()
+    segment, = list_segments(path)
+    with open(segment.path, encoding="utf-8") as file:
+        assert file.read().splitlines() == ["[2024-01-01 00:00:00] repeated",
+                                            f"[2024-01-01 00:00:01] {make_ref(content_digest('repeated'))}"]
+    with open(path, encoding="utf-8") as file:
+        assert file.read() == format_record(clip._replace(timestamp="2024-01-01 00:00:02"))
@@ -0,0 +1,81 @@
+import pytest
+
+from clipboard_scheduler import PollScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_scheduler(**kwargs) -> PollScheduler:
+    options = dict(base_interval=1.0, burst_interval=0.2, max_interval=5.0, backoff_factor=2.0,
+                   error_base_delay=1.0, error_max_delay=30.0)
+    options.update(kwargs)
+    return PollScheduler(**options)
+
+
+def test_idle_polls_back_off_up_to_the_ceiling():
+    scheduler = make_scheduler()
+    delays = []
+    for _ in range(5):
+        scheduler.record_poll(changed=False)
+        delays.append(scheduler.next_delay())
+    assert delays == [2.0, 4.0, 5.0, 5.0, 5.0]
+
+
+def test_a_change_switches_to_the_burst_interval():
+    scheduler = make_scheduler()
+    for _ in range(4):
+        scheduler.record_poll(changed=False)
+    scheduler.record_poll(changed=True)
+    assert scheduler.next_delay() == 0.2
+    scheduler.record_poll(changed=False)
+    assert scheduler.next_delay() == 0.4
+
+
+def test_base_interval_is_capped_by_max_interval():
+    assert make_scheduler(base_interval=10.0).next_delay() == 5.0
+
+
+@pytest.mark.parametrize("roll", [0.0, 0.5, 0.999])
+def test_error_backoff_doubles_with_equal_jitter(roll):
+    scheduler = make_scheduler(rng=lambda: roll)
+    for delay in (1.0, 2.0, 4.0, 8.0, 16.0, 30.0, 30.0):
+        assert scheduler.record_error() == pytest.approx(delay / 2 + roll * delay / 2)
+
+
+def test_jitter_keeps_at_least_half_the_delay():
+    scheduler = make_scheduler()
+    for _ in range(10):
+        scheduler.record_error()
+    delays = [scheduler.record_error() for _ in range(200)]
+    assert all(15.0 <= delay <= 30.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_a_successful_poll_resets_the_error_backoff():
+    scheduler = make_scheduler(rng=lambda: 1.0)
+    for _ in range(3):
+        scheduler.record_error()
+    scheduler.record_poll(changed=False)
+    assert scheduler.record_error() == 1.0
+    assert scheduler.stats()["errors"] == 4
+
+
+def test_average_poll_gap_counts_polls_that_found_a_change():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock=clock)
+    assert scheduler.average_poll_gap == 0.0
+    scheduler.record_poll(changed=True)  # No previous poll: no gap
+    clock.now = 1.0
+    scheduler.record_poll(changed=False)
+    clock.now = 4.0
+    scheduler.record_poll(changed=True)
+    clock.now = 5.0
+    scheduler.record_poll(changed=True)
+    assert scheduler.average_poll_gap == pytest.approx(2.0)
+    assert scheduler.stats()["changes"] == 3
@@ -0,0 +1,99 @@
+import json
+import sqlite3
+
+import pytest
+
+from clipboard_dedup import DedupStore
+from clipboard_history import tail_history
+from clipboard_rotation import iter_history
+from clipboard_store import REF_PREFIX, ClipRecord, TextLogStore, iter_log_records, query_db
+from clipboard_transfer import JSONL, SEGMENTS, SQLITE, TEXT, transfer
+
+CLIPS = ["alpha", "beta\nwith two lines", "alpha", "gamma", "beta\nwith two lines", "alpha"]
+
+
+def history(count=len(CLIPS)):
+    return [ClipRecord(f"2024-01-01 00:00:{i:02d}", CLIPS[i % len(CLIPS)]) for i in range(count)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "source.txt")
+    store = TextLogStore(path)
+    store.write_batch(history())
+    store.close()
+    return path
+
+
+def test_text_to_jsonl(source, tmp_path):
+    target = str(tmp_path / "out.jsonl")
+    stats = transfer(source, target, workers=1)
+    with open(target, encoding="utf-8") as file:
+        rows = [json.loads(line) for line in file]
+    assert [(row["timestamp"], row["content"]) for row in rows] == [tuple(record[:2]) for record in history()]
+    assert stats["records_written"] == len(CLIPS)
+
+
+def test_importing_twice_with_dedup_adds_nothing(source, tmp_path):
+    target = str(tmp_path / "out.db")
+    first = transfer(source, target, SQLITE, workers=1, dedup=True)
+    second = transfer(source, target, SQLITE, workers=1, dedup=True)
+    assert (first["records_written"], second["records_written"], second["duplicates"]) == (6, 0, 6)
+    db = sqlite3.connect(target)
+    assert db.execute("SELECT count(*) FROM clips").fetchone()[0] == 6
+    db.close()
+
+
+def test_dedup_keeps_repeats_at_other_times(source, tmp_path):
+    target = str(tmp_path / "out.txt")
+    stats = transfer(source, target, TEXT, workers=1, dedup=True)
+    assert stats["duplicates"] == 0
+    assert list(iter_log_records(target)) == history()
+
+
+@pytest.mark.parametrize("suffix, target_format", [(".txt", TEXT), (".db", SQLITE)])
+def test_compact_writes_references_that_resolve(source, tmp_path, suffix, target_format):
+    target = str(tmp_path / f"out{suffix}")
+    stats = transfer(source, target, target_format, workers=1, compact=True)
+    assert stats["references"] == 3
+    if target_format == TEXT:
+        stored = [record.content for record in iter_log_records(target)]
+        resolved = tail_history(target, 10)
+    else:
+        stored = [row[0] for row in sqlite3.connect(target).execute("SELECT content FROM clips ORDER BY id")]
+        resolved = list(reversed(query_db(target, limit=-1)))
+    assert sum(content.startswith(REF_PREFIX) for content in stored) == 3
+    assert resolved == history()
+
+
+def test_references_in_the_source_are_resolved(tmp_path):
+    source = str(tmp_path / "dedup.txt")
+    store = DedupStore(TextLogStore(source))
+    store.write_batch(history())
+    store.close()
+    assert any(record.content.startswith(REF_PREFIX) for record in iter_log_records(source))
+    jsonl = str(tmp_path / "out.jsonl")
+    transfer(source, jsonl, JSONL, workers=1)
+    with open(jsonl, encoding="utf-8") as file:
+        assert [json.loads(line)["content"] for line in file] == CLIPS
+    segments = str(tmp_path / "target.txt")
+    transfer(source, segments, SEGMENTS, workers=1)
+    assert list(iter_history(segments)) == history()
+
+
+def test_small_chunks_and_worker_processes_give_the_same_result(tmp_path):
+    source = str(tmp_path / "source.txt")
+    store = TextLogStore(source)
+    store.write_batch(history(60))
+    store.close()
+    target = str(tmp_path / "out.txt")
+    stats = transfer(source, target, TEXT, workers=2, compact=True, chunk_bytes=256)
+    assert stats["records_written"] == 60
+    assert tail_history(target, 100) == history(60)
+
+
+def test_refuses_an_existing_text_target(source, tmp_path):
+    target = tmp_path / "out.jsonl"
+    target.write_text("")
+    with pytest.raises(FileExistsError):
+        transfer(source, str(target), workers=1)